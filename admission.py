@@ -0,0 +1,123 @@
+"""
+Admission control for webhook endpoints.
+
+Each request first passes two token buckets, one overall and one for its key
+(the Telegram user ID). It then needs one of ``max_in_flight`` work slots.
+At most ``max_queued`` requests wait for a slot, and only for up to
+``queue_timeout`` seconds. A request that is refused gets an ``Overloaded``
+error carrying the HTTP status and a ``Retry-After`` hint: 429 when one key
+is over its limit, 503 when the whole endpoint is saturated. A burst is then
+answered quickly instead of piling up threads in the Flask server.
+"""
+
+import contextlib
+import math
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+shed_requests = metrics.counter("bot_requests_shed_total", "Requests refused by admission control", ("endpoint", "reason"))
+
+
+class Overloaded(Exception):
+    def __init__(self, status, reason, retry_after):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))  # whole seconds for the header
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now):
+        """0 if a token was taken, else seconds until one is available"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionControl:
+    """``with admission.admit(key):`` around the work, or catch ``Overloaded``"""
+
+    def __init__(self, name, max_in_flight=16, max_queued=64, queue_timeout=5.0, rate=50.0, burst=100,
+                 key_rate=0.5, key_burst=5, max_keys=100000, clock=time.monotonic):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.key_rate = key_rate
+        self.key_burst = key_burst
+        self.max_keys = max_keys
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(max_in_flight)
+        self._bucket = TokenBucket(rate, burst, clock()) if rate else None
+        self._key_buckets = OrderedDict()  # key -> TokenBucket, least recently used first
+        self._service_seconds = 0.1  # moving average, for the Retry-After hint when the queue is full
+        self.in_flight = 0
+        self.queued = 0
+
+    def _refuse(self, status, reason, retry_after):
+        shed_requests.inc(self.name, reason)
+        raise Overloaded(status, reason, retry_after)
+
+    def _check_rates(self, key, now):
+        if self.key_rate and key is not None:
+            bucket = self._key_buckets.get(key)
+            if bucket is None:
+                bucket = self._key_buckets[key] = TokenBucket(self.key_rate, self.key_burst, now)
+                if len(self._key_buckets) > self.max_keys:
+                    self._key_buckets.popitem(last=False)
+            else:
+                self._key_buckets.move_to_end(key)
+            wait = bucket.take(now)
+            if wait:
+                self._refuse(429, "key_rate", wait)
+        if self._bucket is not None:
+            wait = self._bucket.take(now)
+            if wait:
+                self._refuse(503, "rate", wait)
+
+    @contextlib.contextmanager
+    def admit(self, key=None):
+        with self._lock:
+            self._check_rates(key, self.clock())
+            if self._slots.acquire(blocking=False):
+                self.in_flight += 1
+                queued = False
+            elif self.queued >= self.max_queued:
+                self._refuse(503, "queue_full", self.queued * self._service_seconds / self.max_in_flight)
+            else:
+                self.queued += 1
+                queued = True
+        if queued:
+            got_slot = self._slots.acquire(timeout=self.queue_timeout)
+            with self._lock:
+                self.queued -= 1
+                if not got_slot:
+                    self._refuse(503, "queue_timeout", self.queue_timeout)
+                self.in_flight += 1
+        start = self.clock()
+        try:
+            yield
+        finally:
+            elapsed = self.clock() - start
+            with self._lock:
+                self.in_flight -= 1
+                self._service_seconds += (elapsed - self._service_seconds) * 0.1
+            self._slots.release()
+
+    def depth(self):
+        return {"in_flight": self.in_flight, "queued": self.queued}
@@ -0,0 +1,142 @@
+"""
+Streaming export of the analytics event log.
+
+``export()`` is a generator over ``analytics.json`` that yields filtered
+events as NDJSON or CSV in chunks of roughly ``CHUNK_BYTES``, reading the log
+one line at a time so memory stays flat however large the export is.
+
+Every exported event carries a ``cursor``: the byte offset just past its log
+line. The log is append-only, so a client that loses the connection resumes
+by passing the last cursor it received. A time-range export without a
+cursor starts from a binary search over the log instead of from byte 0.
+"""
+
+import csv
+import io
+import json
+import os
+
+CHUNK_BYTES = 64 * 1024
+# Events are appended close to, not exactly in, timestamp order
+ORDER_SLACK_SECONDS = 300
+CSV_FIELDS = ("cursor", "timestamp", "user_id", "username", "status", "reason", "nft_count", "wallet_address")
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+class ExportError(ValueError):
+    """Raised for an invalid export request"""
+
+
+def parse_cursor(cursor):
+    try:
+        offset = int(cursor)
+    except (TypeError, ValueError):
+        raise ExportError("invalid cursor")
+    if offset < 0:
+        raise ExportError("invalid cursor")
+    return offset
+
+
+def _timestamp_at(f, offset):
+    """Timestamp of the first complete line starting at or after ``offset``"""
+    f.seek(offset)
+    if offset:
+        f.readline()  # finish the line we landed in
+    while True:
+        line_start = f.tell()
+        line = f.readline()
+        if not line:
+            return None, line_start
+        try:
+            return float(json.loads(line)["timestamp"]), line_start
+        except (ValueError, KeyError, TypeError):
+            continue
+
+
+def seek_time(f, size, start):
+    """Byte offset of a line at or before the first event from ``start`` onwards"""
+    lo, hi = 0, size
+    target = start - ORDER_SLACK_SECONDS
+    while hi - lo > CHUNK_BYTES:
+        mid = (lo + hi) // 2
+        timestamp, _ = _timestamp_at(f, mid)
+        if timestamp is None or timestamp >= target:
+            hi = mid
+        else:
+            lo = mid
+    if not lo:
+        return 0
+    _, line_start = _timestamp_at(f, lo)
+    return line_start
+
+
+def _matches(entry, start, end, statuses, user_id):
+    timestamp = entry.get("timestamp")
+    if not isinstance(timestamp, (int, float)):
+        return False
+    if start is not None and timestamp < start:
+        return False
+    if end is not None and timestamp >= end:
+        return False
+    if statuses and entry.get("status") not in statuses:
+        return False
+    if user_id is not None and str(entry.get("user_id", entry.get("tg_id"))) != user_id:
+        return False
+    return True
+
+
+def export(path, fmt="ndjson", start=None, end=None, statuses=None, user_id=None, cursor=None, limit=None):
+    """Yield encoded chunks of matching events; see the module docstring"""
+    if fmt not in FORMATS:
+        raise ExportError(f"unknown format: {fmt}")
+    offset = parse_cursor(cursor) if cursor is not None else None
+    return _export(path, fmt, start, end, set(statuses or ()), user_id, offset, limit)
+
+
+def _export(path, fmt, start, end, statuses, user_id, offset, limit):
+    buffer = io.StringIO()
+    writer = None
+    if fmt == "csv":
+        writer = csv.DictWriter(buffer, CSV_FIELDS, extrasaction="ignore", lineterminator="\n")
+        writer.writeheader()
+    exported = 0
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        yield buffer.getvalue().encode()
+        return
+    with f:
+        size = os.fstat(f.fileno()).st_size
+        if offset is None:
+            offset = seek_time(f, size, start) if start is not None else 0
+        f.seek(min(offset, size))
+        position = f.tell()
+        # Stop at the size seen when the export started; later events go to the next cursor
+        while position < size and (limit is None or exported < limit):
+            line = f.readline()
+            if not line.endswith(b"\n"):
+                break  # partial line still being written
+            position += len(line)
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(entry, dict):
+                continue
+            timestamp = entry.get("timestamp")
+            if end is not None and isinstance(timestamp, (int, float)) and timestamp >= end + ORDER_SLACK_SECONDS:
+                break
+            if not _matches(entry, start, end, statuses, user_id):
+                continue
+            entry["cursor"] = str(position)
+            if writer:
+                writer.writerow(entry)
+            else:
+                buffer.write(json.dumps(entry))
+                buffer.write("\n")
+            exported += 1
+            if buffer.tell() >= CHUNK_BYTES:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+    yield buffer.getvalue().encode()
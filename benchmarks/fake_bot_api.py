@@ -0,0 +1,238 @@
+"""
+Local fake Telegram Bot API for benchmarks.
+
+Serves ``/bot<token>/<method>`` like api.telegram.org, with configurable
+per-call latency and 429 behaviour, and lets the benchmark push synthetic
+updates that the bot then receives through ``getUpdates``. Point the bot at it
+with ``TELEGRAM_API_BASE_URL=http://127.0.0.1:<port>/bot``.
+
+Run standalone with ``python benchmarks/fake_bot_api.py --port 8081``.
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+BOT_USER = {"id": 100000001, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+TG_ID_PATTERN = re.compile(r"tg_id=(\d+)")
+
+
+class FakeBotAPI:
+    """State and behaviour of the fake server, shared by all request threads"""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, rate_limit=0, retry_after=1, error_rate=0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_limit = rate_limit  # non-getUpdates calls per second, 0 = unlimited
+        self.retry_after = retry_after
+        self.error_rate = error_rate  # probability of a random 429
+        self.lock = threading.Condition()
+        self.updates = []
+        self.next_update_id = 1
+        self.next_message_id = 1
+        self.calls = {}
+        self.succeeded = {}  # calls answered with ok, by method
+        self.throttled = 0
+        self.enqueued_at = {}  # user id -> time the join update was pushed
+        self.welcomed_at = {}  # user id -> time the first message carrying its link arrived
+        self._window_start = time.monotonic()
+        self._window_calls = 0
+        self.server = None
+
+    # Updates pushed by the benchmark
+
+    def push_update(self, update):
+        with self.lock:
+            update["update_id"] = self.next_update_id
+            self.next_update_id += 1
+            self.updates.append(update)
+            self.lock.notify_all()
+
+    def push_join(self, chat_id, user_id, username=None):
+        now = time.time()
+        user = {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": username or f"user{user_id}"}
+        with self.lock:
+            self.enqueued_at[user_id] = time.perf_counter()
+        self.push_update({
+            "message": {
+                "message_id": self._message_id(),
+                "date": int(now),
+                "chat": {"id": chat_id, "type": "supergroup", "title": "Bench Group"},
+                "from": user,
+                "new_chat_members": [user],
+            }
+        })
+
+    def push_text(self, chat_id, user_id, text):
+        user = {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"}
+        self.push_update({
+            "message": {
+                "message_id": self._message_id(),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "supergroup", "title": "Bench Group"},
+                "from": user,
+                "text": text,
+            }
+        })
+
+    def _message_id(self):
+        with self.lock:
+            message_id = self.next_message_id
+            self.next_message_id += 1
+            return message_id
+
+    # Bot API methods
+
+    def _throttle(self):
+        """Return a 429 response when over the configured budget, else None"""
+        with self.lock:
+            now = time.monotonic()
+            if now - self._window_start >= 1.0:
+                self._window_start = now
+                self._window_calls = 0
+            self._window_calls += 1
+            over_budget = self.rate_limit and self._window_calls > self.rate_limit
+            if over_budget or (self.error_rate and random.random() < self.error_rate):
+                self.throttled += 1
+                return {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after},
+                }
+        return None
+
+    def get_updates(self, params):
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            if offset:
+                self.updates = [u for u in self.updates if u["update_id"] >= offset]
+            while not self.updates and time.monotonic() < deadline:
+                self.lock.wait(deadline - time.monotonic())
+            return self.updates[:limit]
+
+    def handle(self, method, params):
+        with self.lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+
+        if method == "getUpdates":
+            return {"ok": True, "result": self.get_updates(params)}
+
+        if self.latency_ms or self.jitter_ms:
+            time.sleep((self.latency_ms + random.uniform(0, self.jitter_ms)) / 1000)
+
+        throttled = self._throttle()
+        if throttled:
+            return throttled
+        with self.lock:
+            self.succeeded[method] = self.succeeded.get(method, 0) + 1
+
+        if method == "getMe":
+            return {"ok": True, "result": BOT_USER}
+        if method == "sendMessage":
+            text = params.get("text", "")
+            match = TG_ID_PATTERN.search(text)
+            if match:
+                with self.lock:
+                    self.welcomed_at.setdefault(int(match.group(1)), time.perf_counter())
+            chat_id = params.get("chat_id")
+            return {"ok": True, "result": {
+                "message_id": self._message_id(),
+                "date": int(time.time()),
+                "chat": {"id": int(chat_id) if str(chat_id).lstrip("-").isdigit() else 0, "type": "supergroup"},
+                "from": BOT_USER,
+                "text": text,
+            }}
+        if method == "getChatMember":
+            return {"ok": True, "result": {
+                "status": "administrator",
+                "user": {"id": int(params.get("user_id", 0)), "is_bot": False, "first_name": "Admin"},
+                "can_be_edited": False, "is_anonymous": False, "can_manage_chat": True,
+                "can_delete_messages": True, "can_manage_video_chats": True, "can_restrict_members": True,
+                "can_promote_members": True, "can_change_info": True, "can_invite_users": True,
+                "can_post_stories": True, "can_edit_stories": True, "can_delete_stories": True,
+            }}
+        # deleteWebhook, banChatMember, unbanChatMember, close, logOut, ...
+        return {"ok": True, "result": True}
+
+    # Server lifecycle
+
+    def start(self, host="127.0.0.1", port=0):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _params(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length).decode() if length else ""
+                if not body:
+                    return {}
+                if self.headers.get("Content-Type", "").startswith("application/json"):
+                    return json.loads(body)
+                return dict(parse_qsl(body))
+
+            def do_POST(self):
+                method = self.path.rstrip("/").rsplit("/", 1)[-1]
+                payload = api.handle(method, self._params())
+                body = json.dumps(payload).encode()
+                self.send_response(200 if payload.get("ok") else payload.get("error_code", 400))
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="fake-bot-api", daemon=True).start()
+        return self.server.server_address[1]
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/bot"
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def add_arguments(parser):
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added latency per Bot API call")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Random extra latency per call")
+    parser.add_argument("--rate-limit", type=int, default=0, help="Calls per second before 429s (0 = unlimited)")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after seconds in 429 responses")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of a random 429")
+
+
+def from_arguments(args):
+    return FakeBotAPI(args.latency_ms, args.jitter_ms, args.rate_limit, args.retry_after, args.error_rate)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Telegram Bot API")
+    parser.add_argument("--port", type=int, default=8081)
+    add_arguments(parser)
+    args = parser.parse_args()
+    api = from_arguments(args)
+    api.start(port=args.port)
+    print(f"🧪 Fake Bot API on {api.base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        api.stop()
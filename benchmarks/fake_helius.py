@@ -0,0 +1,224 @@
+"""
+Local fake Helius server for verifier benchmarks.
+
+Serves both APIs the verifiers use:
+
+- ``GET /v0/addresses/<wallet>/nft-assets`` - the whole asset list at once
+- ``POST /`` JSON-RPC ``getAssetsByOwner`` - DAS, paginated by ``page``/``limit``
+
+Wallet contents come from generated profiles (empty, small, 10k assets,
+paginated, slow) or from recorded responses: ``--fixtures DIR`` loads every
+``<wallet>.json`` file in DIR, each a JSON list of assets (or a saved DAS
+``result`` object with ``items``). Responses are serialized once up front so
+the server is never the bottleneck, and bytes served are counted so the
+benchmark can report bytes decoded per verification.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+B58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+
+def b58encode(data):
+    number = int.from_bytes(data, "big")
+    encoded = ""
+    while number:
+        number, remainder = divmod(number, 58)
+        encoded = B58_ALPHABET[remainder] + encoded
+    return "1" * (len(data) - len(data.lstrip(b"\0"))) + encoded
+
+
+def fake_pubkey(seed):
+    """Deterministic valid-looking base58 32-byte public key"""
+    return b58encode(hashlib.sha256(seed.encode()).digest())
+
+
+COLLECTION_ID = fake_pubkey("collection/required")
+OTHER_COLLECTION_ID = fake_pubkey("collection/other")
+
+
+def make_asset(owner, index, collection_id):
+    return {
+        "interface": "V1_NFT",
+        "id": fake_pubkey(f"{owner}/{index}"),
+        "content": {
+            "$schema": "https://schema.metaplex.com/nft1.0.json",
+            "json_uri": f"https://arweave.net/{index:043d}",
+            "metadata": {"name": f"Asset #{index}", "symbol": "FAKE"},
+        },
+        "grouping": [{"group_key": "collection", "group_value": collection_id}],
+        "royalty": {"royalty_model": "creators", "percent": 0.05, "basis_points": 500},
+        "ownership": {"frozen": False, "delegated": False, "owner": owner, "ownership_model": "single"},
+        "burnt": False,
+    }
+
+
+def generate_assets(owner, total, match_index=None):
+    """``total`` assets from another collection, with the required one at ``match_index``"""
+    return [
+        make_asset(owner, i, COLLECTION_ID if i == match_index else OTHER_COLLECTION_ID)
+        for i in range(total)
+    ]
+
+
+# name -> (asset count, index of the matching asset or None, latency in ms)
+PROFILES = {
+    "empty": (0, None, 0),
+    "small_holder": (25, 3, 0),
+    "10k_no_match": (10_000, None, 0),
+    "10k_match_last": (10_000, 9_999, 0),
+    "paginated_match_p3": (2_500, 2_400, 0),
+    "slow_holder": (25, 3, 400),
+}
+
+
+class Wallet:
+    __slots__ = ("assets", "latency_ms", "_list_body", "_pages")
+
+    def __init__(self, assets, latency_ms=0):
+        self.assets = assets
+        self.latency_ms = latency_ms
+        self._list_body = None
+        self._pages = {}
+
+    def list_body(self):
+        if self._list_body is None:
+            self._list_body = json.dumps(self.assets).encode()
+        return self._list_body
+
+    def page_body(self, page, limit):
+        """Serialized DAS ``result`` object for one page"""
+        key = (page, limit)
+        if key not in self._pages:
+            items = self.assets[(page - 1) * limit:page * limit]
+            self._pages[key] = json.dumps({"total": len(items), "limit": limit, "page": page, "items": items}).encode()
+        return self._pages[key]
+
+
+class FakeHelius:
+    def __init__(self):
+        self.wallets = {}
+        self.profile_wallets = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes_served = 0
+        self.server = None
+
+    def add_profiles(self, profiles=PROFILES):
+        for name, (total, match_index, latency_ms) in profiles.items():
+            wallet = fake_pubkey(f"profile/{name}")
+            self.wallets[wallet] = Wallet(generate_assets(wallet, total, match_index), latency_ms)
+            self.profile_wallets[name] = wallet
+        return self.profile_wallets
+
+    def load_fixtures(self, directory):
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith(".json"):
+                continue
+            with open(os.path.join(directory, filename)) as f:
+                recorded = json.load(f)
+            assets = recorded.get("items", []) if isinstance(recorded, dict) else recorded
+            wallet = filename[:-len(".json")]
+            self.wallets[wallet] = Wallet(assets)
+            self.profile_wallets[f"fixture:{wallet[:8]}"] = wallet
+        return self.profile_wallets
+
+    def warm(self):
+        """Serialize every response ahead of the benchmark"""
+        for wallet in self.wallets.values():
+            wallet.list_body()
+            for page in range(1, len(wallet.assets) // 1000 + 2):
+                wallet.page_body(page, 1000)
+
+    def _count(self, body):
+        with self.lock:
+            self.requests += 1
+            self.bytes_served += len(body)
+
+    def stats(self):
+        with self.lock:
+            return self.requests, self.bytes_served
+
+    def start(self, host="127.0.0.1", port=0):
+        helius = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _reply(self, status, body, latency_ms=0):
+                if latency_ms:
+                    time.sleep(latency_ms / 1000)
+                helius._count(body)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                parts = urlparse(self.path).path.strip("/").split("/")
+                # v0/addresses/<wallet>/nft-assets
+                if len(parts) == 4 and parts[:2] == ["v0", "addresses"] and parts[3] == "nft-assets":
+                    wallet = helius.wallets.get(parts[2])
+                    if wallet is None:
+                        return self._reply(200, b"[]")
+                    return self._reply(200, wallet.list_body(), wallet.latency_ms)
+                self._reply(404, b'{"error": "not found"}')
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                call = json.loads(self.rfile.read(length) or b"{}")
+                if call.get("method") != "getAssetsByOwner":
+                    body = {"jsonrpc": "2.0", "id": call.get("id"), "error": {"code": -32601, "message": "Method not found"}}
+                    return self._reply(200, json.dumps(body).encode())
+                params = call.get("params", {})
+                wallet = helius.wallets.get(params.get("ownerAddress")) or Wallet([])
+                result = wallet.page_body(int(params.get("page", 1)), int(params.get("limit", 1000)))
+                body = b'{"jsonrpc": "2.0", "id": ' + json.dumps(call.get("id")).encode() + b', "result": ' + result + b"}"
+                self._reply(200, body, wallet.latency_ms)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="fake-helius", daemon=True).start()
+        return self.server.server_address[1]
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Helius API")
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--fixtures", help="Directory of recorded <wallet>.json responses")
+    args = parser.parse_args()
+    helius = FakeHelius()
+    helius.add_profiles()
+    if args.fixtures:
+        helius.load_fixtures(args.fixtures)
+    helius.warm()
+    helius.start(port=args.port)
+    print(f"🧪 Fake Helius on {helius.base_url} (collection {COLLECTION_ID})")
+    for name, wallet in helius.profile_wallets.items():
+        print(f"  {name:24s} {wallet}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        helius.stop()
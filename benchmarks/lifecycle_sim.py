@@ -0,0 +1,235 @@
+"""
+Verification lifecycle simulation on virtual time.
+
+Runs the bot server in-process on ``simulation.VirtualTimeLoop`` against
+``simulation.SimulatedTelegram``. N members join over ``--join-window``
+seconds. Some verify after a random delay, with or without the NFT, and the
+rest time out after ``VERIFICATION_TIMEOUT``. Their removal timers, outbox
+retries and Bot API latency all run on the virtual clock, so a scenario that
+spans many minutes finishes in seconds of real time.
+
+The default run (2,000 members, about 15 virtual minutes, 8,240 Bot API
+calls) takes about 6 s of wall time per run; 200 members take about 0.6 s.
+That is roughly 150x and 1,400x virtual time. It is not milliseconds. Most of
+the time goes to python-telegram-bot building requests and parsing the
+responses of the bot's own calls, which are on the production path and stay
+in. Join updates are parsed before the clock starts, and that setup time is
+reported separately.
+
+Every run is seeded. The script runs the scenario ``--runs`` times, checks
+that all runs produced the same Bot API call sequence, and checks that
+exactly the members who should be removed were. It reports the virtual
+time covered per real second, Bot API calls per real second, and how long
+removals waited in the outbox after the timeout (in virtual time). A final
+run with ``--long-timeout`` checks removals again with a verification
+timeout longer than the default lifetime of pending entries.
+
+    python benchmarks/lifecycle_sim.py --members 5000 --rate-limit 30
+"""
+
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import simulation  # noqa: E402
+from load_test import percentile  # noqa: E402
+
+BASE_USER_ID = 7_000_000_000
+LINK_PATTERN = re.compile(r'tg_id=(\d+)&vid=([^&"<\s]+)&token=([^&"<\s]+)')
+
+
+def plan_members(args):
+    """(user_id, join_at, verify_after or None, has_nft) per member, from the seed"""
+    rng = random.Random(args.seed)
+    plans = []
+    for i in range(args.members):
+        join_at = rng.uniform(0, args.join_window)
+        verify_after = rng.uniform(args.verify_min, args.verify_max) if rng.random() < args.verify_rate else None
+        plans.append((BASE_USER_ID + i, join_at, verify_after, rng.random() < args.nft_rate))
+    return plans
+
+
+async def scenario(args, plans, workdir, clock, timeout):
+    telegram = simulation.SimulatedTelegram(clock, args.latency_ms / 1000, args.jitter_ms / 1000,
+                                            args.rate_limit, args.retry_after, args.error_rate, args.seed)
+    sim = simulation.Simulation(telegram, workdir, verification_timeout=timeout, max_accounts_per_wallet=0)
+    # Join updates are parsed up front: PTB's parsing is not the bot's work and is left out of the wall time
+    start = time.perf_counter()
+    joins = {user_id: sim.join_update(user_id, date=clock.time() + join_at) for user_id, join_at, _, _ in plans}
+    setup = time.perf_counter() - start
+    links = {}  # user id -> future of (verification id, token) from the welcome message
+
+    def on_call(method, params):
+        if method != "sendMessage":
+            return
+        match = LINK_PATTERN.search(params.get("text", ""))
+        if match:
+            future = links.get(int(match.group(1)))
+            if future is not None and not future.done():
+                future.set_result((match.group(2), match.group(3)))
+
+    telegram.listeners.append(on_call)
+
+    async def member(user_id, join_at, verify_after, has_nft):
+        await asyncio.sleep(join_at)
+        links[user_id] = asyncio.get_running_loop().create_future()
+        sim.push_update(joins.pop(user_id))
+        if verify_after is None:
+            return
+        try:
+            verification_id, token = await asyncio.wait_for(links[user_id], timeout)
+        except asyncio.TimeoutError:
+            return  # the welcome never got through, so there is no link to verify with
+        await asyncio.sleep(verify_after)
+        _, status = sim.callback({"tg_id": user_id, "has_nft": has_nft, "username": f"user{user_id}",
+                                  "wallet_address": f"wallet{user_id}", "nft_count": 1 if has_nft else 0,
+                                  "verification_id": verification_id, "token": token})
+        if status != 200:
+            raise RuntimeError(f"verify_callback for {user_id} returned {status}")
+
+    random.seed(args.seed)  # outbox retry jitter
+    await sim.start()
+    try:
+        await asyncio.gather(*(member(*plan) for plan in plans))
+        await sim.settle()
+        elapsed = clock.monotonic()
+    finally:
+        await sim.stop()
+    return telegram, elapsed, setup
+
+
+def outcome(telegram, plans, timeout):
+    """Removals, missing/unexpected removals, kick delay after the timeout and a digest of the call sequence"""
+    welcomed_at, kicked_at = {}, {}
+    sequence = []
+    for at, method, params in telegram.log:
+        user_id = params.get("user_id")
+        if method == "sendMessage":
+            match = LINK_PATTERN.search(params.get("text", ""))
+            if match:
+                user_id = int(match.group(1))
+                welcomed_at.setdefault(user_id, at)
+        elif method == "banChatMember":
+            kicked_at.setdefault(user_id, at)
+        sequence.append((round(at, 6), method, params.get("chat_id"), user_id))
+    # Members whose welcome failed have no link and no removal timer - nothing happens to them
+    welcomed = [plan for plan in plans if plan[0] in welcomed_at]
+    expected = {user_id for user_id, _, verify_after, has_nft in welcomed
+                if verify_after is None or verify_after >= timeout or not has_nft}
+    timed_out = {user_id for user_id, _, verify_after, _ in welcomed if verify_after is None or verify_after >= timeout}
+    delays = [kicked_at[user_id] - welcomed_at[user_id] - timeout for user_id in timed_out
+              if user_id in kicked_at and user_id in welcomed_at]
+    return {
+        "not_welcomed": len(plans) - len(welcomed),
+        "removed": len(kicked_at),
+        "expected_removals": len(expected),
+        "missing": len(expected - set(kicked_at)),
+        "unexpected": len(set(kicked_at) - expected),
+        "timeouts": len(timed_out),
+        "kick_delay_p50_s": round(percentile(delays, 50), 3) if delays else None,
+        "kick_delay_p99_s": round(percentile(delays, 99), 3) if delays else None,
+        "digest": hashlib.sha256(json.dumps(sequence).encode()).hexdigest()[:16],
+    }
+
+
+def run_scenario(args, plans, timeout, quiet):
+    """One run of the scenario with ``timeout`` - the outcome plus timings"""
+    with tempfile.TemporaryDirectory(prefix="bot-sim-") as workdir:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(sys.stdout if args.verbose else quiet), \
+                contextlib.redirect_stderr(sys.stderr if args.verbose else quiet):
+            clock = simulation.VirtualClock()
+            telegram, virtual_seconds, setup = simulation.run(scenario(args, plans, workdir, clock, timeout), clock)
+        wall = time.perf_counter() - start - setup
+    result = outcome(telegram, plans, timeout)
+    result.update({
+        "virtual_seconds": round(virtual_seconds, 1),
+        "wall_seconds": round(wall, 3),
+        "setup_seconds": round(setup, 3),
+        "speedup": round(virtual_seconds / wall, 1),
+        "api_calls": sum(telegram.calls.values()),
+        "api_calls_per_s": round(sum(telegram.calls.values()) / wall, 1),
+        "throttled": telegram.throttled,
+    })
+    return telegram, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the verification lifecycle on virtual time")
+    parser.add_argument("--members", type=int, default=2000)
+    parser.add_argument("--join-window", type=float, default=600, help="Joins arrive over this many virtual seconds")
+    parser.add_argument("--verify-rate", type=float, default=0.6, help="Fraction of members who verify")
+    parser.add_argument("--nft-rate", type=float, default=0.8, help="Fraction of verifying members holding the NFT")
+    parser.add_argument("--verify-min", type=float, default=5)
+    parser.add_argument("--verify-max", type=float, default=280, help="Verification delay range after the welcome, seconds")
+    parser.add_argument("--verification-timeout", type=float, default=300)
+    parser.add_argument("--latency-ms", type=float, default=30)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--rate-limit", type=int, default=0, help="Bot API calls per virtual second before 429s, 0 = none")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of a random 429")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--runs", type=int, default=2, help="Run the scenario this often and require identical results")
+    parser.add_argument("--long-timeout", type=float, default=1200,
+                        help="Check removals once more with this verification timeout, 0 = skip")
+    parser.add_argument("--verbose", action="store_true", help="Show the bot's own output and tracebacks")
+    parser.add_argument("--output", help="Append the result as one JSON line to this file")
+    args = parser.parse_args()
+
+    plans = plan_members(args)
+    results = []
+    quiet = open(os.devnull, "w")
+    for _ in range(args.runs):
+        telegram, result = run_scenario(args, plans, args.verification_timeout, quiet)
+        results.append(result)
+
+    first = results[0]
+    calls = Counter(telegram.succeeded)
+    print(f"🧪 {args.members:,} members joining over {args.join_window:g}s, seed {args.seed}: "
+          f"{first['timeouts']:,} time out, {first['expected_removals'] - first['timeouts']:,} fail verification")
+    print(f"⏱️ {first['virtual_seconds']:,}s of virtual time in {first['wall_seconds']:.2f}s ({first['speedup']:,}x, +{first['setup_seconds']:.2f}s setup), "
+          f"{first['api_calls']:,} Bot API calls ({first['api_calls_per_s']:,.0f}/s), {first['throttled']:,} throttled")
+    print("📨 " + ", ".join(f"{method} {count:,}" for method, count in calls.most_common()))
+    print(f"🚫 {first['removed']:,} removed (expected {first['expected_removals']:,}), "
+          f"kick delay after timeout p50 {first['kick_delay_p50_s']}s p99 {first['kick_delay_p99_s']}s")
+    if first["not_welcomed"]:
+        print(f"⚠️ {first['not_welcomed']:,} welcome messages failed - those members got no link and no removal timer")
+    if args.output:
+        with open(args.output, "a") as f:
+            f.write(json.dumps({"args": vars(args), **first}) + "\n")
+
+    failed = False
+    if first["missing"] or first["unexpected"]:
+        print(f"❌ {first['missing']} members not removed, {first['unexpected']} removed unexpectedly")
+        failed = True
+    if args.long_timeout and args.long_timeout != args.verification_timeout:
+        _, long_run = run_scenario(args, plans, args.long_timeout, quiet)
+        if long_run["missing"] or long_run["unexpected"]:
+            print(f"❌ With a {args.long_timeout:g}s timeout: {long_run['missing']} members not removed, "
+                  f"{long_run['unexpected']} removed unexpectedly")
+            failed = True
+        else:
+            print(f"✅ With a {args.long_timeout:g}s timeout: {long_run['removed']:,} removed "
+                  f"(expected {long_run['expected_removals']:,})")
+    digests = {result["digest"] for result in results}
+    if len(digests) > 1:
+        print(f"❌ Runs differ: {', '.join(sorted(digests))}")
+        failed = True
+    elif args.runs > 1:
+        print(f"✅ {args.runs} runs produced the same {first['api_calls']:,} calls (digest {first['digest']})")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
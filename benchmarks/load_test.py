@@ -0,0 +1,245 @@
+"""
+Load-generation benchmark for the bot against a fake Telegram Bot API.
+
+Starts ``benchmarks/fake_bot_api.py`` in-process, runs ``server.py`` as a
+subprocess pointed at it (``TELEGRAM_API_BASE_URL``), then drives:
+
+- a join flood: synthetic ``new_chat_members`` updates delivered through
+  ``getUpdates``; latency is push -> welcome message received by the fake API
+- a callback storm: concurrent ``POST /verify_callback`` requests; latency is
+  the HTTP round trip
+
+and reports throughput, p50/p99 latency and bot RSS. Each run can be appended
+as one JSON line to ``--output`` so versions can be compared.
+
+    python benchmarks/load_test.py --joins 500 --callbacks 500 --latency-ms 30
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import fake_bot_api  # noqa: E402
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GROUP_ID = -1001234567890
+BASE_USER_ID = 7_000_000_000
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def latency_summary(latencies, elapsed):
+    return {
+        "count": len(latencies),
+        "throughput_per_s": round(len(latencies) / elapsed, 1) if elapsed > 0 else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+        "max_ms": round(max(latencies) * 1000, 2) if latencies else None,
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class RSSSampler:
+    """Samples a process's resident set size from /proc while the benchmark runs"""
+
+    def __init__(self, pid, interval=0.1):
+        self.pid = pid
+        self.interval = interval
+        self.peak_kb = 0
+        self.last_kb = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _read_kb(self):
+        try:
+            with open(f"/proc/{self.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+        return 0
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.last_kb = self._read_kb() or self.last_kb
+            self.peak_kb = max(self.peak_kb, self.last_kb)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return {"rss_peak_mb": round(self.peak_kb / 1024, 1), "rss_last_mb": round(self.last_kb / 1024, 1)}
+
+
+def start_bot(api, http_port, workdir, log_path):
+    env = dict(os.environ)
+    env.update({
+        "TELEGRAM_BOT_TOKEN": "123456:BENCHMARK",
+        "TELEGRAM_GROUP_ID": str(GROUP_ID),
+        "TELEGRAM_API_BASE_URL": api.base_url,
+        "PORT": str(http_port),
+        "ADMIN_NOTIFICATIONS": "false",
+        "PYTHONUNBUFFERED": "1",
+    })
+    log = open(log_path, "w")
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(REPO_ROOT, "server.py")],
+        cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    return process, log
+
+
+def wait_until_ready(api, http_port, timeout):
+    deadline = time.monotonic() + timeout
+    url = f"http://127.0.0.1:{http_port}/health"
+    while time.monotonic() < deadline:
+        polling = api.calls.get("getUpdates", 0) > 0
+        try:
+            serving = requests.get(url, timeout=1).status_code == 200
+        except requests.RequestException:
+            serving = False
+        if polling and serving:
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def run_join_flood(api, count, rate, timeout):
+    user_ids = [BASE_USER_ID + i for i in range(count)]
+    start = time.perf_counter()
+    for i, user_id in enumerate(user_ids):
+        api.push_join(GROUP_ID, user_id)
+        if rate:
+            # Pace against the schedule rather than sleeping a fixed gap
+            delay = start + (i + 1) / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and len(api.welcomed_at) < count:
+        time.sleep(0.05)
+
+    done = [u for u in user_ids if u in api.welcomed_at]
+    latencies = [api.welcomed_at[u] - api.enqueued_at[u] for u in done]
+    elapsed = (max(api.welcomed_at[u] for u in done) - start) if done else 0
+    summary = latency_summary(latencies, elapsed)
+    summary["missing"] = count - len(done)
+    return summary
+
+
+def run_callback_storm(http_port, count, concurrency):
+    url = f"http://127.0.0.1:{http_port}/verify_callback"
+    local = threading.local()
+
+    def fire(i):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        payload = {
+            "tg_id": BASE_USER_ID + i,
+            "has_nft": i % 2 == 0,
+            "username": f"user{i}",
+            "wallet_address": f"Wallet{i:036d}",
+            "nft_count": i % 5,
+        }
+        sent = time.perf_counter()
+        try:
+            status = session.post(url, json=payload, timeout=60).status_code
+        except requests.RequestException:
+            status = None
+        return time.perf_counter() - sent, status
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(fire, range(count)))
+    elapsed = time.perf_counter() - start
+
+    summary = latency_summary([latency for latency, _ in results], elapsed)
+    statuses = {}
+    for _, status in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    summary["statuses"] = statuses
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bot load benchmark against a fake Bot API")
+    parser.add_argument("--joins", type=int, default=200, help="Synthetic joins to push (0 to skip)")
+    parser.add_argument("--join-rate", type=float, default=0, help="Joins per second (0 = all at once)")
+    parser.add_argument("--callbacks", type=int, default=200, help="/verify_callback requests (0 to skip)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent callback clients")
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds to wait for the join flood to drain")
+    parser.add_argument("--label", default="", help="Free-form label stored with the result, e.g. a git sha")
+    parser.add_argument("--output", help="Append the result as a JSON line to this file")
+    fake_bot_api.add_arguments(parser)
+    args = parser.parse_args()
+
+    api = fake_bot_api.from_arguments(args)
+    api.start()
+    http_port = free_port()
+    workdir = tempfile.mkdtemp(prefix="bot-bench-")
+    log_path = os.path.join(workdir, "bot.log")
+    process, log = start_bot(api, http_port, workdir, log_path)
+    sampler = RSSSampler(process.pid).start()
+
+    result = {"label": args.label, "timestamp": time.time(), "config": vars(args)}
+    try:
+        if not wait_until_ready(api, http_port, timeout=30):
+            print(f"❌ Bot did not become ready - see {log_path}")
+            sys.exit(1)
+        result["rss_idle_mb"] = round(sampler.last_kb / 1024, 1)
+
+        if args.joins:
+            print(f"🌊 Join flood: {args.joins} joins...")
+            result["joins"] = run_join_flood(api, args.joins, args.join_rate, args.timeout)
+        if args.callbacks:
+            print(f"⚡ Callback storm: {args.callbacks} callbacks x{args.concurrency}...")
+            result["callbacks"] = run_callback_storm(http_port, args.callbacks, args.concurrency)
+    finally:
+        result.update(sampler.stop())
+        result["bot_api_calls"] = dict(api.calls)
+        result["throttled_429"] = api.throttled
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        log.close()
+        api.stop()
+
+    print(json.dumps(result, indent=2))
+    print(f"📄 Bot log: {log_path}")
+    if args.output:
+        with open(args.output, "a") as f:
+            f.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Memory cost per verified member.
+
+Builds N members (default 1M) the old way - one dict of four keys per user in
+a plain dict - and in a ``MemberStore``, each in a fresh interpreter, and
+reports the resident memory growth per member (including the wallet reverse
+index). Then demotes idle members to the on-disk tier and times promotion
+back on lookup.
+
+    python benchmarks/membership_bench.py --users 1000000
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from membership import MemberStore  # noqa: E402
+from wallets import b58encode  # noqa: E402
+
+IDLE_SECONDS = 7 * 86400
+
+
+def rss_bytes():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def members(count, now, seed=7):
+    """Payload-like rows; the strings are fresh objects, as they would be from JSON"""
+    rng = random.Random(seed)
+    for i in range(count):
+        yield (5_000_000_000 + i * 13, f"user{rng.randrange(10**8)}", rng.randint(1, 40),
+               b58encode(rng.randbytes(32)), now - rng.randrange(30 * 86400))
+
+
+def build_dicts(count, now):
+    verified = {}
+    for user_id, username, nft_count, wallet, verified_at in members(count, now):
+        verified[user_id] = {"username": username, "verified_at": verified_at,
+                             "nft_count": nft_count, "wallet_address": wallet}
+    return verified
+
+
+def build_store(count, now, path):
+    clock = [now]
+    store = MemberStore(path, idle_seconds=IDLE_SECONDS, clock=lambda: clock[0])
+    for user_id, username, nft_count, wallet, verified_at in members(count, now):
+        clock[0] = verified_at  # last seen when they verified
+        store.record(user_id, username, nft_count, wallet)
+    clock[0] = now
+    return store
+
+
+def measure(variant, count):
+    """Runs in the child interpreter: build one variant and report its cost"""
+    now = time.time()
+    gc.collect()
+    before = rss_bytes()
+    start = time.perf_counter()
+    result = {"variant": variant}
+    if variant == "dicts":
+        held = build_dicts(count, now)
+    else:
+        tmp = tempfile.mkdtemp()
+        held = build_store(count, now, os.path.join(tmp, "members.sqlite3"))
+    result["build_seconds"] = time.perf_counter() - start
+    gc.collect()
+    result["bytes_per_user"] = (rss_bytes() - before) / count
+
+    if variant == "store":
+        wallets = [row[3] for row in members(1000, now)]
+        start = time.perf_counter()
+        for wallet in wallets:
+            held.users_for_wallet(wallet)
+        result["wallet_lookup_us"] = (time.perf_counter() - start) * 1e6 / len(wallets)
+        start = time.perf_counter()
+        result["demoted"] = held.demote_idle()
+        result["demote_seconds"] = time.perf_counter() - start
+        result["hot_after_demote"] = held.hot_count
+        sample = random.Random(1).sample(range(count), min(count, 1000))
+        start = time.perf_counter()
+        for i in sample:
+            held.get(5_000_000_000 + i * 13)
+        result["lookup_ms"] = (time.perf_counter() - start) * 1000 / len(sample)
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Membership record memory benchmark")
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--variant", choices=("dicts", "store"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.variant:
+        measure(args.variant, args.users)
+        return
+
+    for variant in ("dicts", "store"):
+        output = subprocess.run([sys.executable, __file__, "--users", str(args.users), "--variant", variant],
+                                capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.splitlines()[-1])
+        label = "dict of dicts" if variant == "dicts" else "MemberStore"
+        print(f"📦 {label:13s} {result['bytes_per_user']:6.0f} B/user  "
+              f"{result['bytes_per_user'] * args.users / 2**20:7.1f} MiB at {args.users:,} users  "
+              f"built in {result['build_seconds']:.1f}s")
+        if variant == "store":
+            print(f"👛 Wallet -> accounts lookup: {result['wallet_lookup_us']:.1f} µs")
+            print(f"💤 Demoted {result['demoted']:,} members idle > 7 days in {result['demote_seconds']:.1f}s, "
+                  f"{result['hot_after_demote']:,} left in memory")
+            print(f"🔍 Lookup (promotes from disk when idle): {result['lookup_ms']:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Analytics rollup benchmark: a year of synthetic events, then range queries.
+
+Builds the rollups from a generated analytics log, snapshots them, reopens
+from the snapshot and times year/month/day queries at every resolution.
+
+    python benchmarks/rollups_bench.py --events 500000
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rollups import Rollups  # noqa: E402
+
+YEAR = 365 * 86400
+
+
+def write_log(path, events, now):
+    rng = random.Random(42)
+    start = now - YEAR
+    with open(path, "w") as f:
+        for i in range(events):
+            status = rng.choice(("joined", "verified", "removed"))
+            entry = {"timestamp": start + i * YEAR / events, "user_id": rng.randrange(10**9), "status": status}
+            if status == "verified":
+                entry["nft_count"] = rng.randint(1, 80)
+            elif status == "removed":
+                entry["reason"] = rng.choice(("timeout", "no_nft"))
+            f.write(json.dumps(entry) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analytics rollups benchmark")
+    parser.add_argument("--events", type=int, default=500_000)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    now = time.time()
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = os.path.join(tmp, "analytics.json")
+        snapshot_path = os.path.join(tmp, "analytics_rollups.bin")
+        write_log(log_path, args.events, now)
+
+        start = time.perf_counter()
+        rollups = Rollups.open(log_path)
+        print(f"🏗️ Built from {args.events:,} events in {time.perf_counter() - start:.2f}s")
+        rollups.save(snapshot_path)
+        start = time.perf_counter()
+        rollups = Rollups.open(log_path, snapshot_path)
+        print(f"💾 Snapshot {os.path.getsize(snapshot_path) / 1024:.0f} KiB, reopened in "
+              f"{(time.perf_counter() - start) * 1000:.1f} ms")
+
+        for label, span in (("year", YEAR), ("month", 30 * 86400), ("day", 86400)):
+            for resolution in (None, "minute", "hour", "day"):
+                timings = []
+                try:
+                    for _ in range(args.queries):
+                        start = time.perf_counter()
+                        result = rollups.query(now - span, now, resolution)
+                        timings.append((time.perf_counter() - start) * 1000)
+                except ValueError as e:
+                    print(f"  {label:5s} {resolution or 'auto':6s} skipped: {e}")
+                    continue
+                print(f"  {label:5s} {resolution or 'auto':6s} -> {result['resolution']:6s} "
+                      f"{len(result['buckets']):7,} buckets  median {statistics.median(timings):7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Cold-start benchmark: import-to-ready time of the bot server.
+
+Each run is a fresh interpreter that imports ``server``, calls
+``create_app()``, builds the telegram Application and Flask app, and
+initializes the bot against a local fake Bot API (one ``getMe``). Reports the
+median of every phase across runs.
+
+    python benchmarks/startup_bench.py --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import fake_bot_api  # noqa: E402
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import time
+started = time.perf_counter()
+import asyncio, json, sys
+sys.path.insert(0, {repo!r})
+import server
+imported = time.perf_counter()
+bot_server = server.create_app(server.Config(bot_token="123456:BENCHMARK", group_id="-1001234567890",
+                                             telegram_api_base_url={base_url!r}, callback_dedupe_file=""))
+created = time.perf_counter()
+application = bot_server.application
+built = time.perf_counter()
+bot_server.flask_app
+flask_built = time.perf_counter()
+
+async def ready():
+    await application.initialize()
+    await application.shutdown()
+
+asyncio.run(ready())
+initialized = time.perf_counter()
+print("RESULT " + json.dumps({{
+    "import_ms": (imported - started) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "build_application_ms": (built - created) * 1000,
+    "build_flask_ms": (flask_built - built) * 1000,
+    "initialize_ms": (initialized - flask_built) * 1000,
+    "total_ms": (initialized - started) * 1000,
+}}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bot server cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    api = fake_bot_api.FakeBotAPI()
+    api.start()
+    code = CHILD.format(repo=REPO_ROOT, base_url=api.base_url)
+
+    runs = []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=REPO_ROOT).stdout
+        result = next((line[len("RESULT "):] for line in output.splitlines() if line.startswith("RESULT ")), None)
+        if result is None:
+            print(f"❌ Startup run failed:\n{output}")
+            sys.exit(1)
+        runs.append(json.loads(result))
+    api.stop()
+
+    print(f"🚀 Cold start, median of {args.runs} runs:")
+    for phase in runs[0]:
+        print(f"  {phase:22s} {statistics.median(run[phase] for run in runs):8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Verification token throughput on one core.
+
+Issues a batch of tokens and validates them in a tight loop, including a
+share of forged and expired ones, and checks validation stays above the
+100k tokens/second/core target.
+
+    python benchmarks/token_bench.py --tokens 20000 --rounds 10
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("VERIFY_TOKEN_SECRET", "benchmark-secret")
+import verification_token  # noqa: E402
+
+TARGET_PER_SECOND = 100_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verification token benchmark")
+    parser.add_argument("--tokens", type=int, default=20_000)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--bad-every", type=int, default=10, help="Every Nth token is forged (0 = none)")
+    args = parser.parse_args()
+
+    group_id = "-1001234567890"
+    now = time.time()
+    start = time.perf_counter()
+    tokens = [verification_token.issue(7_000_000_000 + i, group_id, f"{i:032x}", now) for i in range(args.tokens)]
+    issue_rate = args.tokens / (time.perf_counter() - start)
+    if args.bad_every:
+        for i in range(0, len(tokens), args.bad_every):
+            tokens[i] = tokens[i][:-4] + "AAAA"
+
+    verify = verification_token.verify
+    TokenError = verification_token.TokenError
+    rejected = 0
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        for token in tokens:
+            try:
+                verify(token, now)
+            except TokenError:
+                rejected += 1
+    elapsed = time.perf_counter() - start
+    validate_rate = args.tokens * args.rounds / elapsed
+
+    print(f"🔏 Issue:    {issue_rate:12,.0f} tokens/s")
+    print(f"🔍 Validate: {validate_rate:12,.0f} tokens/s ({elapsed / (args.tokens * args.rounds) * 1e6:.2f} µs each, "
+          f"{rejected:,} rejected)")
+    if validate_rate >= TARGET_PER_SECOND:
+        print(f"✅ Above the {TARGET_PER_SECOND:,}/s per-core target")
+    else:
+        print(f"❌ Below the {TARGET_PER_SECOND:,}/s per-core target")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Replay recorded production traffic through the bot's handlers.
+
+Reads a log written with ``TRAFFIC_RECORD_FILE`` (see ``traffic.py``) and
+feeds it to the bot server in-process: updates go through the lane update
+processor and callback payloads through ``/verify_callback``, both on the
+production code paths. ``simulation.SimulatedTelegram`` answers Bot API calls
+after ``--latency-ms``. The event loop runs on real time, so the reported
+latencies are real.
+
+``--speed 1`` keeps the recorded pacing (2 doubles it) and shows how the bot
+copes with the real arrival pattern. ``--speed 0`` sends everything as fast as
+it is accepted and measures peak throughput. Per-update latency runs from
+hand-off to the update processor until every handler has finished. It is
+reported per lane. Callback latency is the time to the HTTP response.
+
+Recorded tokens are redacted, so every callback gets a fresh verification ID
+and a token signed for it and its (pseudonymous) user. Otherwise callbacks
+without a recorded ID would share one dedupe key and be answered from the
+idempotency cache instead of running the handler. Admission control is not applied: it rate-limits
+on the real clock and would shed a fast replay. Removal timers are not waited
+for. The replay ends when the outbox has drained.
+
+    python benchmarks/traffic_replay.py traffic.jsonl.gz --speed 0
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import simulation  # noqa: E402
+import tracing  # noqa: E402
+import traffic  # noqa: E402
+import verification_token  # noqa: E402
+from load_test import percentile  # noqa: E402
+from telegram import Update  # noqa: E402
+
+
+def load(path, limit=None):
+    """Events as (offset, kind, data), the recorded group mapped to the simulation's"""
+    events = []
+    for offset, kind, data, group_id in traffic.read_traffic(path):
+        if kind == traffic.UPDATE and group_id is not None:
+            data = remap_group(data, int(group_id))
+        events.append((offset, kind, data))
+        if limit and len(events) >= limit:
+            break
+    return events
+
+
+def remap_group(data, group_id):
+    if isinstance(data, list):
+        return [remap_group(item, group_id) for item in data]
+    if not isinstance(data, dict):
+        return data
+    return {key: simulation.GROUP_ID if key in ("id", "chat_id") and value == group_id else remap_group(value, group_id)
+            for key, value in data.items()}
+
+
+def summarize(latencies):
+    return {
+        "count": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2),
+    }
+
+
+async def replay(args, events, workdir):
+    telegram = simulation.SimulatedTelegram(time, args.latency_ms / 1000)
+    sim = simulation.Simulation(telegram, workdir, verification_timeout=args.verification_timeout)
+    server = sim.server
+    latencies = defaultdict(list)  # lane or "callback" -> seconds
+    statuses = Counter()
+    pending = []
+
+    async def timed_update(data):
+        lane = server.update_lane(Update.de_json(dict(data), sim.app.application.bot))
+        start = time.perf_counter()
+        await sim.push_update(data)
+        latencies[lane].append(time.perf_counter() - start)
+
+    async def timed_callback(payload):
+        payload = dict(payload, verification_id=tracing.new_verification_id())
+        try:
+            payload["token"] = verification_token.issue(int(payload["tg_id"]), simulation.GROUP_ID,
+                                                        payload["verification_id"], issued_at=time.time())
+        except (KeyError, TypeError, ValueError):
+            pass  # replayed as recorded: rejected like the original
+        start = time.perf_counter()
+        _, status = await asyncio.to_thread(sim.callback, payload)
+        latencies["callback"].append(time.perf_counter() - start)
+        statuses[status] += 1
+
+    await sim.start()
+    try:
+        first = events[0][0] if events else 0.0
+        start = time.perf_counter()
+        for offset, kind, data in events:
+            if args.speed:
+                delay = (offset - first) / args.speed - (time.perf_counter() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            elif len(pending) % 256 == 0:
+                await asyncio.sleep(0)  # let handlers start while the backlog is queued
+            pending.append(asyncio.ensure_future(timed_update(data) if kind == traffic.UPDATE else timed_callback(data)))
+        await asyncio.gather(*pending)
+        handled = time.perf_counter() - start
+        while server.outbox.counts()["pending"] or server.supervisor.live_counts().get("admin_notify"):
+            await asyncio.sleep(0.05)
+        drained = time.perf_counter() - start
+    finally:
+        await sim.stop()
+    return telegram, latencies, statuses, handled, drained
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded Telegram traffic through the bot's handlers")
+    parser.add_argument("path", help="Log written with TRAFFIC_RECORD_FILE")
+    parser.add_argument("--speed", type=float, default=1.0, help="Multiple of the recorded pace, 0 = as fast as possible")
+    parser.add_argument("--limit", type=int, help="Replay only the first N events")
+    parser.add_argument("--latency-ms", type=float, default=30, help="Simulated Bot API latency")
+    parser.add_argument("--verification-timeout", type=float, default=300)
+    parser.add_argument("--verbose", action="store_true", help="Show the bot's own output and tracebacks")
+    parser.add_argument("--output", help="Append the result as one JSON line to this file")
+    args = parser.parse_args()
+
+    events = load(args.path, args.limit)
+    if not events:
+        sys.exit(f"No events in {args.path}")
+    quiet = open(os.devnull, "w")
+    with tempfile.TemporaryDirectory(prefix="bot-replay-") as workdir, \
+            contextlib.redirect_stdout(sys.stdout if args.verbose else quiet), \
+            contextlib.redirect_stderr(sys.stderr if args.verbose else quiet):
+        telegram, latencies, statuses, handled, drained = asyncio.run(replay(args, events, workdir))
+
+    recorded = events[-1][0] - events[0][0]
+    result = {
+        "events": len(events),
+        "recorded_seconds": round(recorded, 2),
+        "replay_seconds": round(handled, 3),
+        "drain_seconds": round(drained, 3),
+        "events_per_s": round(len(events) / handled, 1) if handled else None,
+        "latency": {name: summarize(values) for name, values in sorted(latencies.items())},
+        "callback_statuses": dict(statuses),
+        "api_calls": dict(telegram.succeeded),
+    }
+    pace = f"{args.speed:g}x" if args.speed else "max speed"
+    print(f"📼 {len(events):,} events recorded over {recorded:,.1f}s, replayed at {pace} in {handled:.2f}s "
+          f"({result['events_per_s']:,}/s), outbox drained after {drained:.2f}s")
+    for name, stats in result["latency"].items():
+        print(f"  {name:10s} {stats['count']:7,}  p50 {stats['p50_ms']:8.2f} ms  p99 {stats['p99_ms']:8.2f} ms  "
+              f"max {stats['max_ms']:8.2f} ms")
+    if statuses:
+        print("📬 Callback responses: " + ", ".join(f"{status} × {count:,}" for status, count in sorted(statuses.items())))
+    print("📨 " + (", ".join(f"{method} {count:,}" for method, count in telegram.succeeded.most_common()) or "no Bot API calls"))
+    if args.output:
+        with open(args.output, "a") as f:
+            f.write(json.dumps({"args": vars(args), **result}) + "\n")
+
+
+if __name__ == "__main__":
+    main()
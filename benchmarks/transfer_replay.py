@@ -0,0 +1,207 @@
+"""
+End-to-end replay of Helius transfer webhooks.
+
+Starts the fake Bot API and fake Helius in-process and ``server.py`` as a
+subprocess, verifies a set of members, then POSTs transfer webhook batches to
+``/helius/transfers`` - synthetic ones by default, or recorded payloads with
+``--payloads DIR``. Reports how many members were revoked, how many ownership
+lookups that took, and the time from the first batch to the last removal.
+
+Synthetic scenario: ``--sellers`` members transfer their only NFT away and
+must be removed; ``--keepers`` members receive one NFT and then send a
+different one away, so the local ownership state knows they still hold one
+and no lookup is made for them; ``--strangers`` members send away an NFT of
+another collection, which is not in ``COLLECTION_MINTS_FILE`` and must not
+cause a lookup either. A malformed batch is posted first and must
+be answered 200, or Helius would redeliver it forever.
+
+    python benchmarks/transfer_replay.py --sellers 50 --keepers 50
+    python benchmarks/transfer_replay.py --payloads recorded/ --save synthetic/
+"""
+
+import argparse
+import json
+import os
+import secrets
+import sys
+import tempfile
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import fake_bot_api  # noqa: E402
+import fake_helius  # noqa: E402
+from load_test import free_port, start_bot, wait_until_ready  # noqa: E402
+
+WEBHOOK_SECRET = "replay-secret"
+BASE_USER_ID = 8_000_000_000
+
+
+def transaction(transfers):
+    return {
+        "signature": secrets.token_hex(32),
+        "timestamp": int(time.time()),
+        "type": "TRANSFER",
+        "source": "SYSTEM_PROGRAM",
+        "tokenTransfers": [{
+            "fromUserAccount": from_wallet,
+            "toUserAccount": to_wallet,
+            "mint": mint,
+            "tokenAmount": 1,
+            "tokenStandard": "NonFungible",
+        } for mint, from_wallet, to_wallet in transfers],
+    }
+
+
+# Entries that are not dicts, a non-numeric amount, a non-list tokenTransfers - each must be skipped
+MALFORMED_BATCH = [
+    "not a transaction",
+    {"signature": "malformed-1", "tokenTransfers": [7, "x", None, {"mint": "m", "tokenAmount": "one"}]},
+    {"signature": "malformed-2", "tokenTransfers": {"mint": "m"}},
+    {"signature": "malformed-3", "tokenTransfers": [{"mint": ["m"], "tokenAmount": [1], "fromUserAccount": 5}]},
+]
+
+
+def collection_mints(sellers, keepers):
+    """The mints the synthetic batches move that belong to the collection"""
+    return ([fake_helius.fake_pubkey(f"mint/in/{i}") for i in range(len(keepers))]
+            + [fake_helius.fake_pubkey(f"mint/out/{i}") for i in range(len(sellers) + len(keepers))])
+
+
+def synthetic_batches(sellers, keepers, strangers, batch_size):
+    """Two rounds: keepers receive a mint, then everyone sends one away - strangers one of another collection"""
+    received = [transaction([(fake_helius.fake_pubkey(f"mint/in/{i}"), fake_helius.fake_pubkey(f"market/{i}"), wallet)])
+                for i, wallet in enumerate(keepers)]
+    sent = [transaction([(fake_helius.fake_pubkey(f"mint/out/{i}"), wallet, fake_helius.fake_pubkey(f"buyer/{i}"))])
+            for i, wallet in enumerate(sellers + keepers)]
+    sent += [transaction([(fake_helius.fake_pubkey(f"mint/other/{i}"), wallet, fake_helius.fake_pubkey(f"buyer/other/{i}"))])
+             for i, wallet in enumerate(strangers)]
+    batches = []
+    for round_ in (received, sent):
+        batches.extend(round_[i:i + batch_size] for i in range(0, len(round_), batch_size))
+    return [json.dumps(batch).encode() for batch in batches]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay Helius transfer webhooks against the bot")
+    parser.add_argument("--sellers", type=int, default=50)
+    parser.add_argument("--keepers", type=int, default=50)
+    parser.add_argument("--strangers", type=int, default=50, help="Members who only sell an NFT of another collection")
+    parser.add_argument("--batch-size", type=int, default=25, help="Transactions per synthetic webhook batch")
+    parser.add_argument("--payloads", help="Directory of recorded payloads to replay instead")
+    parser.add_argument("--mints", help="COLLECTION_MINTS_FILE for recorded payloads (synthetic runs write their own)")
+    parser.add_argument("--save", help="Write the synthetic payloads here for later replay")
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    api = fake_bot_api.FakeBotAPI()
+    api.start()
+    helius = fake_helius.FakeHelius()
+    sellers = [fake_helius.fake_pubkey(f"seller/{i}") for i in range(args.sellers)]
+    keepers = [fake_helius.fake_pubkey(f"keeper/{i}") for i in range(args.keepers)]
+    strangers = [fake_helius.fake_pubkey(f"stranger/{i}") for i in range(args.strangers)]
+    for wallet in sellers:
+        helius.wallets[wallet] = fake_helius.Wallet([])
+    for wallet in keepers + strangers:
+        helius.wallets[wallet] = fake_helius.Wallet(fake_helius.generate_assets(wallet, 3, 0))
+    helius.start()
+
+    if args.payloads:
+        names = sorted(name for name in os.listdir(args.payloads) if name.endswith(".json"))
+        payloads = []
+        for name in names:
+            with open(os.path.join(args.payloads, name), "rb") as f:
+                payloads.append(f.read())
+    else:
+        payloads = synthetic_batches(sellers, keepers, strangers, args.batch_size)
+        if args.save:
+            os.makedirs(args.save, exist_ok=True)
+            for i, body in enumerate(payloads):
+                with open(os.path.join(args.save, f"{i:05d}.json"), "wb") as f:
+                    f.write(body)
+
+    http_port = free_port()
+    with tempfile.TemporaryDirectory(prefix="bot-replay-") as workdir:
+        mints_file = args.mints
+        if not args.payloads:
+            mints_file = os.path.join(workdir, "mints.txt")
+            with open(mints_file, "w") as f:
+                f.write("\n".join(collection_mints(sellers, keepers)) + "\n")
+        if mints_file:
+            os.environ["COLLECTION_MINTS_FILE"] = mints_file
+        os.environ.update({
+            "HELIUS_API_KEY": "replay",
+            "COLLECTION_ID": fake_helius.COLLECTION_ID,
+            "HELIUS_RPC_URL": helius.base_url,
+            "HELIUS_WEBHOOK_SECRET": WEBHOOK_SECRET,
+            "MAX_ACCOUNTS_PER_WALLET": "0",
+        })
+        process, log = start_bot(api, http_port, workdir, os.path.join(workdir, "bot.log"))
+        try:
+            if not wait_until_ready(api, http_port, 30):
+                print("❌ Bot did not become ready")
+                sys.exit(1)
+            base = f"http://127.0.0.1:{http_port}"
+            for i, wallet in enumerate(sellers + keepers + strangers):
+                requests.post(f"{base}/verify_callback", timeout=30, json={
+                    "tg_id": BASE_USER_ID + i, "has_nft": True, "username": f"member{i}",
+                    "wallet_address": wallet, "nft_count": 1,
+                }).raise_for_status()
+
+            response = requests.post(f"{base}/helius/transfers", json=MALFORMED_BATCH, timeout=30,
+                                     headers={"Authorization": WEBHOOK_SECRET})
+            malformed_status = response.status_code
+
+            bans_before = api.calls.get("banChatMember", 0)
+            lookups_before = helius.stats()[0]
+            start = time.perf_counter()
+            queued = 0
+            for body in payloads:
+                response = requests.post(f"{base}/helius/transfers", data=body, timeout=30, headers={
+                    "Content-Type": "application/json", "Authorization": WEBHOOK_SECRET})
+                response.raise_for_status()
+                queued += response.json()["rechecks_queued"]
+            posted = time.perf_counter() - start
+
+            expected = len(sellers) if not args.payloads else None
+            deadline = time.monotonic() + args.timeout
+            last_change, last_count = time.perf_counter(), bans_before
+            while time.monotonic() < deadline:
+                count = api.calls.get("banChatMember", 0)
+                if count != last_count:
+                    last_change, last_count = time.perf_counter(), count
+                if expected is not None and count - bans_before >= expected:
+                    break
+                if expected is None and time.perf_counter() - last_change > 3:
+                    break
+                time.sleep(0.05)
+            revoked = api.calls.get("banChatMember", 0) - bans_before
+            lookups = helius.stats()[0] - lookups_before
+        finally:
+            process.terminate()
+            process.wait(timeout=15)
+            log.close()
+        with open(os.path.join(workdir, "bot.log")) as f:
+            tracebacks = f.read().count("Traceback")
+
+    print(f"🧪 Malformed batch answered {malformed_status}")
+    print(f"📦 {len(payloads)} webhook batches posted in {posted * 1000:.0f} ms, {queued} re-checks queued")
+    print(f"🔎 {lookups} ownership lookups")
+    print(f"🚫 {revoked} members revoked" + (f" (expected {expected})" if expected is not None else "")
+          + f", last removal {(last_change - start) * 1000:.0f} ms after the first batch")
+    if tracebacks:
+        print(f"⚠️ {tracebacks} tracebacks in the bot log")
+    api.stop()
+    helius.stop()
+    if malformed_status != 200:
+        print("❌ A malformed batch must be answered 200 - Helius retries anything else")
+        sys.exit(1)
+    if expected is not None and (revoked != expected or lookups != len(sellers)):
+        print(f"❌ Expected {expected} removals from {len(sellers)} lookups")
+        sys.exit(1)
+    print("✅ Only the wallets that lost their NFT were looked up and revoked")
+
+
+if __name__ == "__main__":
+    main()
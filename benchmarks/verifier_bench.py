@@ -0,0 +1,166 @@
+"""
+Verifier microbenchmarks against a fake Helius server.
+
+For every verifier backend and every wallet profile served by
+``benchmarks/fake_helius.py`` this measures time per verification
+(mean/p50/p99), response bytes decoded per verification and peak Python
+memory (tracemalloc) of one verification. Then ``--burst`` concurrent checks
+of the slow wallet show how many Helius requests single-flight lets through,
+and ``--rule-counts`` times one DAS eligibility check against growing sets of
+eligibility rules (the cost should stay one lookup, whatever the rule count).
+
+    python benchmarks/verifier_bench.py --iterations 20
+    python benchmarks/verifier_bench.py --fixtures recorded_wallets/ --backends rest das
+
+The JS backend shells out to node and is skipped unless ``node`` and its
+script are available.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import statistics
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fake_helius  # noqa: E402
+
+
+def load_backends(names):
+    import verifier
+    import verifier_js
+
+    backends = {"rest": verifier.has_nft, "das": verifier.has_nft_das, "js": verifier_js.has_nft_js}
+    selected = {}
+    for name in names:
+        # verifier_js runs ../test_js.js relative to the working directory
+        if name == "js" and not (shutil.which("node") and os.path.exists(os.path.join("..", "test_js.js"))):
+            print("⚠️ Skipping js backend - node or ../test_js.js is missing")
+            continue
+        selected[name] = backends[name]
+    return selected
+
+
+def measure(helius, check, wallet, iterations):
+    # Verifiers print on every call - keep that out of the report, not out of the timing
+    sink = io.StringIO()
+    timings = []
+    requests_before, bytes_before = helius.stats()
+    with contextlib.redirect_stdout(sink):
+        result = check(wallet)  # warm-up: connection setup, imports
+        requests_before, bytes_before = helius.stats()
+        for _ in range(iterations):
+            start = time.perf_counter()
+            check(wallet)
+            timings.append(time.perf_counter() - start)
+        requests_after, bytes_after = helius.stats()
+
+        tracemalloc.start()
+        check(wallet)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    ordered = sorted(timings)
+    return {
+        "result": result,
+        "mean_ms": round(statistics.fmean(timings) * 1000, 2),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 2),
+        "p99_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000, 2),
+        "requests_per_check": round((requests_after - requests_before) / iterations, 2),
+        "bytes_per_check": (bytes_after - bytes_before) // iterations,
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def burst(helius, check, wallet, callers):
+    """``callers`` simultaneous checks of one wallet; returns (Helius requests made, seconds)"""
+    requests_before, _ = helius.stats()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=callers) as pool:
+        list(pool.map(check, [wallet] * callers))
+        pool.submit(check, "not-a-wallet!").result()  # rejected locally, never sent
+    return helius.stats()[0] - requests_before, time.perf_counter() - start
+
+
+def rule_spec(count):
+    """``count`` rules: higher tiers on collections the wallet doesn't hold, then the required collection"""
+    rules = [f"tier{i}:{fake_helius.fake_pubkey(f'collection/extra/{i}')}|{fake_helius.OTHER_COLLECTION_ID}>=20000"
+             for i in range(count - 1)]
+    return ";".join(rules + [f"holder:{fake_helius.COLLECTION_ID}"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifier microbenchmarks against a fake Helius")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--backends", nargs="+", default=["rest", "das", "js"], choices=["rest", "das", "js"])
+    parser.add_argument("--profiles", nargs="+", help="Only these wallet profiles")
+    parser.add_argument("--fixtures", help="Directory of recorded <wallet>.json responses")
+    parser.add_argument("--output", help="Append results as JSON lines to this file")
+    parser.add_argument("--burst", type=int, default=20, help="Concurrent checks of the slow wallet to coalesce (0 to skip)")
+    parser.add_argument("--rule-counts", nargs="*", type=int, default=[1, 10, 100],
+                        help="Eligibility rule counts to time one DAS check of 10k_match_last against")
+    args = parser.parse_args()
+
+    helius = fake_helius.FakeHelius()
+    helius.add_profiles()
+    if args.fixtures:
+        helius.load_fixtures(args.fixtures)
+    helius.warm()
+    helius.start()
+
+    os.environ.update({
+        "HELIUS_API_KEY": "benchmark",
+        "COLLECTION_ID": fake_helius.COLLECTION_ID,
+        "HELIUS_API_URL": helius.base_url,
+        "HELIUS_RPC_URL": helius.base_url,
+    })
+    backends = load_backends(args.backends)
+
+    rows = []
+    print(f"{'backend':8s} {'profile':24s} {'result':>6s} {'mean ms':>9s} {'p50 ms':>9s} {'p99 ms':>9s} "
+          f"{'reqs':>5s} {'bytes/check':>12s} {'peak KiB':>9s}")
+    for backend, check in backends.items():
+        for profile, wallet in helius.profile_wallets.items():
+            if args.profiles and profile not in args.profiles:
+                continue
+            row = {"backend": backend, "profile": profile, **measure(helius, check, wallet, args.iterations)}
+            rows.append(row)
+            print(f"{backend:8s} {profile:24s} {str(row['result']):>6s} {row['mean_ms']:9.2f} {row['p50_ms']:9.2f} "
+                  f"{row['p99_ms']:9.2f} {row['requests_per_check']:5.1f} {row['bytes_per_check']:12d} {row['peak_kib']:9.1f}")
+
+    if args.burst and "slow_holder" in helius.profile_wallets:
+        print()
+        for backend, check in backends.items():
+            made, seconds = burst(helius, check, helius.profile_wallets["slow_holder"], args.burst)
+            print(f"🔀 {backend}: {args.burst} concurrent checks of slow_holder + 1 malformed address -> "
+                  f"{made} Helius requests in {seconds * 1000:.0f} ms")
+
+    wallet = helius.profile_wallets.get("10k_match_last")
+    if args.rule_counts and wallet:
+        import verifier
+        print()
+        for count in args.rule_counts:
+            os.environ["ELIGIBILITY_RULES"] = rule_spec(count)
+            row = measure(helius, verifier.check_eligibility, wallet, args.iterations)
+            row["result"] = row["result"].as_dict()["counts"]["holder"]
+            rows.append({"backend": "das_rules", "profile": f"10k_match_last/{count}_rules", **row})
+            print(f"🧩 {count:4d} rules: {row['mean_ms']:8.2f} ms mean, {row['requests_per_check']:.1f} requests per check, "
+                  f"holder count {row['result']:,}")
+        os.environ.pop("ELIGIBILITY_RULES")
+
+    helius.stop()
+    if args.output:
+        with open(args.output, "a") as f:
+            for row in rows:
+                f.write(json.dumps({"timestamp": time.time(), **row}) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Bounded, TTL'd idempotency cache for repeated deliveries.
+
+The first delivery of a key claims it and runs; concurrent repeats are told it
+is still in progress (they never wait, so they do not hold a worker thread),
+and later repeats get the stored result back without running again.
+Completed results are appended to a JSON-lines file so they survive restarts;
+the file is compacted once it holds twice the cache bound. If the file cannot
+be written, the cache keeps working in memory only.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class IdempotencyCache:
+    """``claim()`` / ``complete()`` / ``release()`` around a side-effecting call"""
+
+    def __init__(self, max_entries=10000, ttl_seconds=600, path=None, clock=time.time):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = path
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._results = OrderedDict()  # key -> (expires_at, result)
+        self._in_flight = set()  # keys claimed and still running
+        self._log_lines = 0
+        if path:
+            self._load()
+
+    def __len__(self):
+        return len(self._results)
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            print(f"⚠️ Could not read dedupe file {self.path}: {e}")
+            return
+        now = self.clock()
+        for line in lines:
+            try:
+                key, expires_at, result = json.loads(line)
+            except ValueError:
+                continue
+            if expires_at > now:
+                self._results[key] = (expires_at, result)
+                self._results.move_to_end(key)
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+        self._log_lines = len(lines)
+        print(f"✅ Loaded {len(self._results)} dedupe entries from {self.path}")
+
+    def _lookup(self, key, now):
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del self._results[key]
+            return None
+        return entry[1]
+
+    def claim(self, key):
+        """Return ``(True, None)`` if the caller should run, else ``(False, result)``.
+
+        ``result`` is ``None`` when another delivery of the same key is still
+        running - the caller should ask the sender to retry later.
+        """
+        with self._lock:
+            result = self._lookup(key, self.clock())
+            if result is not None:
+                return False, result
+            if key in self._in_flight:
+                return False, None
+            self._in_flight.add(key)
+            return True, None
+
+    def complete(self, key, result):
+        """Store the result of a claimed key"""
+        expires_at = self.clock() + self.ttl_seconds
+        with self._lock:
+            self._results[key] = (expires_at, result)
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+            self._in_flight.discard(key)
+            self._persist(key, expires_at, result)
+
+    def release(self, key):
+        """Give up a claim without storing anything, so a retry can run again"""
+        with self._lock:
+            self._in_flight.discard(key)
+
+    def _persist(self, key, expires_at, result):
+        if not self.path:
+            return
+        try:
+            if self._log_lines >= 2 * self.max_entries:
+                tmp_path = self.path + ".tmp"
+                with open(tmp_path, "w") as f:
+                    for k, (exp, res) in self._results.items():
+                        f.write(json.dumps([k, exp, res]) + "\n")
+                os.replace(tmp_path, self.path)
+                self._log_lines = len(self._results)
+            else:
+                with open(self.path, "a") as f:
+                    f.write(json.dumps([key, expires_at, result]) + "\n")
+                self._log_lines += 1
+        except OSError as e:
+            print(f"⚠️ Could not persist dedupe entry to {self.path}: {e}")
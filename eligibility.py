@@ -0,0 +1,160 @@
+"""
+Eligibility rules over the NFT collections a wallet holds.
+
+A rule is met by at least ``minimum`` NFTs from any of its collections, e.g.
+"any of A, B or C" or "at least 3 from A". ``ELIGIBILITY_RULES`` lists rules
+as ``name:COLLECTION|COLLECTION>=N``, separated by ``;``, in tier order with
+the highest tier first. ``>=N`` may be left out for 1:
+
+    ELIGIBILITY_RULES="whale:A>=3;holder:A|B|C"
+
+Without it there is one rule, ``holder:$COLLECTION_ID``: the single
+collection check.
+
+``RuleSet`` compiles the rules into one map from collection ID to the rules
+that collection counts toward. A wallet's assets are evaluated for every rule
+in one pass, with one dictionary lookup per asset. Adding collections or
+rules adds map entries, not Helius requests.
+"""
+
+import os
+from functools import lru_cache
+
+import metrics
+
+evaluations = metrics.counter("bot_eligibility_evaluations_total", "Wallet eligibility evaluations by the tier reached", ("tier",))
+
+
+class RuleError(ValueError):
+    pass
+
+
+class Rule:
+    __slots__ = ("name", "collections", "minimum")
+
+    def __init__(self, name, collections, minimum=1):
+        if minimum < 1:
+            raise RuleError(f"Rule {name}: minimum must be at least 1")
+        self.name = name
+        self.collections = frozenset(collections)
+        self.minimum = minimum
+
+    def __repr__(self):
+        return f"Rule({self.name}: {'|'.join(sorted(self.collections))}>={self.minimum})"
+
+
+def parse_rules(spec):
+    """Rules from ``name:A|B>=N;...`` - unnamed rules are called rule1, rule2, ..."""
+    rules = []
+    for index, part in enumerate(part.strip() for part in spec.split(";")):
+        if not part:
+            continue
+        name, separator, body = part.rpartition(":")
+        name = name.strip() if separator else f"rule{index + 1}"
+        body, separator, minimum = body.partition(">=")
+        collections = [collection.strip() for collection in body.split("|") if collection.strip()]
+        if not collections:
+            raise RuleError(f"Rule {part!r} names no collection")
+        try:
+            minimum = int(minimum) if separator else 1
+        except ValueError:
+            raise RuleError(f"Rule {part!r}: minimum must be a whole number") from None
+        if any(rule.name == name for rule in rules):
+            raise RuleError(f"Rule name {name!r} is used twice")
+        rules.append(Rule(name, collections, minimum))
+    return rules
+
+
+class Evaluation:
+    """Per-rule NFT counts for one wallet - ``feed()`` it assets, e.g. page by page.
+
+    Lookups stop paging once the top tier is met (``final``); counts of the
+    other rules are lower bounds from then on.
+    """
+
+    __slots__ = ("ruleset", "counts", "assets", "matched")
+
+    def __init__(self, ruleset):
+        self.ruleset = ruleset
+        self.counts = [0] * len(ruleset.rules)
+        self.assets = 0  # assets seen
+        self.matched = 0  # assets from any rule's collections
+
+    def feed(self, assets):
+        by_collection = self.ruleset.by_collection
+        counts = self.counts
+        for asset in assets:
+            self.assets += 1
+            for group in asset.get("grouping") or ():
+                if group.get("group_key") != "collection":
+                    continue
+                indexes = by_collection.get(group.get("group_value"))
+                if indexes:
+                    self.matched += 1
+                    for index in indexes:
+                        counts[index] += 1
+                break  # an NFT belongs to one collection
+        return self
+
+    @property
+    def met(self):
+        """Names of the rules this wallet meets, in tier order"""
+        return [rule.name for rule, count in zip(self.ruleset.rules, self.counts) if count >= rule.minimum]
+
+    @property
+    def tier(self):
+        """The highest rule met, or None"""
+        for rule, count in zip(self.ruleset.rules, self.counts):
+            if count >= rule.minimum:
+                return rule.name
+        return None
+
+    @property
+    def eligible(self):
+        return self.tier is not None
+
+    @property
+    def final(self):
+        """The top tier is met, so more assets cannot change the tier"""
+        return self.counts[0] >= self.ruleset.rules[0].minimum
+
+    def as_dict(self):
+        return {"tier": self.tier, "counts": dict(zip((rule.name for rule in self.ruleset.rules), self.counts)),
+                "matched": self.matched, "assets": self.assets}
+
+
+class RuleSet:
+    """Rules compiled for a single pass over a wallet's assets"""
+
+    def __init__(self, rules):
+        if not rules:
+            raise RuleError("No eligibility rules")
+        self.rules = tuple(rules)
+        by_collection = {}
+        for index, rule in enumerate(self.rules):
+            for collection in rule.collections:
+                by_collection.setdefault(collection, []).append(index)
+        self.by_collection = {collection: tuple(indexes) for collection, indexes in by_collection.items()}
+
+    def evaluate(self, assets=()):
+        return Evaluation(self).feed(assets)
+
+    def describe(self):
+        return "; ".join(f"{rule.name}: {len(rule.collections)} collection{'s' if len(rule.collections) != 1 else ''} "
+                         f">= {rule.minimum}" for rule in self.rules)
+
+
+@lru_cache(maxsize=8)
+def compile_rules(spec):
+    return RuleSet(parse_rules(spec))
+
+
+def configured_rules():
+    """The RuleSet for ``ELIGIBILITY_RULES`` (or ``COLLECTION_ID``), None if neither is set"""
+    spec = os.getenv("ELIGIBILITY_RULES")
+    if not spec:
+        collection_id = os.getenv("COLLECTION_ID")
+        if not collection_id:
+            return None
+        spec = f"holder:{collection_id}"
+    return compile_rules(spec)
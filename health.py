@@ -0,0 +1,146 @@
+"""
+Event-loop responsiveness and dependency probes for ``/ready``.
+
+``LoopMonitor`` runs on the bot's event loop and measures how late a short
+sleep wakes up (loop lag). A watchdog thread checks the loop's heartbeat.
+When the loop has been stuck for longer than ``slow_threshold``, it logs the
+task and the stack that is blocking it, once per stall. The result names the
+coroutine doing file I/O or CPU work on the loop.
+
+``Probe`` calls a dependency every ``interval`` seconds in the background and
+caches the outcome and latency. ``/ready`` then only reads cached values and
+never waits on Telegram or Helius itself.
+"""
+
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+import metrics
+
+slow_callbacks = metrics.counter("bot_slow_callbacks_total", "Times the event loop was blocked longer than the slow-callback threshold")
+
+
+class LoopMonitor:
+    def __init__(self, interval=0.25, slow_threshold=0.5, window=240):
+        self.interval = interval
+        self.slow_threshold = slow_threshold
+        self.lags = deque(maxlen=window)  # recent lag samples, seconds
+        self._last_beat = None
+        self._loop = None
+        self._thread_id = None
+        self._stopped = threading.Event()
+
+    def current_lag(self):
+        """Latest lag - or, if the loop has not ticked since, how overdue it is now"""
+        if self._last_beat is None:
+            return None
+        overdue = time.monotonic() - self._last_beat - self.interval
+        return max(self.lags[-1] if self.lags else 0.0, overdue, 0.0)
+
+    def max_lag(self):
+        return max(self.lags, default=0.0)
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        watchdog.start()
+        try:
+            while True:
+                start = time.monotonic()
+                await asyncio.sleep(self.interval)
+                self._last_beat = time.monotonic()
+                lag = self._last_beat - start - self.interval
+                self.lags.append(max(lag, 0.0))
+                metrics.observe("event_loop_lag", "ok", max(lag, 0.0))
+        finally:
+            self._stopped.set()
+
+    def _watch(self):
+        reported_beat = None
+        while not self._stopped.wait(self.slow_threshold / 2):
+            beat = self._last_beat
+            stalled = time.monotonic() - beat - self.interval
+            if stalled > self.slow_threshold and beat != reported_beat:
+                reported_beat = beat
+                slow_callbacks.inc()
+                self._report(stalled)
+
+    def _blocking_task(self, frame):
+        """The task whose coroutine is on the stuck thread's stack, None for a plain callback"""
+        on_stack = set()
+        while frame is not None:
+            on_stack.add(id(frame))
+            frame = frame.f_back
+        try:
+            tasks = asyncio.all_tasks(self._loop)  # the loop is stuck, so its task set is not changing
+        except RuntimeError:
+            return None
+        for task in tasks:
+            if id(getattr(task.get_coro(), "cr_frame", None)) in on_stack:
+                return task
+        return None
+
+    def _report(self, stalled):
+        frame = sys._current_frames().get(self._thread_id)
+        task = self._blocking_task(frame) if frame else None
+        where = "".join(traceback.format_stack(frame, limit=12)) if frame else "  (no stack)\n"
+        name = task.get_name() if task else "a callback outside any task"
+        coro = getattr(task.get_coro(), "__qualname__", "") if task else ""
+        print(f"🐢 Event loop blocked for {stalled * 1000:.0f} ms by {name} {coro}\n{where}", end="")
+
+
+class Probe:
+    """A dependency check run in the background; ``state()`` returns the cached result"""
+
+    def __init__(self, name, check, interval=30, timeout=5):
+        self.name = name
+        self.check = check  # async, raises on failure
+        self.interval = interval
+        self.timeout = timeout
+        self.ok = None
+        self.latency = None
+        self.error = None
+        self.checked_at = None
+
+    async def run(self):
+        while True:
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for(self.check(), self.timeout)
+                self.ok, self.error = True, None
+                outcome = "ok"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.ok, self.error = False, f"{type(e).__name__}: {e}"
+                outcome = "error"
+            self.latency = time.perf_counter() - start
+            self.checked_at = time.time()
+            metrics.observe(f"probe_{self.name}", outcome, self.latency)
+            await asyncio.sleep(self.interval)
+
+    def state(self, now=None):
+        now = time.time() if now is None else now
+        stale = self.checked_at is None or now - self.checked_at > self.interval * 3 + self.timeout
+        return {
+            "ok": bool(self.ok) and not stale,
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "checked_ago_s": round(now - self.checked_at, 1) if self.checked_at else None,
+            "error": self.error or ("no recent probe" if stale else None),
+        }
+
+
+def loop_state(monitor, max_lag):
+    lag = monitor.current_lag()
+    return {
+        "ok": lag is not None and lag <= max_lag,
+        "lag_ms": round(lag * 1000, 1) if lag is not None else None,
+        "max_lag_ms": round(monitor.max_lag() * 1000, 1),
+    }
@@ -0,0 +1,126 @@
+"""
+Concurrent update processing in lanes.
+
+Updates are sorted into lanes (joins, callback-driven actions, admin
+commands, everything else), each with its own concurrency limit, so a slow
+``welcome()`` or admin command cannot hold up the others. Updates from the
+same user still run one at a time, in arrival order, across all lanes.
+
+Work that does not arrive as an update - Telegram actions triggered by
+``/verify_callback`` or a transfer webhook - goes through the same lanes with
+``run(lane, user_id, coro)``, so it is ordered with that user's updates.
+
+Imported by ``build_application`` only, like ``telegram_request``.
+"""
+
+import asyncio
+import contextlib
+import time
+
+from telegram.ext import BaseUpdateProcessor
+
+import metrics
+
+DEFAULT_LANE = "default"
+
+
+class Lane:
+    __slots__ = ("name", "limit", "semaphore", "running", "waiting")
+
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        self.semaphore = asyncio.Semaphore(limit)
+        self.running = 0
+        self.waiting = 0
+
+
+class LaneUpdateProcessor(BaseUpdateProcessor):
+    """Update processor with per-lane limits and per-user ordering.
+
+    ``classify(update)`` names the lane for an update (unknown names go to
+    the default lane) and ``user_key(update)`` the user whose updates must
+    stay in order (None for no ordering). ``max_concurrent_updates`` caps
+    updates in flight overall, including those waiting for their lane or
+    for the same user's previous update. ``on_arrival(update)``, if given, is
+    called as each update arrives, before it waits for anything.
+    """
+
+    __slots__ = ("_lanes", "_classify", "_user_key", "_tails", "_on_arrival")
+
+    def __init__(self, limits, classify, user_key, max_concurrent_updates=256, on_arrival=None):
+        super().__init__(max_concurrent_updates)
+        self._lanes = {name: Lane(name, limit) for name, limit in limits.items()}
+        self._lanes.setdefault(DEFAULT_LANE, Lane(DEFAULT_LANE, 8))
+        self._classify = classify
+        self._user_key = user_key
+        self._tails = {}  # user key -> future resolved when that user's latest work is done
+        self._on_arrival = on_arrival
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_process_update(self, update, coroutine):
+        if self._on_arrival is not None:
+            self._on_arrival(update)
+        await self.run(self._classify(update), self._user_key(update), coroutine)
+
+    async def run(self, lane_name, user_id, coroutine):
+        """Await ``coroutine`` in ``lane_name`` after ``user_id``'s earlier work has finished"""
+        lane = self._lanes.get(lane_name) or self._lanes[DEFAULT_LANE]
+        started = False
+        try:
+            async with self._in_order(user_id):
+                lane.waiting += 1
+                wait_start = time.perf_counter()
+                try:
+                    await lane.semaphore.acquire()
+                finally:
+                    lane.waiting -= 1
+                waited = time.perf_counter() - wait_start
+                if waited > 0.001:
+                    metrics.observe(f"lane_wait_{lane.name}", "ok", waited)
+                lane.running += 1
+                started = True
+                try:
+                    return await coroutine
+                finally:
+                    lane.running -= 1
+                    lane.semaphore.release()
+        finally:
+            if not started:
+                coroutine.close()  # cancelled before its turn
+
+    @contextlib.asynccontextmanager
+    async def _in_order(self, key):
+        if key is None:
+            yield
+            return
+        # Chain onto the user's latest work synchronously, so order is arrival order
+        previous = self._tails.get(key)
+        done = asyncio.get_running_loop().create_future()
+        self._tails[key] = done
+        try:
+            if previous is not None and not previous.done():
+                await asyncio.wait((previous,))  # unlike awaiting it, cancellation leaves ``previous`` alone
+            yield
+        finally:
+            def release(_=None):
+                done.set_result(None)
+                if self._tails.get(key) is done:
+                    del self._tails[key]
+
+            if previous is not None and not previous.done():
+                # Cancelled while waiting: whoever is behind us still waits for ``previous``
+                previous.add_done_callback(release)
+            else:
+                release()
+
+    def running_counts(self):
+        return {name: lane.running for name, lane in self._lanes.items()}
+
+    def waiting_counts(self):
+        return {name: lane.waiting for name, lane in self._lanes.items()}
@@ -0,0 +1,428 @@
+"""
+Compact, tiered membership records.
+
+``PendingVerifications`` holds users who still have to verify. It is bounded
+and entries expire, so a failed removal can no longer leak an entry forever.
+
+``MemberStore`` holds verified members in array-backed columns, with each
+wallet kept as its 32-byte public key; reads return ``Member`` records
+(``__slots__``). Every message a member sends marks them active
+(``touch``); members idle for longer than ``idle_seconds`` are demoted to a
+SQLite file and promoted back on their next lookup; on shutdown the hot tier is flushed so verified members survive a
+restart. Members who leave the group are removed from both tiers.
+
+A reverse index maps each wallet public key to the members verified with it
+(``WalletIndex`` for the hot tier, an SQL index for the disk tier), so the
+accounts behind one wallet are found without a scan.
+"""
+
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from wallets import PUBKEY_BYTES, pack_wallet, unpack_wallet
+
+
+class Member:
+    __slots__ = ("user_id", "username", "verified_at", "nft_count", "wallet", "last_seen")
+
+    def __init__(self, user_id, username, verified_at, nft_count, wallet, last_seen):
+        self.user_id = user_id
+        self.username = username
+        self.verified_at = verified_at
+        self.nft_count = nft_count
+        self.wallet = wallet  # 32-byte public key, or an interned string for anything else
+        self.last_seen = last_seen
+
+    @property
+    def wallet_address(self):
+        return unpack_wallet(self.wallet)
+
+    def as_row(self):
+        return (self.user_id, self.username, self.verified_at, self.nft_count, self.wallet, self.last_seen)
+
+    def as_dict(self):
+        return {
+            "username": self.username,
+            "verified_at": self.verified_at,
+            "nft_count": self.nft_count,
+            "wallet_address": self.wallet_address,
+        }
+
+
+class PendingVerifications:
+    """Users waiting to verify, mapped to their username - bounded and expiring"""
+
+    def __init__(self, max_entries=100000, ttl_seconds=900, clock=time.time):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # user_id -> (username, expires_at), oldest first
+
+    def _prune(self, now):
+        entries = self._entries
+        while entries:
+            user_id, (_, expires_at) = next(iter(entries.items()))
+            if expires_at > now and len(entries) <= self.max_entries:
+                break
+            del entries[user_id]
+
+    def __setitem__(self, user_id, username):
+        with self._lock:
+            self._entries[user_id] = (username, self.clock() + self.ttl_seconds)
+            self._entries.move_to_end(user_id)
+            self._prune(self.clock())
+
+    def __getitem__(self, user_id):
+        with self._lock:
+            self._prune(self.clock())
+            return self._entries[user_id][0]
+
+    def __contains__(self, user_id):
+        with self._lock:
+            self._prune(self.clock())
+            return user_id in self._entries
+
+    def __delitem__(self, user_id):
+        with self._lock:
+            del self._entries[user_id]
+
+    def pop(self, user_id, default=None):
+        with self._lock:
+            entry = self._entries.pop(user_id, None)
+        return default if entry is None else entry[0]
+
+    def __len__(self):
+        with self._lock:
+            self._prune(self.clock())
+            return len(self._entries)
+
+
+class WalletIndex:
+    """Open-addressing hash index from a 32-byte wallet key to the rows holding it.
+
+    The table is an ``array`` of head rows and rows sharing a wallet are
+    chained through a second ``array``, so the index costs a few machine words
+    per member instead of a dict entry and a key object. Public keys are
+    uniformly random, so their first 8 bytes are the hash.
+    """
+
+    EMPTY = -1
+    DELETED = -2
+
+    def __init__(self, key_at, capacity=1024):
+        self._key_at = key_at  # row -> 32-byte wallet key
+        self._table = array("q", [self.EMPTY]) * capacity
+        self._next = array("q")  # row -> next row with the same wallet, or -1
+        self._used = 0  # live heads plus tombstones
+
+    def _slot(self, key):
+        """Slot holding ``key``'s chain, or the slot to put it in"""
+        table = self._table
+        mask = len(table) - 1
+        slot = int.from_bytes(key[:8], "little") & mask
+        free = None
+        while True:
+            head = table[slot]
+            if head == self.EMPTY:
+                return (slot if free is None else free), False
+            if head == self.DELETED:
+                if free is None:
+                    free = slot
+            elif self._key_at(head) == key:
+                return slot, True
+            slot = (slot + 1) & mask
+
+    def add(self, row, key):
+        while len(self._next) <= row:
+            self._next.append(-1)
+        slot, found = self._slot(key)
+        if found:
+            head = self._table[slot]
+            self._next[row] = self._next[head]
+            self._next[head] = row
+            return
+        reused = self._table[slot] == self.DELETED
+        self._table[slot] = row
+        self._next[row] = -1
+        if not reused:
+            self._used += 1
+            if self._used * 3 > len(self._table) * 2:
+                self._rebuild()
+
+    def remove(self, row, key):
+        slot, found = self._slot(key)
+        if not found:
+            return
+        head = self._table[slot]
+        if head == row:
+            following = self._next[row]
+            self._table[slot] = following if following != -1 else self.DELETED
+        else:
+            previous = head
+            while self._next[previous] != row:
+                previous = self._next[previous]
+                if previous == -1:
+                    return
+            self._next[previous] = self._next[row]
+        self._next[row] = -1
+
+    def rows(self, key):
+        slot, found = self._slot(key)
+        row = self._table[slot] if found else -1
+        while row != -1:
+            yield row
+            row = self._next[row]
+
+    def _rebuild(self):
+        """Drop tombstones, growing so live chains fill at most a third of the table"""
+        heads = [head for head in self._table if head >= 0]
+        capacity = len(self._table)
+        while capacity < len(heads) * 3:
+            capacity *= 2
+        self._table = array("q", [self.EMPTY]) * capacity
+        mask = capacity - 1
+        for head in heads:
+            slot = int.from_bytes(self._key_at(head)[:8], "little") & mask
+            while self._table[slot] != self.EMPTY:
+                slot = (slot + 1) & mask
+            self._table[slot] = head
+        self._used = len(heads)
+
+
+class MemberStore:
+    """Verified members: a hot in-memory tier and an optional on-disk tier for idle members.
+
+    The hot tier is columnar - one row per member across ``array`` columns
+    and a packed ``bytearray`` of 32-byte wallet keys - so a member costs a
+    dict slot and a username rather than a dict and a handful of objects.
+    ``Member`` objects are only built when a record is read.
+    """
+
+    def __init__(self, path=None, idle_seconds=7 * 86400, clock=time.time):
+        self.path = path
+        self.idle_seconds = idle_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._reset_columns()
+        self._db = None
+        self._cold = 0
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("""CREATE TABLE IF NOT EXISTS members (
+                user_id INTEGER PRIMARY KEY, username TEXT, verified_at REAL,
+                nft_count INTEGER, wallet BLOB, last_seen REAL)""")
+            self._db.execute("CREATE INDEX IF NOT EXISTS members_wallet ON members (wallet)")
+            self._db.commit()
+            self._cold = self._db.execute("SELECT COUNT(*) FROM members").fetchone()[0]
+
+    def _reset_columns(self):
+        self._rows = {}  # user_id -> row
+        self._user_ids = array("q")
+        self._usernames = []
+        self._verified_at = array("d")
+        self._last_seen = array("d")
+        self._nft_counts = array("I")
+        self._wallets = bytearray()  # PUBKEY_BYTES per row
+        self._other_wallets = {}  # row -> wallet string that is not a public key
+        self._free_rows = []
+        self._wallet_index = WalletIndex(self._key_at)
+
+    def __len__(self):
+        return len(self._rows) + self._cold
+
+    def __contains__(self, user_id):
+        return self.get(user_id) is not None
+
+    @property
+    def hot_count(self):
+        return len(self._rows)
+
+    @property
+    def cold_count(self):
+        return self._cold
+
+    def _key_at(self, row):
+        offset = row * PUBKEY_BYTES
+        return self._wallets[offset:offset + PUBKEY_BYTES]
+
+    def _wallet_at(self, row):
+        if row in self._other_wallets:
+            return self._other_wallets[row]
+        offset = row * PUBKEY_BYTES
+        return bytes(self._wallets[offset:offset + PUBKEY_BYTES])
+
+    def _store(self, user_id, username, verified_at, nft_count, wallet, last_seen):
+        row = self._rows.get(user_id)
+        if row is not None:
+            self._unindex(row)
+        else:
+            if self._free_rows:
+                row = self._free_rows.pop()
+            else:
+                row = len(self._user_ids)
+                self._user_ids.append(0)
+                self._usernames.append(None)
+                self._verified_at.append(0.0)
+                self._last_seen.append(0.0)
+                self._nft_counts.append(0)
+                self._wallets.extend(bytes(PUBKEY_BYTES))
+            self._rows[user_id] = row
+        self._user_ids[row] = user_id
+        self._usernames[row] = username
+        self._verified_at[row] = verified_at
+        self._last_seen[row] = last_seen
+        self._nft_counts[row] = max(0, min(int(nft_count or 0), 0xFFFFFFFF))
+        offset = row * PUBKEY_BYTES
+        if isinstance(wallet, bytes):
+            self._wallets[offset:offset + PUBKEY_BYTES] = wallet
+            self._other_wallets.pop(row, None)
+            self._wallet_index.add(row, wallet)
+        else:
+            self._wallets[offset:offset + PUBKEY_BYTES] = bytes(PUBKEY_BYTES)
+            self._other_wallets[row] = wallet
+
+    def _unindex(self, row):
+        if row not in self._other_wallets:
+            self._wallet_index.remove(row, self._key_at(row))
+
+    def _member(self, row):
+        return Member(self._user_ids[row], self._usernames[row], self._verified_at[row],
+                      self._nft_counts[row], self._wallet_at(row), self._last_seen[row])
+
+    def _drop(self, user_id):
+        row = self._rows.pop(user_id, None)
+        if row is None:
+            return False
+        self._unindex(row)
+        self._usernames[row] = None
+        self._other_wallets.pop(row, None)
+        self._free_rows.append(row)
+        return True
+
+    def record(self, user_id, username, nft_count, wallet_address, verified_at=None):
+        """Store (or replace) a verified member in the hot tier"""
+        now = self.clock()
+        with self._lock:
+            self._store(user_id, username, verified_at or now, nft_count, pack_wallet(wallet_address), now)
+            self._delete_cold(user_id)
+            return self._member(self._rows[user_id])
+
+    def get(self, user_id, touch=False):
+        """The member's record, promoted from disk if it was idle; ``None`` if unknown"""
+        with self._lock:
+            row = self._rows.get(user_id)
+            if row is None and self._db is not None and self._cold:
+                stored = self._db.execute("SELECT * FROM members WHERE user_id = ?", (user_id,)).fetchone()
+                if stored is not None:
+                    self._store(*stored)
+                    self._delete_cold(user_id)
+                    row = self._rows[user_id]
+                    touch = True
+            if row is None:
+                return None
+            if touch:
+                self._last_seen[row] = self.clock()
+            return self._member(row)
+
+    def touch(self, user_id):
+        """Mark a hot-tier member active now; returns whether they are in the hot tier.
+
+        Cheap enough for every incoming message: non-members cost one dict
+        miss and no lock, and the disk tier is not queried.
+        """
+        if user_id not in self._rows:
+            return False
+        with self._lock:
+            row = self._rows.get(user_id)
+            if row is None:
+                return False
+            self._last_seen[row] = self.clock()
+            return True
+
+    def users_for_wallet(self, wallet_address):
+        """Set of user IDs verified with ``wallet_address``, in either tier"""
+        wallet = pack_wallet(wallet_address)
+        if not isinstance(wallet, bytes):
+            return set()  # placeholders like "N/A" are not indexed
+        with self._lock:
+            found = {self._user_ids[row] for row in self._wallet_index.rows(wallet)}
+            if self._db is not None and self._cold:
+                found.update(user_id for (user_id,) in
+                             self._db.execute("SELECT user_id FROM members WHERE wallet = ?", (wallet,)))
+        return found
+
+    def remove(self, user_id):
+        """Forget a member in both tiers; returns whether they were known"""
+        with self._lock:
+            removed = self._drop(user_id)
+            return self._delete_cold(user_id) or removed
+
+    def _delete_cold(self, user_id):
+        if self._db is None or not self._cold:
+            return False
+        deleted = self._db.execute("DELETE FROM members WHERE user_id = ?", (user_id,)).rowcount
+        self._db.commit()
+        self._cold -= deleted
+        return bool(deleted)
+
+    def demote_idle(self, now=None):
+        """Move members idle for longer than ``idle_seconds`` to disk; returns how many moved"""
+        if self._db is None:
+            return 0
+        cutoff = (self.clock() if now is None else now) - self.idle_seconds
+        with self._lock:
+            last_seen = self._last_seen
+            idle = [row for row in self._rows.values() if last_seen[row] < cutoff]
+            self._demote(idle)
+        return len(idle)
+
+    def flush(self):
+        """Move every hot member to disk, e.g. on shutdown"""
+        if self._db is None:
+            return
+        with self._lock:
+            self._demote(list(self._rows.values()))
+
+    def _demote(self, rows):
+        if not rows:
+            return
+        members = [self._member(row) for row in rows]
+        self._db.executemany("INSERT OR REPLACE INTO members VALUES (?, ?, ?, ?, ?, ?)",
+                             [member.as_row() for member in members])
+        self._db.commit()
+        self._cold = self._db.execute("SELECT COUNT(*) FROM members").fetchone()[0]
+        for member in members:
+            self._drop(member.user_id)
+        if not self._rows:
+            self._reset_columns()  # release the columns once the hot tier is empty
+
+    def members(self, batch_size=1000):
+        """Every member in both tiers; disk rows are read in batches without promoting them"""
+        with self._lock:
+            hot = [self._member(row) for row in self._rows.values()]
+        yield from hot
+        if self._db is None:
+            return
+        last_id = None
+        while True:
+            with self._lock:
+                if last_id is None:
+                    rows = self._db.execute("SELECT * FROM members ORDER BY user_id LIMIT ?", (batch_size,)).fetchall()
+                else:
+                    rows = self._db.execute("SELECT * FROM members WHERE user_id > ? ORDER BY user_id LIMIT ?",
+                                            (last_id, batch_size)).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield Member(*row)
+            last_id = rows[-1][0]
+
+    def close(self):
+        if self._db is not None:
+            self.flush()
+            self._db.close()
+            self._db = None
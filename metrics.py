@@ -0,0 +1,218 @@
+"""
+Prometheus text-format metrics for the bot server.
+
+Everything here is in-process and lock-protected so it can be updated from the
+bot's event loop and from Flask request threads at the same time. Observing a
+value is a bisect plus two additions, cheap enough to leave on in production.
+"""
+
+import asyncio
+import functools
+import threading
+import time
+from bisect import bisect_left
+
+# Latency buckets in seconds - Telegram/Helius round trips sit between 50ms and 10s
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_gauges = {}
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + body + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Latency histogram keyed by a fixed tuple of label names"""
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labelvalues -> [bucket counts..., +Inf count], sum
+        self._series = {}
+
+    def observe(self, value, *labelvalues):
+        series = self._series.get(labelvalues)
+        if series is None:
+            with _lock:
+                series = self._series.setdefault(labelvalues, [[0] * (len(self.buckets) + 1), 0.0])
+        index = bisect_left(self.buckets, value)
+        with _lock:
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with _lock:
+            snapshot = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for labelvalues, counts, total in sorted(snapshot):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = _format_labels(self.labelnames, labelvalues, ("le", _format_value(float(bound))))
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter keyed by a fixed tuple of label names"""
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def inc(self, *labelvalues, amount=1):
+        with _lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues):
+        return self._values.get(labelvalues, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with _lock:
+            snapshot = sorted(self._values.items())
+        for labelvalues, value in snapshot:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+
+class Gauge:
+    """Gauge whose value is read from a callback at scrape time"""
+
+    def __init__(self, name, help_text, func, labelname=None):
+        self.name = name
+        self.help = help_text
+        self.func = func
+        self.labelname = labelname
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            value = self.func()
+        except Exception as e:
+            print(f"⚠️ Gauge {self.name} failed: {e}")
+            return lines
+        if self.labelname:
+            for key, number in sorted(value.items()):
+                lines.append(f"{self.name}{_format_labels((self.labelname,), (key,))} {_format_value(number)}")
+        else:
+            lines.append(f"{self.name} {_format_value(value)}")
+        return lines
+
+
+def histogram(name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+    """Get or create a histogram"""
+    with _lock:
+        if name not in _histograms:
+            _histograms[name] = Histogram(name, help_text, labelnames, buckets)
+        return _histograms[name]
+
+
+def counter(name, help_text, labelnames=()):
+    """Get or create a counter"""
+    with _lock:
+        if name not in _counters:
+            _counters[name] = Counter(name, help_text, labelnames)
+        return _counters[name]
+
+
+def register_gauge(name, help_text, func, labelname=None):
+    """Register (or replace) a gauge computed by ``func()`` on every scrape.
+
+    With ``labelname`` set, ``func`` returns ``{label value: number}`` and one
+    sample is emitted per entry.
+    """
+    with _lock:
+        _gauges[name] = Gauge(name, help_text, func, labelname)
+
+
+OPERATION_LATENCY = histogram(
+    "bot_operation_duration_seconds",
+    "Latency of external calls and request handling by operation and outcome",
+    ("operation", "outcome"),
+)
+
+
+class timer:
+    """Time a block or a function into ``bot_operation_duration_seconds``.
+
+    Usable as a context manager (set ``.outcome`` inside the block to override
+    the default ``ok``) or as a decorator for sync and async functions. Any
+    exception is recorded with outcome ``error`` and re-raised.
+    """
+
+    __slots__ = ("operation", "outcome", "_start")
+
+    def __init__(self, operation, outcome="ok"):
+        self.operation = operation
+        self.outcome = outcome
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        outcome = "error" if exc_type is not None else self.outcome
+        OPERATION_LATENCY.observe(time.perf_counter() - self._start, self.operation, outcome)
+        return False
+
+    def __call__(self, func):
+        operation = self.operation
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with timer(operation):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(operation):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def observe(operation, outcome, seconds):
+    """Record an already-measured latency"""
+    OPERATION_LATENCY.observe(seconds, operation, outcome)
+
+
+def render():
+    """Render every registered metric in Prometheus text exposition format"""
+    with _lock:
+        metrics = list(_histograms.values()) + list(_counters.values()) + list(_gauges.values())
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
@@ -0,0 +1,219 @@
+"""
+Durable outbox for Telegram side effects.
+
+Actions (a Bot API method name and its parameters) are written to a SQLite
+table before anything is sent, and a single drainer task on the bot's event
+loop executes them in batches. An action is marked done only after the call
+succeeds, so every action is delivered at least once - also across a
+restart. Failed actions are retried:
+
+- ``retry_after`` from Telegram is honoured, and the whole outbox pauses
+  until then, since flood control applies to the bot, not the one action;
+- other errors back off exponentially with jitter, up to ``max_attempts``;
+- errors that can never succeed (``permanent(error)``, e.g. a bad request)
+  end the action at once.
+
+Each action has a key. Enqueueing a key that is still pending, or finished
+less than ``dedupe_seconds`` ago, is a no-op - redelivered webhooks and
+retried timers don't send twice. Fan-out (one notification to several admin
+chats) is one action per chat, each with its own key.
+"""
+
+import asyncio
+import json
+import random
+import secrets
+import sqlite3
+import threading
+import time
+
+import metrics
+
+outbox_actions = metrics.counter("bot_outbox_actions_total", "Outbox actions by outcome", ("outcome",))
+
+PENDING, DONE, DEAD = "pending", "done", "dead"
+
+
+def retry_after_seconds(error):
+    """Telegram's ``retry_after`` from an error, in seconds, or None"""
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is None:
+        return None
+    return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+
+
+class Outbox:
+    """Persisted queue of Bot API actions, drained by ``run()``"""
+
+    def __init__(self, path, execute, permanent=lambda error: False, batch_size=20, max_attempts=8,
+                 base_delay=2.0, max_delay=600.0, dedupe_seconds=86400, clock=time.time):
+        self.execute = execute  # async execute(method, params, user_id)
+        self.permanent = permanent
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.dedupe_seconds = dedupe_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            key TEXT NOT NULL UNIQUE,
+            method TEXT NOT NULL,
+            params TEXT NOT NULL,
+            user_id INTEGER,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt REAL NOT NULL,
+            finished_at REAL,
+            last_error TEXT)""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt)")
+        self._db.commit()
+        self._loop = None
+        self._wake = None
+        self._paused_until = 0.0
+        pending = self.counts()[PENDING]
+        if pending:
+            print(f"📮 {pending} outbox actions pending from a previous run")
+
+    def enqueue(self, method, params, key=None, user_id=None):
+        """Queue one action (thread-safe); returns False if ``key`` is a duplicate"""
+        return self.enqueue_many([(method, params, key, user_id)]) == 1
+
+    def enqueue_many(self, actions):
+        """Queue ``(method, params, key, user_id)`` actions in one transaction; returns how many were new"""
+        now = self.clock()
+        added = 0
+        with self._lock, self._db:
+            for method, params, key, user_id in actions:
+                key = key or secrets.token_hex(12)
+                # A finished action only blocks its key for dedupe_seconds
+                self._db.execute("DELETE FROM outbox WHERE key = ? AND status != ? AND finished_at < ?",
+                                 (key, PENDING, now - self.dedupe_seconds))
+                added += self._db.execute(
+                    "INSERT OR IGNORE INTO outbox (key, method, params, user_id, status, next_attempt) VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, method, json.dumps(params), user_id, PENDING, now)).rowcount
+        outbox_actions.inc("queued", amount=added)
+        if added < len(actions):
+            outbox_actions.inc("duplicate", amount=len(actions) - added)
+        if added:
+            self._notify()
+        return added
+
+    def fan_out(self, chat_ids, method, params, key=None):
+        """The same action once per chat, e.g. a notification to every admin chat"""
+        return self.enqueue_many([(method, {**params, "chat_id": chat_id}, f"{key}:{chat_id}" if key else None, None)
+                                  for chat_id in chat_ids])
+
+    def _notify(self):
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def counts(self):
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+        return {PENDING: 0, DONE: 0, DEAD: 0, **dict(rows)}
+
+    def status(self, key):
+        """``(status, last_error)`` of the action with ``key``, None if there is none"""
+        with self._lock:
+            return self._db.execute("SELECT status, last_error FROM outbox WHERE key = ?", (key,)).fetchone()
+
+    async def wait(self, key, poll=0.25):
+        """Wait until the action with ``key`` is delivered or given up; returns ``status(key)``"""
+        while True:
+            state = self.status(key)
+            if state is None or state[0] != PENDING:
+                return state
+            await asyncio.sleep(poll)
+
+    def _due(self, now):
+        with self._lock:
+            return self._db.execute(
+                "SELECT id, method, params, user_id, attempts FROM outbox WHERE status = ? AND next_attempt <= ? "
+                "ORDER BY next_attempt, id LIMIT ?", (PENDING, now, self.batch_size)).fetchall()
+
+    def _next_due(self):
+        with self._lock:
+            return self._db.execute("SELECT MIN(next_attempt) FROM outbox WHERE status = ?", (PENDING,)).fetchone()[0]
+
+    async def _attempt(self, action):
+        action_id, method, params, user_id, _ = action
+        try:
+            await self.execute(method, json.loads(params), user_id)
+            return None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return e
+
+    def _backoff(self, attempts):
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return random.uniform(delay / 2, delay)
+
+    def _record(self, batch, errors):
+        now = self.clock()
+        with self._lock, self._db:
+            for (action_id, method, _, _, attempts), error in zip(batch, errors):
+                attempts += 1
+                if error is None:
+                    outbox_actions.inc("delivered")
+                    self._db.execute("UPDATE outbox SET status = ?, attempts = ?, finished_at = ?, last_error = NULL WHERE id = ?",
+                                     (DONE, attempts, now, action_id))
+                    continue
+                description = f"{type(error).__name__}: {error}"
+                retry_after = retry_after_seconds(error)
+                if self.permanent(error) or (retry_after is None and attempts >= self.max_attempts):
+                    outbox_actions.inc("dead")
+                    print(f"❌ Outbox {method} #{action_id} given up after {attempts} attempts: {description}")
+                    self._db.execute("UPDATE outbox SET status = ?, attempts = ?, finished_at = ?, last_error = ? WHERE id = ?",
+                                     (DEAD, attempts, now, description, action_id))
+                    continue
+                outbox_actions.inc("retried")
+                if retry_after is not None:
+                    delay = retry_after + random.uniform(0, 1)
+                    self._paused_until = max(self._paused_until, now + retry_after)
+                else:
+                    delay = self._backoff(attempts)
+                print(f"⚠️ Outbox {method} #{action_id} failed ({description}) - retry in {delay:.1f}s")
+                self._db.execute("UPDATE outbox SET attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?",
+                                 (attempts, now + delay, description, action_id))
+
+    def prune(self, now=None):
+        """Forget finished actions whose dedupe window has passed"""
+        now = self.clock() if now is None else now
+        with self._lock, self._db:
+            return self._db.execute("DELETE FROM outbox WHERE status != ? AND finished_at < ?",
+                                    (PENDING, now - self.dedupe_seconds)).rowcount
+
+    async def run(self, prune_interval=3600):
+        """Drain due actions in batches until cancelled"""
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        last_prune = self.clock()
+        while True:
+            self._wake.clear()  # before looking, so an enqueue from here on wakes the wait below
+            now = self.clock()
+            if self._paused_until > now:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            if now - last_prune > prune_interval:
+                self.prune(now)
+                last_prune = now
+            batch = self._due(now)
+            if batch:
+                errors = await asyncio.gather(*(self._attempt(action) for action in batch))
+                self._record(batch, errors)
+                continue
+            next_due = self._next_due()
+            timeout = min(prune_interval, max(next_due - now, 0)) if next_due is not None else prune_interval
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,83 @@
+"""
+Opt-in profiling hooks (``PROFILING=true``).
+
+- ``time_handlers(application)`` / ``time_routes(flask_app)`` wrap every
+  registered telegram handler callback and Flask view in ``metrics.timer``,
+  so ``/metrics`` shows ``handler_<name>`` and ``route_<endpoint>`` latencies
+  next to the Telegram and Helius round trips they contain.
+- ``sample(seconds, interval)`` is a sampling profiler: a thread snapshots
+  every other thread's Python stack with ``sys._current_frames()`` and
+  returns collapsed stacks (``thread;outer;...;inner count`` per line), the
+  input format of flamegraph.pl, speedscope and inferno.
+
+Sampling only reads frames, so the bot keeps running normally while a
+profile is taken; the cost is one stack walk per thread per interval.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+import metrics
+
+# Leaf frames in these modules are threads waiting, not working
+IDLE_MODULES = ("selectors.py", "threading.py", "queue.py", "thread.py", "socketserver.py", "ssl.py", "socket.py")
+
+_sampling = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+def time_handlers(application):
+    """Time every handler registered on a telegram Application"""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            name = getattr(handler.callback, "__name__", type(handler).__name__)
+            handler.callback = metrics.timer(f"handler_{name}")(handler.callback)
+
+
+def time_routes(flask_app):
+    """Time every view function of a Flask app"""
+    for endpoint, view in list(flask_app.view_functions.items()):
+        if endpoint != "static":
+            flask_app.view_functions[endpoint] = metrics.timer(f"route_{endpoint}")(view)
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _stack(frame):
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def sample(seconds, interval=0.01, include_idle=False):
+    """Collapsed stacks of every other thread, sampled every ``interval`` for ``seconds``"""
+    if not _sampling.acquire(blocking=False):
+        raise ProfilerBusy("a profile is already being taken")
+    try:
+        caller = threading.get_ident()
+        counts = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == caller:
+                    continue
+                if not include_idle and os.path.basename(frame.f_code.co_filename) in IDLE_MODULES:
+                    continue
+                counts[";".join([names.get(ident, str(ident)).replace(" ", "_")] + _stack(frame))] += 1
+            time.sleep(interval)
+        return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+    finally:
+        _sampling.release()
@@ -0,0 +1,234 @@
+"""
+Membership reconciliation: remove verified members who no longer hold the NFT.
+
+A job has two phases:
+
+1. Plan - the set difference between known members (both ``MemberStore``
+   tiers) and eligible holders. Eligibility comes from a holders list (one
+   wallet per line) when one is given, otherwise from one ownership lookup
+   per distinct wallet. A failed lookup never makes a member ineligible.
+2. Execute - removals run through ``BatchExecutor``: fixed-size batches,
+   paced to ``per_minute`` removals. The bot queues each removal as an
+   outbox ``kick_member`` action and waits until it is delivered, so the
+   pacing and the progress count removals Telegram has carried out. The
+   outbox retries failures and pauses for Telegram's ``retry_after``, the
+   same way as for every other removal.
+   Progress is written to a state file after every batch, so an interrupted
+   job resumes where it stopped.
+
+A dry run stops after the plan; resuming it executes that plan. From the
+bot: ``/reconcile`` (dry run), ``/reconcile run``, ``/reconcile resume``,
+``/reconcile status``. From a shell, against members already flushed to
+``MEMBER_STORE_FILE`` (i.e. with the bot stopped):
+
+    python reconcile.py [--run | --resume] [--holders holders.txt]
+"""
+
+import asyncio
+import json
+import os
+import secrets
+import time
+
+from wallets import unpack_wallet
+
+STATE_VERSION = 1
+
+
+def load_holders(path):
+    """Set of eligible wallet addresses from a file with one address per line"""
+    with open(path) as f:
+        return {line.strip() for line in f if line.strip() and not line.startswith("#")}
+
+
+async def plan_removals(members, check_wallet=None, holders=None, concurrency=8, on_progress=None):
+    """Members to remove, plus counts of what was checked.
+
+    ``check_wallet(address)`` is a coroutine returning True, False or None
+    (lookup failed); at most ``concurrency`` run at once. ``holders``
+    replaces the lookups with a set of eligible addresses.
+    """
+    by_wallet = {}
+    skipped = 0
+    for member in members:
+        address = unpack_wallet(member.wallet)
+        if not address or address == "N/A":
+            skipped += 1
+            continue
+        by_wallet.setdefault(address, []).append((member.user_id, member.username))
+
+    if holders is not None:
+        eligible = {address: address in holders for address in by_wallet}
+    else:
+        eligible = {}
+        slots = asyncio.Semaphore(concurrency)
+
+        async def check(address):
+            async with slots:
+                return await check_wallet(address)
+
+        addresses = list(by_wallet)
+        for start in range(0, len(addresses), concurrency * 4):
+            chunk = addresses[start:start + concurrency * 4]
+            results = await asyncio.gather(*(check(a) for a in chunk))
+            eligible.update(zip(chunk, results))
+            if on_progress:
+                await on_progress(f"🔎 Checked {len(eligible)}/{len(addresses)} wallets")
+
+    plan = [[user_id, username, address]
+            for address, holders_of in by_wallet.items() if eligible[address] is False
+            for user_id, username in holders_of]
+    summary = {
+        "members": sum(len(v) for v in by_wallet.values()) + skipped,
+        "wallets": len(by_wallet),
+        "eligible_wallets": sum(1 for v in eligible.values() if v),
+        "unknown_wallets": sum(1 for v in eligible.values() if v is None),
+        "no_wallet": skipped,
+        "to_remove": len(plan),
+    }
+    return plan, summary
+
+
+def new_job(plan, summary, dry_run):
+    return {
+        "version": STATE_VERSION,
+        "job_id": secrets.token_hex(4),
+        "created_at": time.time(),
+        "dry_run": dry_run,
+        "summary": summary,
+        "plan": plan,
+        "done": 0,  # plan entries processed, in order
+        "removed": 0,
+        "failed": {},  # user_id -> error
+        "elapsed": 0.0,  # seconds spent executing, across resumes
+    }
+
+
+def save_job(job, path):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(job, f)
+    os.replace(tmp_path, path)
+
+
+def load_job(path):
+    try:
+        with open(path) as f:
+            job = json.load(f)
+    except FileNotFoundError:
+        return None
+    if job.get("version") != STATE_VERSION:
+        raise ValueError(f"{path} was written by an incompatible version")
+    return job
+
+
+def progress_line(job):
+    total = len(job["plan"])
+    rate = job["removed"] / job["elapsed"] * 60 if job["elapsed"] else 0.0
+    remaining = total - job["done"]
+    eta = f", ~{remaining / rate:.1f} min left" if rate and remaining else ""
+    return (f"🧹 Reconcile {job['job_id']}: {job['done']}/{total} processed, {job['removed']} removed, "
+            f"{len(job['failed'])} failed - {rate:.0f} removals/min{eta}")
+
+
+class BatchExecutor:
+    """Runs a job's removals in batches at no more than ``per_minute``, saving after each batch"""
+
+    def __init__(self, remove, state_path, per_minute=600, batch_size=20):
+        self.remove = remove  # async remove(user_id, username, wallet), returns once the member is removed
+        self.state_path = state_path
+        self.per_minute = per_minute
+        self.batch_size = batch_size
+
+    async def _remove_one(self, entry):
+        user_id, username, wallet = entry
+        try:
+            await self.remove(user_id, username, wallet)
+            return None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return f"{type(e).__name__}: {e}"
+
+    async def run(self, job, on_progress=None, progress_every=10):
+        """Execute from ``job["done"]`` to the end of the plan; returns the job"""
+        job["dry_run"] = False
+        plan = job["plan"]
+        started = time.monotonic()
+        elapsed_before = job["elapsed"]
+        done_at_start = job["done"]
+        batches = 0
+        while job["done"] < len(plan):
+            batch = plan[job["done"]:job["done"] + self.batch_size]
+            errors = await asyncio.gather(*(self._remove_one(entry) for entry in batch))
+            for (user_id, _, _), error in zip(batch, errors):
+                if error:
+                    job["failed"][str(user_id)] = error
+                else:
+                    job["removed"] += 1
+            job["done"] += len(batch)
+
+            # Pace to per_minute: the next batch may start once this many removals are due
+            spent = time.monotonic() - started
+            due = (job["done"] - done_at_start) * 60 / self.per_minute
+            if due > spent and job["done"] < len(plan):
+                await asyncio.sleep(due - spent)
+            job["elapsed"] = elapsed_before + time.monotonic() - started
+            save_job(job, self.state_path)
+            batches += 1
+            if on_progress and batches % progress_every == 0 and job["done"] < len(plan):
+                await on_progress(progress_line(job))
+        return job
+
+
+def main():
+    import argparse
+    import server
+
+    parser = argparse.ArgumentParser(description="Reconcile group members against NFT ownership")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--run", action="store_true", help="Remove ineligible members (default: dry run)")
+    mode.add_argument("--resume", action="store_true", help="Continue the job in the state file")
+    parser.add_argument("--holders", help="File of eligible wallets, one per line, instead of live lookups")
+    args = parser.parse_args()
+
+    bot_server = server.create_app()
+
+    async def report(line):
+        print(line)
+
+    async def run():
+        try:
+            await reconcile()
+        finally:
+            await bot_server.verifier.aclose()
+
+    async def reconcile():
+        if args.resume:
+            job = load_job(bot_server.config.reconcile_state_file)
+            if job is None:
+                print("❌ No reconciliation job to resume")
+                return
+        else:
+            plan, summary = await server.plan_reconciliation(args.holders, report)
+            job = new_job(plan, summary, dry_run=not args.run)
+            save_job(job, bot_server.config.reconcile_state_file)
+            print(f"📋 {json.dumps(summary)}")
+            if job["dry_run"]:
+                for user_id, username, wallet in plan[:50]:
+                    print(f"  would remove @{username} (ID: {user_id}) - wallet {wallet}")
+                return
+        async with bot_server.bot:
+            drainer = asyncio.create_task(server.outbox.run())
+            try:
+                await server.execute_reconciliation(job, report)
+                while server.outbox.counts()["pending"]:
+                    await asyncio.sleep(0.5)  # the queued removals, and their retries
+            finally:
+                drainer.cancel()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+Minute, hour and day rollups of the verification analytics log.
+
+Every event appended to ``analytics.json`` is also counted here, so range
+queries read a few thousand integers instead of re-parsing the log. Each
+resolution keeps one ``array('I')`` column per series, indexed by bucket
+number from the resolution's first bucket; minute and hour columns are
+trimmed to their retention window, day columns are kept forever.
+
+Series: ``joins``, ``verified``, ``removed``, ``removed:<reason>`` and the
+NFT-count distribution of verified holders (``nft:1``, ``nft:2-4``, ...).
+
+``save()`` writes a snapshot (one JSON header line followed by the raw column
+bytes) together with the log offset it covers; ``open()`` loads the snapshot
+and replays only the part of the log written after it.
+"""
+
+import json
+import os
+import sys
+import threading
+from array import array
+
+# name, bucket width in seconds, retention in seconds (None = forever)
+RESOLUTIONS = (
+    ("minute", 60, 7 * 86400),
+    ("hour", 3600, 2 * 366 * 86400),
+    ("day", 86400, None),
+)
+NFT_BUCKETS = ((1, "nft:1"), (5, "nft:2-4"), (10, "nft:5-9"), (50, "nft:10-49"), (None, "nft:50+"))
+SNAPSHOT_VERSION = 1
+MAX_BUCKETS = 500  # default cap on buckets per query when picking a resolution
+MAX_QUERY_BUCKETS = 100_000
+
+
+def nft_bucket(nft_count):
+    for upper, name in NFT_BUCKETS:
+        if upper is None or nft_count < upper:
+            return name
+
+
+def event_series(entry):
+    """Series names an analytics log entry counts towards"""
+    status = entry.get("status")
+    if status == "joined":
+        return ("joins",)
+    if status == "verified":
+        try:
+            nft_count = int(entry.get("nft_count") or 0)
+        except (TypeError, ValueError):
+            nft_count = 0
+        return ("verified", nft_bucket(nft_count)) if nft_count > 0 else ("verified",)
+    if status == "removed":
+        return ("removed", f"removed:{entry.get('reason') or 'unknown'}")
+    return ()
+
+
+class Resolution:
+    """Columns of per-bucket counts at one bucket width"""
+
+    __slots__ = ("name", "step", "retention", "base", "length", "series")
+
+    def __init__(self, name, step, retention):
+        self.name = name
+        self.step = step
+        self.retention = retention
+        self.base = None  # bucket number of column index 0
+        self.length = 0
+        self.series = {}  # series name -> array('I')
+
+    def add(self, timestamp, name, count=1):
+        bucket = int(timestamp) // self.step
+        if self.base is None:
+            self.base = bucket
+        if bucket < self.base:
+            if self.retention and (self.base + self.length - bucket) * self.step > self.retention:
+                return  # older than the retention window
+            self._prepend(self.base - bucket)
+        if bucket - self.base >= self.length:
+            self._extend(bucket - self.base + 1 - self.length)  # may trim and move base
+        offset = bucket - self.base
+        column = self.series.get(name)
+        if column is None:
+            column = self.series[name] = array("I", bytes(4 * self.length))
+        column[offset] += count
+
+    def _extend(self, count):
+        padding = bytes(4 * count)
+        for column in self.series.values():
+            column.frombytes(padding)
+        self.length += count
+        if self.retention:
+            keep = self.retention // self.step
+            # Trim in chunks so the deletion cost is amortized over many buckets
+            if self.length > keep + keep // 4:
+                drop = self.length - keep
+                for column in self.series.values():
+                    del column[:drop]
+                self.base += drop
+                self.length -= drop
+
+    def _prepend(self, count):
+        padding = array("I", bytes(4 * count))
+        for name, column in self.series.items():
+            self.series[name] = padding + column
+        self.base -= count
+        self.length += count
+
+    def span(self, start, end):
+        """Buckets ``[first, last)`` covering ``[start, end)`` and the held column slice within them"""
+        first = int(start) // self.step
+        last = -(-int(end) // self.step)  # ceil
+        if self.base is None:
+            return first, last, 0, 0
+        lo = max(first - self.base, 0)
+        hi = min(last - self.base, self.length)
+        return first, last, lo, max(hi, lo)
+
+    def covers(self, start):
+        if self.base is None or not self.retention:
+            return True
+        return int(start) // self.step >= self.base or self.length * self.step < self.retention
+
+
+class Rollups:
+    """Incremental time-series rollups of analytics events, safe to share between threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.resolutions = {name: Resolution(name, step, retention) for name, step, retention in RESOLUTIONS}
+        self.log_offset = 0  # bytes of the analytics log already counted
+        self.events = 0
+
+    def record(self, entry, log_bytes=0):
+        """Count one analytics event; ``log_bytes`` is the length of its log line"""
+        names = event_series(entry)
+        timestamp = entry.get("timestamp")
+        with self._lock:
+            self.log_offset += log_bytes
+            if not names or not isinstance(timestamp, (int, float)):
+                return
+            self.events += 1
+            for resolution in self.resolutions.values():
+                for name in names:
+                    resolution.add(timestamp, name)
+
+    def pick_resolution(self, start, end, max_buckets=MAX_BUCKETS):
+        """Finest resolution that still holds ``start`` and fits ``max_buckets``"""
+        for name, step, _ in RESOLUTIONS:
+            resolution = self.resolutions[name]
+            if (end - start) / step <= max_buckets and resolution.covers(start):
+                return name
+        return RESOLUTIONS[-1][0]
+
+    def query(self, start, end, resolution=None, series=None):
+        """Per-bucket counts between ``start`` and ``end`` (epoch seconds, UTC buckets).
+
+        Returns ``{"resolution", "step", "start", "buckets", "series", "totals"}``
+        where ``buckets`` are bucket start times and every series list lines up
+        with them. Empty buckets are included so the series can be plotted.
+        """
+        if end <= start:
+            raise ValueError("end must be after start")
+        resolution = resolution or self.pick_resolution(start, end)
+        if resolution not in self.resolutions:
+            raise ValueError(f"unknown resolution: {resolution}")
+        with self._lock:
+            held = self.resolutions[resolution]
+            step = held.step
+            first, last, lo, hi = held.span(start, end)
+            if last - first > MAX_QUERY_BUCKETS:
+                raise ValueError(f"range spans {last - first} {resolution} buckets (max {MAX_QUERY_BUCKETS})")
+            # Buckets outside the held columns are zero
+            lead = held.base + lo - first if hi > lo else last - first
+            trail = last - first - lead - (hi - lo)
+            names = series or sorted(held.series)
+            result = {}
+            for name in names:
+                column = held.series.get(name)
+                values = column[lo:hi].tolist() if column is not None else [0] * (hi - lo)
+                result[name] = [0] * lead + values + [0] * trail
+        return {
+            "resolution": resolution,
+            "step": step,
+            "start": first * step,
+            "buckets": [(first + i) * step for i in range(last - first)],
+            "series": result,
+            "totals": {name: sum(values) for name, values in result.items()},
+        }
+
+    def totals(self):
+        """All-time totals from the day columns"""
+        with self._lock:
+            return {name: sum(column) for name, column in self.resolutions["day"].series.items()}
+
+    def save(self, path):
+        """Write a snapshot of every column and the log offset it covers"""
+        with self._lock:
+            header = {"version": SNAPSHOT_VERSION, "byteorder": sys.byteorder, "log_offset": self.log_offset,
+                      "events": self.events, "resolutions": {}}
+            blobs = []
+            for name, held in self.resolutions.items():
+                header["resolutions"][name] = {"base": held.base, "length": held.length, "series": list(held.series)}
+                blobs.extend(column.tobytes() for column in held.series.values())
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(json.dumps(header).encode() + b"\n")
+            for blob in blobs:
+                f.write(blob)
+        os.replace(tmp_path, path)
+
+    def _load_snapshot(self, path):
+        with open(path, "rb") as f:
+            header = json.loads(f.readline())
+            if header.get("version") != SNAPSHOT_VERSION or header.get("byteorder") != sys.byteorder:
+                raise ValueError("incompatible snapshot")
+            for name, stored in header["resolutions"].items():
+                held = self.resolutions[name]
+                held.base = stored["base"]
+                held.length = stored["length"]
+                for series_name in stored["series"]:
+                    column = array("I")
+                    column.frombytes(f.read(4 * held.length))
+                    if len(column) != held.length:
+                        raise ValueError("truncated snapshot")
+                    held.series[series_name] = column
+        self.log_offset = header["log_offset"]
+        self.events = header["events"]
+
+    def replay(self, log_path):
+        """Count log lines written after ``log_offset``"""
+        try:
+            f = open(log_path, "rb")
+        except FileNotFoundError:
+            return 0
+        replayed = 0
+        with f:
+            f.seek(self.log_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # partial line still being written
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    entry = {}
+                self.record(entry if isinstance(entry, dict) else {}, len(line))
+                replayed += 1
+        return replayed
+
+    @classmethod
+    def open(cls, log_path, snapshot_path=None):
+        """Rollups for ``log_path``, from the snapshot if it is still valid for the log"""
+        rollups = cls()
+        if snapshot_path and os.path.exists(snapshot_path):
+            try:
+                rollups._load_snapshot(snapshot_path)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"⚠️ Ignoring analytics snapshot {snapshot_path}: {e}")
+                rollups = cls()
+            else:
+                try:
+                    log_size = os.path.getsize(log_path)
+                except OSError:
+                    log_size = 0
+                if log_size < rollups.log_offset:
+                    print(f"⚠️ {log_path} is shorter than the analytics snapshot - rebuilding rollups")
+                    rollups = cls()
+        replayed = rollups.replay(log_path)
+        print(f"✅ Analytics rollups ready: {rollups.events} events ({replayed} log lines replayed)")
+        return rollups
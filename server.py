@@ -1,48 +1,280 @@
+from __future__ import annotations
+
+import time
+
+# Import-to-ready is measured from here
+IMPORT_STARTED = time.perf_counter()
+
 import os
 import asyncio
-import time
 import json
-from telegram import Update
-from telegram.ext import ApplicationBuilder, ContextTypes, MessageHandler, filters, CommandHandler
-from dotenv import load_dotenv
-from flask import Flask, request, jsonify
+import hmac
+import random
 import threading
+from typing import TYPE_CHECKING
+from dotenv import load_dotenv
+import metrics
+import tracing
+from dedupe import IdempotencyCache
+import verification_token
+from supervisor import TaskSupervisor
+from membership import MemberStore, PendingVerifications
+import traffic
+import transfers
+from outbox import Outbox
+from admission import AdmissionControl, Overloaded
+import health
+import eligibility
+
+if TYPE_CHECKING:
+    from telegram import Update
+    from telegram.ext import ContextTypes
 
 load_dotenv()
 
-# Environment variables - Fixed names
-BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")  # Changed from BOT_TOKEN
-GROUP_ID = os.getenv("TELEGRAM_GROUP_ID")    # Changed from GROUP_ID
-HELIUS_API_KEY = os.getenv("HELIUS_API_KEY", "6873bd5e-0b5d-49c4-a9ab-4e7febfd9cd3")
-COLLECTION_ID = os.getenv("COLLECTION_ID", "j7qeFNnpWTbaf5g9sMCxP2zfKrH5QFgE56SuYjQDQi1")
-WEBHOOK_URL = os.getenv("WEBHOOK_URL", "https://api-server-wcjc.onrender.com/api/verify-nft")
-
-# Admin notification settings
-ADMIN_CHAT_ID = os.getenv("ADMIN_CHAT_ID")  # Admin chat ID for notifications
-ADMIN_NOTIFICATIONS = os.getenv("ADMIN_NOTIFICATIONS", "true").lower() == "true"
-
-# Check if required environment variables are se
-
-if not GROUP_ID:
-    print("❌ TELEGRAM_GROUP_ID not found in environment variables!")
-    print("💡 Please set TELEGRAM_GROUP_ID in your environment")
-    GROUP_ID = "test_group"  # Fallback for testing
-
-print(f"🤖 Bot Configuration:")
-print(f"  📱 TELEGRAM_BOT_TOKEN: {'✅ Set' if BOT_TOKEN != 'test_token' else '❌ Missing'}")
-print(f"  👥 TELEGRAM_GROUP_ID: {'✅ Set' if GROUP_ID != 'test_group' else '❌ Missing'}")
-print(f"  📢 ADMIN_CHAT_ID: {'✅ Set' if ADMIN_CHAT_ID else '❌ Missing'}")
-print(f"  🔔 ADMIN_NOTIFICATIONS: {'✅ Enabled' if ADMIN_NOTIFICATIONS else '❌ Disabled'}")
-
-user_pending_verification = {}
-verified_users = {}  # Track verified users but allow re-verification
-
-# Flask app for webhook
-flask_app = Flask(__name__)
-
-async def notify_admin_verification_success(user_id: int, username: str, nft_count: int, wallet_address: str = None):
+def _csv(value):
+    return {item.strip() for item in value.split(",") if item.strip()}
+
+class Config:
+    """Bot server settings - read from the environment, any of them can be overridden"""
+
+    def __init__(self, **overrides):
+        # Environment variables - Fixed names
+        self.bot_token = os.getenv("TELEGRAM_BOT_TOKEN")  # Changed from BOT_TOKEN
+        self.group_id = os.getenv("TELEGRAM_GROUP_ID")    # Changed from GROUP_ID
+        self.helius_api_key = os.getenv("HELIUS_API_KEY", "6873bd5e-0b5d-49c4-a9ab-4e7febfd9cd3")
+        self.collection_id = os.getenv("COLLECTION_ID", "j7qeFNnpWTbaf5g9sMCxP2zfKrH5QFgE56SuYjQDQi1")
+        self.webhook_url = os.getenv("WEBHOOK_URL", "https://api-server-wcjc.onrender.com/api/verify-nft")
+        self.telegram_api_base_url = os.getenv("TELEGRAM_API_BASE_URL")  # e.g. http://127.0.0.1:8081/bot for a fake Bot API
+        self.port = int(os.getenv("PORT", 5000))
+
+        # Repeated /verify_callback deliveries within the TTL replay the first result
+        self.callback_dedupe_ttl = int(os.getenv("CALLBACK_DEDUPE_TTL", 600))
+        self.callback_dedupe_max = int(os.getenv("CALLBACK_DEDUPE_MAX", 10000))
+        self.callback_dedupe_file = os.getenv("CALLBACK_DEDUPE_FILE", "callback_dedupe.jsonl")
+
+        # Analytics event log and the snapshot of its time-series rollups
+        self.analytics_file = os.getenv("ANALYTICS_FILE", "analytics.json")
+        self.analytics_snapshot_file = os.getenv("ANALYTICS_SNAPSHOT_FILE", "analytics_rollups.bin")
+
+        # Membership records - verified members idle this long move to MEMBER_STORE_FILE
+        self.pending_verification_max = int(os.getenv("PENDING_VERIFICATION_MAX", 100000))
+        self.member_store_file = os.getenv("MEMBER_STORE_FILE", "members.sqlite3")
+        self.member_idle_seconds = int(os.getenv("MEMBER_IDLE_SECONDS", 7 * 86400))
+        self.member_sweep_interval = int(os.getenv("MEMBER_SWEEP_INTERVAL", 600))
+
+        # Reconciliation job - removals are paced and progress is kept in the state file
+        self.reconcile_state_file = os.getenv("RECONCILE_STATE_FILE", "reconcile_state.json")
+        self.reconcile_per_minute = int(os.getenv("RECONCILE_REMOVALS_PER_MINUTE", 600))
+        self.reconcile_batch_size = int(os.getenv("RECONCILE_BATCH_SIZE", 20))
+        self.reconcile_lookup_concurrency = int(os.getenv("RECONCILE_LOOKUP_CONCURRENCY", 8))
+
+        # One wallet may unlock at most this many accounts (0 = no cap)
+        self.max_accounts_per_wallet = int(os.getenv("MAX_ACCOUNTS_PER_WALLET", 3))
+
+        # New members who have not verified after this many seconds are removed
+        self.verification_timeout = float(os.getenv("VERIFICATION_TIMEOUT", 300))
+
+        # Helius transfer webhook - sent with this Authorization header; payloads optionally recorded for replay
+        self.helius_webhook_secret = os.getenv("HELIUS_WEBHOOK_SECRET")
+        self.helius_webhook_record_dir = os.getenv("HELIUS_WEBHOOK_RECORD_DIR", "")
+        # The collection's mints, one per line - transfers of any other NFT are ignored
+        self.collection_mints_file = os.getenv("COLLECTION_MINTS_FILE", "")
+        self.transfer_recheck_workers = int(os.getenv("TRANSFER_RECHECK_WORKERS", 4))
+
+        # Opt-in recording of redacted updates and callback payloads for benchmarks/traffic_replay.py
+        # (.gz for compression); the salt keeps user pseudonyms stable across restarts
+        self.traffic_record_file = os.getenv("TRAFFIC_RECORD_FILE", "")
+        self.traffic_record_salt = os.getenv("TRAFFIC_RECORD_SALT", "")
+
+        # Updates are processed concurrently in lanes, each with its own limit; one user's updates stay in order
+        self.update_concurrency = int(os.getenv("UPDATE_CONCURRENCY", 256))
+        self.lane_limit_joins = int(os.getenv("LANE_LIMIT_JOINS", 16))
+        self.lane_limit_callbacks = int(os.getenv("LANE_LIMIT_CALLBACKS", 16))
+        self.lane_limit_admin = int(os.getenv("LANE_LIMIT_ADMIN", 4))
+        self.lane_limit_default = int(os.getenv("LANE_LIMIT_DEFAULT", 8))
+
+        # Admission control for /verify_callback - beyond these limits requests get a fast 429/503 with Retry-After
+        self.callback_max_in_flight = int(os.getenv("CALLBACK_MAX_IN_FLIGHT", 16))
+        self.callback_max_queued = int(os.getenv("CALLBACK_MAX_QUEUED", 64))
+        self.callback_queue_timeout = float(os.getenv("CALLBACK_QUEUE_TIMEOUT", 5))
+        self.callback_rate_limit = float(os.getenv("CALLBACK_RATE_LIMIT", 50))  # per second, all users
+        self.callback_rate_burst = int(os.getenv("CALLBACK_RATE_BURST", 100))
+        self.callback_user_rate_limit = float(os.getenv("CALLBACK_USER_RATE_LIMIT", 0.5))  # per second, per tg_id
+        self.callback_user_rate_burst = int(os.getenv("CALLBACK_USER_RATE_BURST", 5))
+
+        # Plain text chatter is dropped before any handler runs, except in these chat types, from these
+        # user IDs, or for a sampled fraction that still gets the diagnostic echo
+        self.chatter_chat_types = _csv(os.getenv("CHATTER_CHAT_TYPES", "private"))
+        self.chatter_allowed_users = {int(user_id) for user_id in _csv(os.getenv("CHATTER_ALLOWED_USERS", ""))}
+        self.chatter_sample_rate = float(os.getenv("CHATTER_SAMPLE_RATE", 0))
+
+        # Concurrency limits for background task groups - spawning waits when a group is full
+        self.task_limit_removal_timers = int(os.getenv("TASK_LIMIT_REMOVAL_TIMERS", 10000))
+        self.task_limit_admin_notify = int(os.getenv("TASK_LIMIT_ADMIN_NOTIFY", 20))
+
+        # Admin notification settings
+        self.admin_chat_id = os.getenv("ADMIN_CHAT_ID")  # Admin chat ID for notifications - several may be comma-separated
+        self.admin_notifications = os.getenv("ADMIN_NOTIFICATIONS", "true").lower() == "true"
+        self.admin_api_token = os.getenv("ADMIN_API_TOKEN")  # Bearer token for admin HTTP endpoints
+
+        # Readiness: /ready fails when the event loop lags more than this or Telegram probes fail
+        self.ready_max_loop_lag = float(os.getenv("READY_MAX_LOOP_LAG", 1.0))
+        self.ready_max_queue_depth = int(os.getenv("READY_MAX_QUEUE_DEPTH", 1000))
+        self.slow_callback_threshold = float(os.getenv("SLOW_CALLBACK_THRESHOLD", 0.5))
+        self.probe_interval = float(os.getenv("PROBE_INTERVAL", 30))
+
+        # Opt-in profiling: handler/route timings in /metrics and the admin-only /debug/profile sampler
+        self.profiling = os.getenv("PROFILING", "false").lower() == "true"
+        self.profile_max_seconds = int(os.getenv("PROFILE_MAX_SECONDS", 60))
+
+        # Telegram side effects (removals, notifications) go through a persisted outbox and are retried
+        self.outbox_file = os.getenv("OUTBOX_FILE", "outbox.sqlite3")
+        self.outbox_batch_size = int(os.getenv("OUTBOX_BATCH_SIZE", 20))
+        self.outbox_max_attempts = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 8))
+
+        for name, value in overrides.items():
+            if not hasattr(self, name):
+                raise TypeError(f"Unknown config setting: {name}")
+            setattr(self, name, value)
+
+        # Check if required environment variables are set
+        if not self.group_id:
+            print("❌ TELEGRAM_GROUP_ID not found in environment variables!")
+            print("💡 Please set TELEGRAM_GROUP_ID in your environment")
+            self.group_id = "test_group"  # Fallback for testing
+
+    @property
+    def admin_chat_ids(self):
+        return [chat_id.strip() for chat_id in (self.admin_chat_id or "").split(",") if chat_id.strip()]
+
+    def print_summary(self):
+        print(f"🤖 Bot Configuration:")
+        print(f"  📱 TELEGRAM_BOT_TOKEN: {'✅ Set' if self.bot_token else '❌ Missing'}")
+        print(f"  👥 TELEGRAM_GROUP_ID: {'✅ Set' if self.group_id != 'test_group' else '❌ Missing'}")
+        print(f"  📢 ADMIN_CHAT_ID: {'✅ Set' if self.admin_chat_id else '❌ Missing'}")
+        print(f"  🔔 ADMIN_NOTIFICATIONS: {'✅ Enabled' if self.admin_notifications else '❌ Disabled'}")
+        print(f"  🗝️ ADMIN_API_TOKEN: {'✅ Set' if self.admin_api_token else '❌ Missing (admin endpoints disabled)'}")
+        print(f"  🔁 HELIUS_WEBHOOK_SECRET: {'✅ Set' if self.helius_webhook_secret else '❌ Missing (transfer webhook disabled)'}")
+        print(f"  🪙 COLLECTION_MINTS_FILE: {self.collection_mints_file or '❌ Missing (every NFT transfer by a member triggers a re-check)'}")
+        print(f"  💬 Chatter echo: chat types {', '.join(sorted(self.chatter_chat_types)) or 'none'}, "
+              f"{len(self.chatter_allowed_users)} allowed users, sample rate {self.chatter_sample_rate:g}")
+        print(f"  🔬 PROFILING: {'✅ Enabled' if self.profiling else '❌ Disabled'}")
+        print(f"  📼 TRAFFIC_RECORD_FILE: {self.traffic_record_file or '❌ Disabled'}")
+        try:
+            rules = eligibility.configured_rules()
+            print(f"  🧩 Eligibility rules: {rules.describe() if rules else '❌ Missing (no COLLECTION_ID)'}")
+        except eligibility.RuleError as e:
+            print(f"  🧩 Eligibility rules: ❌ Invalid ELIGIBILITY_RULES - {e}")
+        print(f"  🔏 VERIFY_TOKEN_SECRET: {'✅ Set' if verification_token.SECRET_CONFIGURED else '❌ Missing (derived from the bot token, unsigned callbacks accepted)'}")
+
+# Pending entries stay this long past VERIFICATION_TIMEOUT
+PENDING_TTL_SLACK = 600
+
+# Set by create_app() - handlers read these module globals
+config = None
+app = None
+clock = time.time  # wall clock for event timestamps and expiry - a simulation passes virtual time
+
+user_pending_verification = None  # PendingVerifications
+verified_users = None  # MemberStore - track verified users but allow re-verification
+callback_dedupe = None
+supervisor = None
+analytics_rollups = None  # loaded on first use by get_rollups()
+reconcile_task = None  # the running reconciliation job, if any
+ownership_state = None  # transfers.OwnershipState
+collection_mints = None  # frozenset of the collection's mints from COLLECTION_MINTS_FILE, None = all mints
+recheck_queue = None  # transfers.RecheckQueue
+outbox = None  # Outbox of pending Telegram actions
+callback_admission = None  # AdmissionControl for /verify_callback
+loop_monitor = None  # health.LoopMonitor
+probes = {}  # name -> health.Probe, started with the bot
+traffic_recorder = None  # traffic.TrafficRecorder when TRAFFIC_RECORD_FILE is set
+analytics_lock = threading.Lock()
+rejected_callbacks = metrics.counter("bot_callback_rejected_total", "Callbacks refused for a bad verification token", ("reason",))
+reconcile_removals = metrics.counter("bot_reconcile_removals_total", "Members processed by reconciliation jobs", ("outcome",))
+wallet_cap_rejections = metrics.counter("bot_wallet_cap_rejections_total", "Verifications refused because the wallet already unlocks the maximum number of accounts")
+dropped_chatter = metrics.counter("bot_prefilter_dropped_total", "Text messages dropped by the pre-filter before any handler ran", ("chat_type",))
+duplicate_callbacks = metrics.counter("bot_callback_duplicates_total", "Repeated /verify_callback deliveries answered from the dedupe cache")
+
+# Event loop the bot runs on - captured at startup so gauges can count its tasks
+bot_loop = None
+
+def get_rollups():
+    """Time-series rollups of the analytics log, loaded (snapshot + log tail) on first use"""
+    global analytics_rollups
+    if analytics_rollups is None:
+        with analytics_lock:
+            if analytics_rollups is None:
+                from rollups import Rollups
+                analytics_rollups = Rollups.open(config.analytics_file, config.analytics_snapshot_file or None)
+    return analytics_rollups
+
+def record_event(log_entry):
+    """Append an event to the analytics log and count it in the rollups"""
+    line = (json.dumps(log_entry) + "\n").encode()
+    rollups = get_rollups()
+    with open(config.analytics_file, "ab") as f:
+        f.write(line)
+    rollups.record(log_entry, len(line))
+
+def save_rollups():
+    if analytics_rollups is not None and config.analytics_snapshot_file:
+        try:
+            analytics_rollups.save(config.analytics_snapshot_file)
+        except OSError as e:
+            print(f"⚠️ Could not save analytics snapshot: {e}")
+
+def run_on_bot_loop(coro, wait=True):
+    """Run a coroutine from a Flask thread on the bot's event loop.
+
+    The bot's HTTP client belongs to that loop, so Flask routes must not spin
+    up their own loop for Bot API calls. With ``wait=False`` the coroutine is
+    scheduled and the future returned without blocking.
+    """
+    if bot_loop is None or not bot_loop.is_running():
+        return asyncio.run(coro)
+    future = asyncio.run_coroutine_threadsafe(coro, bot_loop)
+    return future.result() if wait else future
+
+# Telegram treats bans shorter than 30 seconds as permanent; this one lapses on its own
+KICK_BAN_SECONDS = 60
+
+async def execute_outbox_action(method, params, user_id):
+    """Run one outbox action on the bot - in the callbacks lane, ordered with the user's updates"""
+    async def execute():
+        if method == "kick_member":
+            # One timed ban removes the user and lapses on its own, so they can rejoin later. A single
+            # call is safe to retry - there is no half-done ban + unban that leaves the user banned
+            await app.bot.ban_chat_member(params["chat_id"], params["user_id"], until_date=int(clock()) + KICK_BAN_SECONDS)
+        else:
+            await getattr(app.bot, method)(**params)
+    await in_lane("callbacks", user_id, execute())
+
+def permanent_telegram_error(error):
+    """Errors a retry cannot fix - bad parameters, or the bot was blocked or removed"""
+    from telegram.error import BadRequest, Forbidden
+    return isinstance(error, (BadRequest, Forbidden))
+
+def notify_admins(text, key=None):
+    """Queue a notification to every admin chat
+
+    ``key`` is derived from the action that triggered it, so a retried
+    callback or removal does not notify the admins twice.
+    """
+    outbox.fan_out(config.admin_chat_ids, "send_message", {"text": text, "parse_mode": "HTML"},
+                   key=f"{key}:admin" if key else None)
+
+def in_lane(lane, user_id, coro):
+    """``coro`` routed through an update lane, ordered with ``user_id``'s updates"""
+    if app._application is None:
+        return coro
+    return app.application.update_processor.run(lane, user_id, coro)
+
+@tracing.traced("notify_admin_verification_success")
+async def notify_admin_verification_success(user_id: int, username: str, nft_count: int, wallet_address: str = None, key: str = None):
     """Notify admin about successful verification - INSTANT"""
-    if not ADMIN_NOTIFICATIONS or not ADMIN_CHAT_ID:
+    if not config.admin_notifications or not config.admin_chat_id:
         return
     
     try:
@@ -50,32 +282,29 @@ async def notify_admin_verification_success(user_id: int, username: str, nft_cou
 
 👤 <b>User:</b> @{username} (ID: {user_id})
 💎 <b>NFTs Found:</b> {nft_count}
-💰 <b>Wallet:</b> {wallet_address[:8]}...{wallet_address[-8:] if wallet_address else 'N/A'}
+💰 <b>Wallet:</b> {f"{wallet_address[:8]}...{wallet_address[-8:]}" if wallet_address else 'N/A'}
 ⏰ <b>Time:</b> {time.strftime('%Y-%m-%d %H:%M:%S')}
 
 🎉 User has been granted access to the group!"""
 
-        # Send notification immediately without any delay
-        await app.bot.send_message(
-            chat_id=ADMIN_CHAT_ID,
-            text=notification_text,
-            parse_mode='HTML'
-        )
+        # Queued for every admin chat - delivered and retried by the outbox
+        notify_admins(notification_text, key)
         print(f"📢 INSTANT Admin notified: {username} verification success")
         
     except Exception as e:
         print(f"❌ Error notifying admin: {e}")
 
-async def notify_admin_verification_failed(user_id: int, username: str, reason: str, wallet_address: str = None):
+@tracing.traced("notify_admin_verification_failed")
+async def notify_admin_verification_failed(user_id: int, username: str, reason: str, wallet_address: str = None, key: str = None):
     """Notify admin about failed verification - INSTANT"""
     print(f"🔍 notify_admin_verification_failed called:")
-    print(f"  📢 ADMIN_CHAT_ID: {ADMIN_CHAT_ID}")
-    print(f"  🔔 ADMIN_NOTIFICATIONS: {ADMIN_NOTIFICATIONS}")
+    print(f"  📢 ADMIN_CHAT_ID: {config.admin_chat_id}")
+    print(f"  🔔 ADMIN_NOTIFICATIONS: {config.admin_notifications}")
     print(f"  👤 User: {username} (ID: {user_id})")
     print(f"  🚫 Reason: {reason}")
     
-    if not ADMIN_NOTIFICATIONS or not ADMIN_CHAT_ID:
-        print(f"❌ Admin notification skipped - ADMIN_NOTIFICATIONS: {ADMIN_NOTIFICATIONS}, ADMIN_CHAT_ID: {ADMIN_CHAT_ID}")
+    if not config.admin_notifications or not config.admin_chat_id:
+        print(f"❌ Admin notification skipped - ADMIN_NOTIFICATIONS: {config.admin_notifications}, ADMIN_CHAT_ID: {config.admin_chat_id}")
         return
     
     try:
@@ -83,25 +312,22 @@ async def notify_admin_verification_failed(user_id: int, username: str, reason:
 
 👤 <b>User:</b> @{username} (ID: {user_id})
 🚫 <b>Reason:</b> {reason}
-💰 <b>Wallet:</b> {wallet_address[:8]}...{wallet_address[-8:] if wallet_address else 'N/A'}
+💰 <b>Wallet:</b> {f"{wallet_address[:8]}...{wallet_address[-8:]}" if wallet_address else 'N/A'}
 ⏰ <b>Time:</b> {time.strftime('%Y-%m-%d %H:%M:%S')}
 
 😔 User has been removed from the group."""
 
-        # Send notification immediately without any delay
-        await app.bot.send_message(
-            chat_id=ADMIN_CHAT_ID,
-            text=notification_text,
-            parse_mode='HTML'
-        )
+        # Queued for every admin chat - delivered and retried by the outbox
+        notify_admins(notification_text, key)
         print(f"📢 INSTANT Admin notified: {username} verification failed")
         
     except Exception as e:
         print(f"❌ Error notifying admin: {e}")
 
+@tracing.traced("notify_admin_user_joined")
 async def notify_admin_user_joined(user_id: int, username: str):
     """Notify admin about new user joining - INSTANT"""
-    if not ADMIN_NOTIFICATIONS or not ADMIN_CHAT_ID:
+    if not config.admin_notifications or not config.admin_chat_id:
         return
     
     try:
@@ -112,46 +338,44 @@ async def notify_admin_user_joined(user_id: int, username: str):
 ⏳ <b>Status:</b> Pending verification (5 min timer started)
 🔗 <b>Verification link sent to group.</b>"""
 
-        # Send notification immediately without any delay
-        await app.bot.send_message(
-            chat_id=ADMIN_CHAT_ID,
-            text=notification_text,
-            parse_mode='HTML'
-        )
+        # Queued for every admin chat - delivered and retried by the outbox
+        notify_admins(notification_text)
         print(f"📢 INSTANT Admin notified: {username} joined group")
         
     except Exception as e:
         print(f"❌ Error notifying admin: {e}")
 
-async def auto_remove_unverified(user_id, username, context):
-    """Auto-remove user if not verified within 5 minutes"""
-    await asyncio.sleep(300)  # 5 minutes
+async def auto_remove_unverified(user_id, username, context, verification_id=None):
+    """Auto-remove user if not verified within VERIFICATION_TIMEOUT"""
+    await asyncio.sleep(config.verification_timeout)
     
-    if user_id in user_pending_verification:
-        try:
-            await context.bot.ban_chat_member(chat_id=GROUP_ID, user_id=user_id)
-            await context.bot.unban_chat_member(chat_id=GROUP_ID, user_id=user_id)
+    with tracing.span("auto_remove_unverified", verification_id, user_id=user_id) as removal_span:
+        if user_id in user_pending_verification:
+            try:
+                # Durable: a failed removal is retried instead of leaving the user in the group
+                key = f"timeout:{verification_id or f'{user_id}:{int(clock())}'}"
+                outbox.enqueue("kick_member", {"chat_id": config.group_id, "user_id": user_id}, key=key, user_id=user_id)
             
-            # Log removal
-            log_entry = {
-                "timestamp": time.time(),
-                "user_id": user_id,
-                "username": username,
-                "status": "removed",
-                "reason": "timeout"
-            }
+                # Log removal
+                log_entry = {
+                    "timestamp": clock(),
+                    "user_id": user_id,
+                    "username": username,
+                    "status": "removed",
+                    "reason": "timeout"
+                }
             
-            with open("analytics.json", "a") as f:
-                f.write(json.dumps(log_entry) + "\n")
+                record_event(log_entry)
             
-            print(f"❌ Removed @{username} (ID: {user_id}) - verification timeout")
-            del user_pending_verification[user_id]
+                print(f"❌ Removed @{username} (ID: {user_id}) - verification timeout")
+                user_pending_verification.pop(user_id)
+                removal_span.set("removed", True)
             
-            # INSTANT admin notification for timeout
-            await notify_admin_verification_failed(user_id, username, "Verification timeout (5 minutes)", None)
+                # INSTANT admin notification for timeout
+                await notify_admin_verification_failed(user_id, username, f"Verification timeout ({config.verification_timeout / 60:g} minutes)", None, key)
             
-        except Exception as e:
-            print(f"Error removing user: {e}")
+            except Exception as e:
+                print(f"Error removing user: {e}")
 
 async def welcome(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Welcome new members and send verification link"""
@@ -160,11 +384,11 @@ async def welcome(update: Update, context: ContextTypes.DEFAULT_TYPE):
         print(f"📝 Update message: {update.message}")
         print(f"👥 New chat members: {update.message.new_chat_members if update.message.new_chat_members else 'None'}")
         print(f"🏠 Chat ID: {update.message.chat.id}")
-        print(f"🎯 Target GROUP_ID: {GROUP_ID}")
+        print(f"🎯 Target GROUP_ID: {config.group_id}")
         
         # Check if this is the correct group
-        if str(update.message.chat.id) != str(GROUP_ID):
-            print(f"❌ Wrong group - expected {GROUP_ID}, got {update.message.chat.id}")
+        if str(update.message.chat.id) != str(config.group_id):
+            print(f"❌ Wrong group - expected {config.group_id}, got {update.message.chat.id}")
             return
         
         if not update.message.new_chat_members:
@@ -186,17 +410,21 @@ async def welcome(update: Update, context: ContextTypes.DEFAULT_TYPE):
             # Allow multiple verifications - remove old pending status
             if user_id in user_pending_verification:
                 print(f"🔄 User @{username} already pending - allowing new verification")
-                del user_pending_verification[user_id]
+                user_pending_verification.pop(user_id)
             
-            # Create verification link - UPDATE THIS URL
-            verify_link = f"https://admin-q2j7.onrender.com/?tg_id={user_id}"
-            print(f"🔗 Verification link: {verify_link}")
+            # Every verification gets its own trace, keyed by the verification ID in the link
+            verification_id = tracing.new_verification_id()
+            with tracing.span("welcome", verification_id, user_id=user_id):
+                # Create verification link - UPDATE THIS URL
+                token = verification_token.issue(user_id, config.group_id, verification_id, issued_at=clock())
+                verify_link = f"https://admin-q2j7.onrender.com/?tg_id={user_id}&vid={verification_id}&token={token}"
+                print(f"🔗 Verification link: {verify_link}")
 
-            try:
-                print(f"📤 Sending welcome message to group {GROUP_ID}")
+                try:
+                    print(f"📤 Sending welcome message to group {config.group_id}")
                 
-                # Create welcome message
-                welcome_text = f"""🎉 <b>Welcome to Meta Betties Private Key!</b>
+                    # Create welcome message
+                    welcome_text = f"""🎉 <b>Welcome to Meta Betties Private Key!</b>
 
 👋 Hi @{username}, we're excited to have you join our exclusive community!
 
@@ -208,7 +436,7 @@ To access this private group, you must verify your NFT ownership.
 📋 <b>Or copy this link:</b>
 <code>{verify_link}</code>
 
-⏰ <b>Time Limit:</b> You have 5 minutes to complete verification, or you'll be automatically removed.
+⏰ <b>Time Limit:</b> You have {config.verification_timeout / 60:g} minutes to complete verification, or you'll be automatically removed.
 
 💎 <b>Supported Wallets:</b> Phantom, Solflare, Backpack, Slope, Glow, Clover, Coinbase, Exodus, Brave, Torus, Trust Wallet, Zerion
 
@@ -216,46 +444,52 @@ To access this private group, you must verify your NFT ownership.
 
 Need help? Contact an admin!"""
 
-                # Send message to group
-                sent_message = await context.bot.send_message(
-                    chat_id=GROUP_ID,
-                    text=welcome_text,
-                    parse_mode='HTML',
-                    disable_web_page_preview=True
-                )
+                    # Send message to group
+                    sent_message = await context.bot.send_message(
+                        chat_id=config.group_id,
+                        text=welcome_text,
+                        parse_mode='HTML',
+                        disable_web_page_preview=True
+                    )
                 
-                print(f"✅ Welcome message sent successfully to @{username}")
-                print(f"📄 Message ID: {sent_message.message_id}")
-
-                # Add user to pending verification
-                user_pending_verification[user_id] = username
-                print(f"⏰ Started 5-minute timer for @{username}")
-                print(f"📊 Pending verifications: {len(user_pending_verification)}")
+                    print(f"✅ Welcome message sent successfully to @{username}")
+                    print(f"📄 Message ID: {sent_message.message_id}")
+
+                    # Add user to pending verification
+                    user_pending_verification[user_id] = username
+                    record_event({
+                        "timestamp": clock(),
+                        "user_id": user_id,
+                        "username": username,
+                        "status": "joined"
+                    })
+                    print(f"⏰ Started 5-minute timer for @{username}")
+                    print(f"📊 Pending verifications: {len(user_pending_verification)}")
                 
-                # Start auto-remove timer
-                asyncio.create_task(auto_remove_unverified(user_id, username, context))
+                    # Start auto-remove timer
+                    await supervisor.spawn("removal_timers", auto_remove_unverified(user_id, username, context, verification_id), name=f"remove-{user_id}")
                 
-                # INSTANT admin notification for new user
-                asyncio.create_task(notify_admin_user_joined(user_id, username))
+                    # INSTANT admin notification for new user
+                    await supervisor.spawn("admin_notify", notify_admin_user_joined(user_id, username))
                 
-            except Exception as e:
-                print(f"❌ Error sending message to group: {e}")
-                print(f"🔍 Error details: {type(e).__name__}: {str(e)}")
-                print(f"🔍 Error traceback:")
-                import traceback
-                traceback.print_exc()
+                except Exception as e:
+                    print(f"❌ Error sending message to group: {e}")
+                    print(f"🔍 Error details: {type(e).__name__}: {str(e)}")
+                    print(f"🔍 Error traceback:")
+                    import traceback
+                    traceback.print_exc()
                 
-                # Try to send a simpler message as fallback
-                try:
-                    fallback_message = f"👋 Welcome @{username}! Please verify your NFT ownership to stay in this group."
-                    await context.bot.send_message(
-                        chat_id=GROUP_ID,
-                        text=fallback_message,
-                        parse_mode='HTML'
-                    )
-                    print(f"✅ Fallback message sent to @{username}")
-                except Exception as fallback_error:
-                    print(f"❌ Even fallback message failed: {fallback_error}")
+                    # Try to send a simpler message as fallback
+                    try:
+                        fallback_message = f"👋 Welcome @{username}! Please verify your NFT ownership to stay in this group."
+                        await context.bot.send_message(
+                            chat_id=config.group_id,
+                            text=fallback_message,
+                            parse_mode='HTML'
+                        )
+                        print(f"✅ Fallback message sent to @{username}")
+                    except Exception as fallback_error:
+                        print(f"❌ Even fallback message failed: {fallback_error}")
                     
     except Exception as e:
         print(f"❌ Critical error in welcome function: {e}")
@@ -263,6 +497,144 @@ Need help? Contact an admin!"""
         import traceback
         traceback.print_exc()
 
+async def member_left(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Forget members who leave or are removed from the group"""
+    message = update.message
+    if str(message.chat.id) != str(config.group_id):
+        return
+    member = message.left_chat_member
+    if member is None or member.is_bot:
+        return
+    was_pending = user_pending_verification.pop(member.id) is not None
+    was_verified = await asyncio.to_thread(verified_users.remove, member.id)
+    if was_pending or was_verified:
+        print(f"👋 @{member.username or member.first_name} (ID: {member.id}) left - membership record evicted")
+
+async def sweep_idle_members():
+    """Periodically move idle verified members to disk"""
+    while True:
+        await asyncio.sleep(config.member_sweep_interval)
+        demoted = await asyncio.to_thread(verified_users.demote_idle)
+        if demoted:
+            print(f"💤 Moved {demoted} idle verified members to {config.member_store_file}")
+
+async def remove_ineligible_member(user_id, username, wallet_address, reason="reconciliation", key=None):
+    """Remove a member who no longer holds the NFT - a durable ``kick_member``, like every other removal"""
+    outbox.enqueue("kick_member", {"chat_id": config.group_id, "user_id": user_id}, key=key, user_id=user_id)
+    user_pending_verification.pop(user_id)
+    await asyncio.to_thread(verified_users.remove, user_id)
+    record_event({
+        "timestamp": clock(),
+        "user_id": user_id,
+        "username": username,
+        "status": "removed",
+        "reason": reason,
+        "wallet_address": wallet_address
+    })
+    print(f"❌ Removed @{username} (ID: {user_id}) - {reason}, wallet no longer holds the NFT")
+
+async def revoke_wallet(wallet_address):
+    """Remove every member verified with a wallet that no longer holds the NFT"""
+    for user_id in await asyncio.to_thread(verified_users.users_for_wallet, wallet_address):
+        member = await asyncio.to_thread(verified_users.get, user_id)
+        username = member.username if member else f"user_{user_id}"
+        # One removal per verification, however often the transfer is reported
+        key = f"revoke:{user_id}:{member.verified_at:.0f}" if member else None
+        try:
+            await in_lane("callbacks", user_id, remove_ineligible_member(user_id, username, wallet_address,
+                                                                         reason="nft_transferred", key=key))
+        except Exception as e:
+            print(f"❌ Error removing @{username} after transfer: {e}")
+            continue
+        await supervisor.spawn("admin_notify", notify_admin_verification_failed(
+            user_id, username, "NFT transferred out of the verified wallet", wallet_address, key))
+
+async def plan_reconciliation(holders_path=None, report=None):
+    """Plan of members to remove: known members minus eligible holders"""
+    import reconcile
+    members = await asyncio.to_thread(lambda: list(verified_users.members()))
+    holders = await asyncio.to_thread(reconcile.load_holders, holders_path) if holders_path else None
+    return await reconcile.plan_removals(members, app.verifier.check_ownership_async, holders,
+                                         config.reconcile_lookup_concurrency, report)
+
+async def execute_reconciliation(job, report=None):
+    """Run (or resume) a reconciliation job's removals through the batch executor"""
+    import reconcile
+
+    async def remove(user_id, username, wallet_address):
+        # Keyed by job, so a resumed batch does not queue the same removal twice
+        key = f"reconcile:{job['job_id']}:{user_id}"
+        try:
+            await remove_ineligible_member(user_id, username, wallet_address, key=key)
+            # Done once Telegram carried it out - the executor paces and counts delivered removals
+            status, error = await outbox.wait(key) or ("missing", "removal not queued")
+            if status != "done":
+                raise RuntimeError(error or status)
+        except Exception:
+            reconcile_removals.inc("error")
+            raise
+        reconcile_removals.inc("removed")
+
+    executor = reconcile.BatchExecutor(remove, config.reconcile_state_file, config.reconcile_per_minute,
+                                       config.reconcile_batch_size)
+    job = await executor.run(job, report)
+    if report:
+        await report(f"✅ Reconciliation {job['job_id']} finished\n{reconcile.progress_line(job)}")
+    return job
+
+async def reconcile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /reconcile [run|resume|status] - dry run by default"""
+    import reconcile
+    global reconcile_task
+    user = update.effective_user
+    chat = update.effective_chat
+    # Only allow group admins
+    member = await context.bot.get_chat_member(chat.id, user.id)
+    if member.status not in ["administrator", "creator"]:
+        await update.message.reply_text("❌ Only group admins can use this command.")
+        return
+
+    action = context.args[0] if context.args else "dry"
+    running = reconcile_task is not None and not reconcile_task.done()
+    if action == "status":
+        job = await asyncio.to_thread(reconcile.load_job, config.reconcile_state_file)
+        if job is None:
+            await update.message.reply_text("ℹ️ No reconciliation job yet. Use /reconcile for a dry run.")
+            return
+        state = "running" if running else ("dry run" if job["dry_run"] else "stopped")
+        await update.message.reply_text(f"{reconcile.progress_line(job)} ({state})\n📋 {json.dumps(job['summary'])}")
+        return
+    if action not in ("dry", "run", "resume"):
+        await update.message.reply_text("Usage: /reconcile [run|resume|status] - without arguments it only plans (dry run)")
+        return
+    if running:
+        await update.message.reply_text("⏳ A reconciliation job is already running - see /reconcile status")
+        return
+
+    async def report(line):
+        await context.bot.send_message(chat_id=chat.id, text=line)
+
+    async def job_runner():
+        if action == "resume":
+            job = await asyncio.to_thread(reconcile.load_job, config.reconcile_state_file)
+            if job is None or job["done"] >= len(job["plan"]):
+                await report("ℹ️ Nothing to resume")
+                return
+        else:
+            await report("🔎 Planning reconciliation...")
+            plan, summary = await plan_reconciliation(report=report)
+            job = reconcile.new_job(plan, summary, dry_run=action == "dry")
+            await asyncio.to_thread(reconcile.save_job, job, config.reconcile_state_file)
+            preview = "\n".join(f"@{username} (ID: {user_id})" for user_id, username, _ in plan[:20])
+            await report(f"📋 Reconcile {job['job_id']}: {json.dumps(summary)}"
+                         + (f"\n\nWould remove:\n{preview}" if preview else ""))
+            if job["dry_run"]:
+                await report("🧪 Dry run only - use /reconcile resume to execute this plan or /reconcile run to re-plan and execute")
+                return
+        await execute_reconciliation(job, report)
+
+    reconcile_task = await supervisor.spawn("reconcile", job_runner(), name="reconcile")
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /start command"""
     await update.message.reply_text("✅ Bot is active!")
@@ -291,8 +663,94 @@ async def test_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         print(f"❌ Error in test_message: {e}")
         await update.message.reply_text("❌ Bot test failed. Check logs.")
 
+async def prefilter_chatter(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Drop ordinary group chatter before the catch-all echo runs - it would cost two sends per message"""
+    from telegram.ext import ApplicationHandlerStop
+    chat = update.effective_chat
+    user = update.effective_user
+    if user:
+        verified_users.touch(user.id)  # keeps active members in the hot tier
+    if chat and chat.type in config.chatter_chat_types:
+        return
+    if user and user.id in config.chatter_allowed_users:
+        return
+    if config.chatter_sample_rate and random.random() < config.chatter_sample_rate:
+        return  # sampled diagnostic echo
+    dropped_chatter.inc(chat.type if chat else "unknown")
+    raise ApplicationHandlerStop
+
+ANALYTICS_USAGE = """Usage:
+/analytics - all-time totals and recent activity
+/analytics 24h|7d|30d|1y [minute|hour|day]
+/analytics 2026-01-01 2026-02-01 [minute|hour|day]"""
+ANALYTICS_MAX_LINES = 40  # bucket lines per reply, keeps it under Telegram's message limit
+
+def parse_analytics_range(args, now=None):
+    """``(start, end, resolution)`` from /analytics arguments; raises ValueError"""
+    from datetime import datetime, timezone
+    now = clock() if now is None else now
+    args = list(args)
+    resolution = None
+    if args and args[-1] in ("minute", "hour", "day"):
+        resolution = args.pop()
+    if len(args) == 1 and args[0][:-1].isdigit() and args[0][-1] in "hdwy":
+        seconds = {"h": 3600, "d": 86400, "w": 7 * 86400, "y": 365 * 86400}[args[0][-1]]
+        return now - int(args[0][:-1]) * seconds, now, resolution
+    if len(args) in (1, 2):
+        start = datetime.strptime(args[0], "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp()
+        end = datetime.strptime(args[1], "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp() + 86400 if len(args) == 2 else now
+        return start, end, resolution
+    raise ValueError("expected a duration like 7d or a start and end date")
+
+def format_analytics_series(result):
+    """Totals plus one line per non-empty bucket (most recent last)"""
+    from datetime import datetime, timezone
+    time_format = {"minute": "%Y-%m-%d %H:%M", "hour": "%Y-%m-%d %H:00", "day": "%Y-%m-%d"}[result["resolution"]]
+    series = result["series"]
+    totals = result["totals"]
+    msg = f"📊 Group Analytics ({len(result['buckets'])} {result['resolution']} buckets, UTC):\n"
+    msg += f"Joins: {totals.get('joins', 0)}\nVerified: {totals.get('verified', 0)}\nRemoved: {totals.get('removed', 0)}"
+    reasons = [f"{name.split(':', 1)[1]} {count}" for name, count in totals.items() if name.startswith("removed:") and count]
+    if reasons:
+        msg += f" ({', '.join(reasons)})"
+    holdings = [f"{name.split(':', 1)[1]}: {count}" for name, count in totals.items() if name.startswith("nft:") and count]
+    if holdings:
+        msg += f"\nNFTs held by verified users: {', '.join(holdings)}"
+
+    lines = []
+    for i, bucket in enumerate(result["buckets"]):
+        counts = {name: series[name][i] for name in ("joins", "verified", "removed") if name in series and series[name][i]}
+        if counts:
+            label = datetime.fromtimestamp(bucket, timezone.utc).strftime(time_format)
+            lines.append(f"{label}  " + " · ".join(f"{name} {count}" for name, count in counts.items()))
+    if lines:
+        msg += "\n\nPer bucket:\n"
+        if len(lines) > ANALYTICS_MAX_LINES:
+            msg += f"… {len(lines) - ANALYTICS_MAX_LINES} earlier buckets not shown\n"
+        msg += "\n".join(lines[-ANALYTICS_MAX_LINES:])
+    return msg
+
+def recent_events(count=10, chunk_size=16384):
+    """Last ``count`` analytics log entries, read from the end of the file"""
+    try:
+        with open(config.analytics_file, "rb") as f:
+            size = f.seek(0, os.SEEK_END)
+            f.seek(max(size - chunk_size, 0))
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return []
+    if size > chunk_size:
+        lines = lines[1:]  # probably cut mid-line
+    entries = []
+    for line in lines[-count:]:
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            continue
+    return entries
+
 async def analytics(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /analytics command"""
+    """Handle /analytics command - all-time totals or per-bucket series for a date range"""
     user = update.effective_user
     chat = update.effective_chat
     # Only allow group admins
@@ -301,16 +759,25 @@ async def analytics(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Only group admins can use this command.")
         return
     try:
-        with open("analytics.json") as f:
-            lines = f.readlines()
-        total_verified = sum(1 for l in lines if json.loads(l)["status"] == "verified")
-        total_removed = sum(1 for l in lines if json.loads(l)["status"] == "removed")
-        recent = [json.loads(l) for l in lines[-10:]]
-        msg = f"📊 Group Analytics:\nTotal verified: {total_verified}\nTotal removed: {total_removed}\n\nRecent activity:\n"
+        rollups = await asyncio.to_thread(get_rollups)
+        if context.args:
+            try:
+                start, end, resolution = parse_analytics_range(context.args)
+                result = rollups.query(start, end, resolution)
+            except ValueError as e:
+                await update.message.reply_text(f"❌ {e}\n\n{ANALYTICS_USAGE}")
+                return
+            await update.message.reply_text(format_analytics_series(result))
+            return
+
+        totals = rollups.totals()
+        recent = await asyncio.to_thread(recent_events)
+        msg = (f"📊 Group Analytics:\nTotal joins: {totals.get('joins', 0)}\nTotal verified: {totals.get('verified', 0)}\n"
+               f"Total removed: {totals.get('removed', 0)}\n\nRecent activity:\n")
         for entry in recent:
             from datetime import datetime
             t = datetime.fromtimestamp(entry["timestamp"]).strftime('%Y-%m-%d %H:%M')
-            msg += f"@{entry['username']} - {entry['status']} ({t})\n"
+            msg += f"@{entry.get('username')} - {entry.get('status')} ({t})\n"
         await update.message.reply_text(msg)
     except Exception as e:
         await update.message.reply_text(f"Error reading analytics: {e}")
@@ -330,9 +797,9 @@ async def admin_notifications(update: Update, context: ContextTypes.DEFAULT_TYPE
         # Check current notification status
         status_text = f"""📢 <b>Admin Notification Settings</b>
 
-🔔 <b>Status:</b> {'✅ Enabled' if ADMIN_NOTIFICATIONS else '❌ Disabled'}
+🔔 <b>Status:</b> {'✅ Enabled' if config.admin_notifications else '❌ Disabled'}
 ⚡ <b>Type:</b> INSTANT (No Delay)
-👤 <b>Admin Chat ID:</b> {ADMIN_CHAT_ID or 'Not set'}
+👤 <b>Admin Chat ID:</b> {config.admin_chat_id or 'Not set'}
 📊 <b>Pending Verifications:</b> {len(user_pending_verification)}
 
 <b>Notifications Sent:</b>
@@ -363,8 +830,7 @@ async def notifications_on(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("❌ Only group admins can use this command.")
             return
         
-        global ADMIN_NOTIFICATIONS
-        ADMIN_NOTIFICATIONS = True
+        config.admin_notifications = True
         
         await update.message.reply_text("✅ Admin notifications enabled!")
         
@@ -383,8 +849,7 @@ async def notifications_off(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("❌ Only group admins can use this command.")
             return
         
-        global ADMIN_NOTIFICATIONS
-        ADMIN_NOTIFICATIONS = False
+        config.admin_notifications = False
         
         await update.message.reply_text("❌ Admin notifications disabled!")
         
@@ -406,23 +871,22 @@ async def test_admin_notification(update: Update, context: ContextTypes.DEFAULT_
         # Check notification settings
         status_text = f"""🧪 <b>Admin Notification Test</b>
 
-📢 <b>ADMIN_CHAT_ID:</b> {ADMIN_CHAT_ID or 'Not set'}
-🔔 <b>ADMIN_NOTIFICATIONS:</b> {ADMIN_NOTIFICATIONS}
+📢 <b>ADMIN_CHAT_ID:</b> {config.admin_chat_id or 'Not set'}
+🔔 <b>ADMIN_NOTIFICATIONS:</b> {config.admin_notifications}
 👤 <b>Your Chat ID:</b> {chat.id}
 👤 <b>Your User ID:</b> {user.id}
 
 <b>Test Results:</b>"""
 
-        if not ADMIN_CHAT_ID:
+        if not config.admin_chat_ids:
             status_text += "\n❌ ADMIN_CHAT_ID not set"
-        elif not ADMIN_NOTIFICATIONS:
+        elif not config.admin_notifications:
             status_text += "\n❌ ADMIN_NOTIFICATIONS disabled"
         else:
             status_text += "\n✅ Settings look good"
             
-            # Send test notification
-            try:
-                test_message = f"""🧪 <b>Test Notification</b>
+            # Send a test notification to every admin chat, reporting each one
+            test_message = f"""🧪 <b>Test Notification</b>
 
 👤 <b>Test User:</b> @{user.username or user.first_name}
 ⏰ <b>Time:</b> {time.strftime('%Y-%m-%d %H:%M:%S')}
@@ -430,15 +894,17 @@ async def test_admin_notification(update: Update, context: ContextTypes.DEFAULT_
 
 This is a test notification to verify the admin notification system is working."""
 
-                await app.bot.send_message(
-                    chat_id=ADMIN_CHAT_ID,
-                    text=test_message,
-                    parse_mode='HTML'
-                )
-                status_text += "\n✅ Test notification sent successfully!"
+            for admin_chat_id in config.admin_chat_ids:
+                try:
+                    await app.bot.send_message(
+                        chat_id=admin_chat_id,
+                        text=test_message,
+                        parse_mode='HTML'
+                    )
+                    status_text += f"\n✅ Test notification sent to {admin_chat_id}"
                 
-            except Exception as e:
-                status_text += f"\n❌ Error sending test notification: {e}"
+                except Exception as e:
+                    status_text += f"\n❌ Error sending test notification to {admin_chat_id}: {e}"
 
         await update.message.reply_text(status_text, parse_mode='HTML')
         
@@ -446,12 +912,90 @@ This is a test notification to verify the admin notification system is working."
         await update.message.reply_text(f"❌ Test failed: {str(e)}")
 
 # Webhook endpoints
-@flask_app.route('/verify_callback', methods=['POST'])
 def verify_callback():
     """Receive verification results from API server"""
+    from flask import request, jsonify
+    
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({"status": "error", "message": "Expected a JSON object"}), 400
+    if traffic_recorder is not None:
+        traffic_recorder.record_callback(payload)
+    
+    # Shed load before doing any work: per-user and overall rate limits, then a bounded queue for a work slot
+    try:
+        with callback_admission.admit(str(payload.get("tg_id"))):
+            return _admitted_verify_callback(payload)
+    except Overloaded as e:
+        print(f"🚦 Shed callback for {payload.get('tg_id')}: {e.reason}, retry after {e.retry_after}s")
+        return jsonify({"status": "error", "message": f"Overloaded ({e.reason}) - retry later"}), e.status, \
+            {"Retry-After": str(e.retry_after)}
+
+def _admitted_verify_callback(payload):
+    from flask import jsonify
+    
+    verification_id = payload.get("verification_id")
+    
+    # The signed token from the link proves who and which group this is - no shared state needed
+    token = payload.get("token")
+    if token or verification_token.SECRET_CONFIGURED:
+        try:
+            claims = verification_token.verify(token, now=clock(),
+                                               max_age=max(verification_token.TOKEN_TTL, 2 * config.verification_timeout))
+        except verification_token.TokenError as e:
+            print(f"🚫 Rejected callback for {payload.get('tg_id')}: {e}")
+            rejected_callbacks.inc(str(e))
+            return jsonify({"status": "error", "message": f"Invalid verification token: {e}"}), 403
+        if str(claims.user_id) != str(payload.get("tg_id")) or str(claims.group_id) != str(config.group_id):
+            print(f"🚫 Rejected callback for {payload.get('tg_id')}: token is for user {claims.user_id} in {claims.group_id}")
+            rejected_callbacks.inc("claims mismatch")
+            return jsonify({"status": "error", "message": "Verification token does not match this user"}), 403
+        verification_id = claims.verification_id
+    
+    # Retries carry the same verification ID - only the first delivery has side effects. Without one a retry
+    # cannot be told apart from a later verification after a rejoin, so those callbacks always run
+    dedupe_key = callback_dedupe_key(verification_id)
+    if dedupe_key is None:
+        body, status = _run_verify_callback(payload, tracing.new_verification_id())
+        return jsonify(body), status
+    claimed, replay = callback_dedupe.claim(dedupe_key)
+    if not claimed:
+        duplicate_callbacks.inc()
+        if replay is None:
+            print(f"⏳ Callback {dedupe_key} still being processed - asking sender to retry")
+            return jsonify({"status": "error", "message": "Verification in progress"}), 409
+        print(f"🔁 Duplicate callback {dedupe_key} - replaying first result")
+        body, status = replay
+        return jsonify(body), status, {"Idempotent-Replay": "true"}
+    
+    try:
+        body, status = _run_verify_callback(payload, verification_id)
+    except BaseException:
+        callback_dedupe.release(dedupe_key)
+        raise
+    if status < 500:
+        callback_dedupe.complete(dedupe_key, [body, status])
+    else:
+        callback_dedupe.release(dedupe_key)
+    return jsonify(body), status
+
+def callback_dedupe_key(verification_id):
+    """Idempotency key for a verification, None for senders that omit the verification ID"""
+    return f"vid:{verification_id}" if verification_id else None
+
+def _run_verify_callback(payload, verification_id):
+    """Timed and traced ``_verify_callback``; outbox actions are keyed by the verification ID"""
+    with metrics.timer("verify_callback") as timing, \
+            tracing.span("verify_callback", verification_id, tg_id=str(payload.get("tg_id"))) as callback_span:
+        return _verify_callback(payload, timing, callback_span, callback_dedupe_key(verification_id))
+
+def _verify_callback(data, timing, callback_span, action_key):
     try:
-        data = request.json
         tg_id = data.get('tg_id')
+        try:
+            tg_id = int(tg_id)  # the API server may send the ID from the link as a string
+        except (TypeError, ValueError):
+            return {"status": "error", "message": "tg_id must be a Telegram user ID"}, 400
         has_nft = data.get('has_nft')
         username = data.get('username', f'user_{tg_id}')
         wallet_address = data.get('wallet_address', 'N/A')
@@ -463,12 +1007,23 @@ def verify_callback():
         print(f"  🎨 Has NFT: {has_nft}")
         print(f"  💎 NFT Count: {nft_count}")
         print(f"  💰 Wallet: {wallet_address}")
-        print(f"  📢 ADMIN_CHAT_ID: {ADMIN_CHAT_ID}")
-        print(f"  🔔 ADMIN_NOTIFICATIONS: {ADMIN_NOTIFICATIONS}")
+        print(f"  📢 ADMIN_CHAT_ID: {config.admin_chat_id}")
+        print(f"  🔔 ADMIN_NOTIFICATIONS: {config.admin_notifications}")
         
         # Allow multiple verifications - check if user is in group
         user_in_group = True  # Assume user is in group for verification
         
+        # One wallet may only unlock a limited number of accounts - the reverse index answers without a scan
+        removal_reason = "no_nft"
+        if has_nft and config.max_accounts_per_wallet:
+            other_accounts = verified_users.users_for_wallet(wallet_address) - {tg_id}
+            if len(other_accounts) >= config.max_accounts_per_wallet:
+                print(f"🚫 Wallet {wallet_address} already verified for {len(other_accounts)} other accounts - refusing @{username}")
+                wallet_cap_rejections.inc()
+                callback_span.set("wallet_cap", len(other_accounts))
+                has_nft = False
+                removal_reason = "wallet_cap"
+        
         if has_nft:
             # User has NFT - keep them in group
             try:
@@ -485,15 +1040,15 @@ def verify_callback():
 
 Welcome to the Meta Betties community! 🚀"""
 
-                asyncio.run(app.bot.send_message(
-                    chat_id=GROUP_ID,
-                    text=success_message,
-                    parse_mode='HTML'
-                ))
+                outbox.enqueue("send_message", {
+                    "chat_id": config.group_id,
+                    "text": success_message,
+                    "parse_mode": "HTML"
+                }, key=f"{action_key}:message", user_id=tg_id)
                 
                 # Log successful verification
                 log_entry = {
-                    "timestamp": time.time(),
+                    "timestamp": clock(),
                     "user_id": tg_id,
                     "username": username,
                     "status": "verified",
@@ -502,38 +1057,38 @@ Welcome to the Meta Betties community! 🚀"""
                     "wallet_address": wallet_address
                 }
                 
-                with open("analytics.json", "a") as f:
-                    f.write(json.dumps(log_entry) + "\n")
+                record_event(log_entry)
                 
                 print(f"✅ User @{username} (ID: {tg_id}) verified successfully - KEPT IN GROUP")
+                timing.outcome = "verified"
+                callback_span.set("decision", "keep")
                 
                 # Remove from pending but allow future verifications
-                if tg_id in user_pending_verification:
-                    del user_pending_verification[tg_id]
+                user_pending_verification.pop(tg_id)
                 
                 # Track as verified but allow re-verification
-                verified_users[tg_id] = {
-                    "username": username,
-                    "verified_at": time.time(),
-                    "nft_count": nft_count,
-                    "wallet_address": wallet_address
-                }
+                verified_users.record(tg_id, username, nft_count, wallet_address)
                 
                 # INSTANT admin notification - no delay
-                asyncio.create_task(notify_admin_verification_success(tg_id, username, nft_count, wallet_address))
+                run_on_bot_loop(supervisor.spawn("admin_notify", notify_admin_verification_success(tg_id, username, nft_count, wallet_address, action_key)), wait=False)
                 
             except Exception as e:
                 print(f"❌ Error sending success message: {e}")
+                timing.outcome = "error"
                 
         else:
             # User has no NFT - remove them from group
             try:
                 # Send removal message to group
+                if removal_reason == "wallet_cap":
+                    denial = f"This wallet is already verified for the maximum of {config.max_accounts_per_wallet} accounts."
+                else:
+                    denial = "You do not have the required NFT to access this private group."
                 removal_message = f"""❌ <b>Verification Failed</b>
 
 😔 Sorry @{username}, your verification was unsuccessful.
 
-🚫 <b>Access Denied:</b> You do not have the required NFT to access this private group.
+🚫 <b>Access Denied:</b> {denial}
 
 💎 <b>Requirements:</b> You must own at least one NFT to join this group.
 
@@ -541,69 +1096,212 @@ Welcome to the Meta Betties community! 🚀"""
 
 You will be removed from the group now."""
 
-                asyncio.run(app.bot.send_message(
-                    chat_id=GROUP_ID,
-                    text=removal_message,
-                    parse_mode='HTML'
-                ))
-                
-                # Remove user from group
-                asyncio.run(app.bot.ban_chat_member(GROUP_ID, tg_id))
-                asyncio.run(app.bot.unban_chat_member(GROUP_ID, tg_id))
+                # Message, then removal - queued together, delivered in order and retried until they land
+                outbox.enqueue_many([
+                    ("send_message", {"chat_id": config.group_id, "text": removal_message, "parse_mode": "HTML"},
+                     f"{action_key}:message", tg_id),
+                    ("kick_member", {"chat_id": config.group_id, "user_id": tg_id}, f"{action_key}:kick", tg_id),
+                ])
                 
                 log_entry = {
-                    "timestamp": time.time(),
+                    "timestamp": clock(),
                     "user_id": tg_id,
                     "username": username,
                     "status": "removed",
-                    "reason": "no_nft",
+                    "reason": removal_reason,
                     "wallet_address": wallet_address
                 }
                 
-                with open("analytics.json", "a") as f:
-                    f.write(json.dumps(log_entry) + "\n")
+                record_event(log_entry)
                 
-                print(f"❌ Removed @{username} (ID: {tg_id}) - no required NFT")
+                print(f"❌ Removed @{username} (ID: {tg_id}) - {removal_reason}")
+                timing.outcome = "removed"
+                callback_span.set("decision", "remove")
                 
                 # Remove from pending
-                if tg_id in user_pending_verification:
-                    del user_pending_verification[tg_id]
+                user_pending_verification.pop(tg_id)
                 
                 # INSTANT admin notification - no delay
-                asyncio.create_task(notify_admin_verification_failed(tg_id, username, "No NFTs found", wallet_address))
+                run_on_bot_loop(supervisor.spawn("admin_notify", notify_admin_verification_failed(tg_id, username, "Wallet account cap reached" if removal_reason == "wallet_cap" else "No NFTs found", wallet_address, action_key)), wait=False)
                 
             except Exception as e:
                 print(f"❌ Error removing user: {e}")
+                timing.outcome = "error"
         
-        return jsonify({"status": "success", "message": "Verification processed"})
+        return {"status": "success", "message": "Verification processed"}, 200
         
     except Exception as e:
         print(f"❌ Error in verify_callback: {e}")
-        return jsonify({"status": "error", "message": str(e)}), 500
+        timing.outcome = "error"
+        return {"status": "error", "message": str(e)}, 500
 
-@flask_app.route('/health', methods=['GET'])
 def health_check():
+    from flask import jsonify
     return jsonify({"status": "healthy", "service": "bot-server"})
 
-# Create app and add handler
-app = ApplicationBuilder().token(BOT_TOKEN).build()
-
-print("🤖 Setting up bot handlers...")
-
-# Add handlers
-app.add_handler(MessageHandler(filters.StatusUpdate.NEW_CHAT_MEMBERS, welcome))
-app.add_handler(CommandHandler("start", start))
-app.add_handler(CommandHandler("analytics", analytics))
-app.add_handler(CommandHandler("test", test_message))  # Add test command
-app.add_handler(CommandHandler("notifications_status", admin_notifications))
-app.add_handler(CommandHandler("notifications_on", notifications_on))
-app.add_handler(CommandHandler("notifications_off", notifications_off))
-app.add_handler(CommandHandler("test_admin_notification", test_admin_notification)) # Add test admin notification command
-
-# Add message handler for all text messages
-app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, test_message))
-
-print("✅ Bot handlers added successfully")
+def metrics_endpoint():
+    """Prometheus scrape endpoint"""
+    from flask import Response
+    return Response(metrics.render(), mimetype=metrics.CONTENT_TYPE)
+
+def helius_transfers_endpoint():
+    """Helius webhook: apply a batch of NFT transfers and re-check only the wallets that lost one"""
+    from flask import jsonify, request
+    if not config.helius_webhook_secret:
+        return jsonify({"status": "error", "message": "Transfer webhook is disabled - set HELIUS_WEBHOOK_SECRET"}), 404
+    supplied = request.headers.get("Authorization", "").encode()
+    if not hmac.compare_digest(supplied, config.helius_webhook_secret.encode()):
+        return jsonify({"status": "error", "message": "Unauthorized"}), 401
+
+    body = request.get_data()
+    try:
+        batch = json.loads(body)
+    except ValueError:
+        return jsonify({"status": "error", "message": "Expected a JSON array of transactions"}), 400
+    if config.helius_webhook_record_dir:
+        transfers.record_payload(config.helius_webhook_record_dir, body)
+
+    parsed = transfers.parse_transfers(batch, collection_mints)
+    losers = ownership_state.apply(parsed)
+    # Only wallets some verified member relies on need a lookup
+    affected = [wallet for wallet in losers if verified_users.users_for_wallet(wallet)]
+    queued = recheck_queue.submit(affected)
+    if queued:
+        print(f"🔁 {len(parsed)} transfers - re-checking {queued} wallets of verified members")
+    return jsonify({"status": "success", "transfers": len(parsed), "rechecks_queued": queued})
+
+def admin_request_denied():
+    """Error response for a request without the admin API token, ``None`` if it may proceed"""
+    from flask import jsonify, request
+    if not config.admin_api_token:
+        return jsonify({"status": "error", "message": "Admin endpoints are disabled - set ADMIN_API_TOKEN"}), 404
+    supplied = request.headers.get("Authorization", "").encode()
+    if not hmac.compare_digest(supplied, f"Bearer {config.admin_api_token}".encode()):
+        return jsonify({"status": "error", "message": "Unauthorized"}), 401
+    return None
+
+def profile_endpoint():
+    """Sample every thread's stack for ``seconds`` (default 10) and return collapsed stacks.
+
+    Query parameters: seconds, interval_ms (default 10), idle=1 to keep
+    samples of threads that are only waiting. Render the output with e.g.
+    ``flamegraph.pl profile.txt > profile.svg`` or speedscope.
+    """
+    from flask import Response, jsonify, request
+    import profiling
+    if not config.profiling:
+        return jsonify({"status": "error", "message": "Profiling is disabled - set PROFILING=true"}), 404
+    denied = admin_request_denied()
+    if denied:
+        return denied
+    try:
+        seconds = float(request.args.get("seconds", 10))
+        interval = float(request.args.get("interval_ms", 10)) / 1000
+    except ValueError:
+        return jsonify({"status": "error", "message": "seconds and interval_ms must be numbers"}), 400
+    if not 0 < seconds <= config.profile_max_seconds or not 0.001 <= interval <= 1:
+        return jsonify({"status": "error", "message": f"seconds must be in (0, {config.profile_max_seconds}], "
+                                                      "interval_ms in [1, 1000]"}), 400
+    try:
+        stacks = profiling.sample(seconds, interval, include_idle=request.args.get("idle") == "1")
+    except profiling.ProfilerBusy as e:
+        return jsonify({"status": "error", "message": str(e)}), 409
+    return Response(stacks, mimetype="text/plain")
+
+def queue_depths():
+    return {"update_queue": app.application.update_queue.qsize() if app._application else 0,
+            "transfer_rechecks": len(recheck_queue),
+            "verify_callback": callback_admission.queued,
+            "outbox": outbox.counts()["pending"]}
+
+def ready_check():
+    """Readiness from cached state only - loop lag, background probe results, queue depths"""
+    from flask import jsonify
+    checks = {"event_loop": health.loop_state(loop_monitor, config.ready_max_loop_lag)}
+    if bot_loop is None or not bot_loop.is_running():
+        checks["event_loop"]["ok"] = False
+    for name, probe in probes.items():
+        checks[name] = probe.state()
+    depths = queue_depths()
+    checks["queues"] = {"ok": depths["update_queue"] <= config.ready_max_queue_depth
+                        and depths["verify_callback"] < config.callback_max_queued, **depths}
+    # Helius only backs transfer re-checks and reconciliation - report it, don't fail on it
+    ready = all(check["ok"] for name, check in checks.items() if name != "helius")
+    return jsonify({"status": "ready" if ready else "not_ready", "checks": checks}), 200 if ready else 503
+
+def parse_export_time(value):
+    """Epoch seconds or an ISO date/time (UTC unless it has an offset)"""
+    from datetime import datetime, timezone
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def analytics_export_endpoint():
+    """Stream analytics events as NDJSON or CSV.
+
+    Query parameters: format (ndjson|csv), start, end, status (comma
+    separated), user_id, cursor, limit. Every event carries the cursor to
+    resume after it.
+    """
+    from flask import Response, jsonify, request, stream_with_context
+    import analytics_export
+    denied = admin_request_denied()
+    if denied:
+        return denied
+    args = request.args
+    fmt = args.get("format", "ndjson")
+    try:
+        start = parse_export_time(args.get("start"))
+        end = parse_export_time(args.get("end"))
+        limit = int(args["limit"]) if args.get("limit") else None
+        statuses = [status for status in args.get("status", "").split(",") if status]
+        chunks = analytics_export.export(config.analytics_file, fmt, start, end, statuses,
+                                         args.get("user_id") or None, args.get("cursor") or None, limit)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return Response(stream_with_context(chunks), mimetype=analytics_export.FORMATS[fmt], headers={
+        "Content-Disposition": f"attachment; filename=analytics.{fmt}",
+        "X-Accel-Buffering": "no",
+    })
+
+async def on_startup(application):
+    """Remember the bot's event loop for the task gauge"""
+    global bot_loop
+    bot_loop = asyncio.get_running_loop()
+    ready_seconds = time.perf_counter() - IMPORT_STARTED
+    metrics.register_gauge("bot_startup_seconds", "Seconds from importing server.py to the bot being ready", lambda: ready_seconds)
+    print(f"⚡ Bot ready {ready_seconds * 1000:.0f} ms after import")
+    # Load the analytics rollups off the event loop so the first event doesn't pay for it
+    bot_loop.run_in_executor(None, get_rollups)
+    if config.member_store_file:
+        await supervisor.spawn("maintenance", sweep_idle_members(), name="sweep-idle-members")
+    recheck_queue.start(bot_loop)
+    await supervisor.spawn("outbox", outbox.run(), name="outbox-drain")
+    await supervisor.spawn("health", loop_monitor.run(), name="loop-monitor")
+    probes["telegram"] = health.Probe("telegram", application.bot.get_me, config.probe_interval)
+    probes["helius"] = health.Probe("helius", lambda: app.verifier.probe(), config.probe_interval)
+    for probe in probes.values():
+        await supervisor.spawn("health", probe.run(), name=f"probe-{probe.name}")
+    for worker in range(config.transfer_recheck_workers):
+        await supervisor.spawn("transfer_rechecks", recheck_queue.worker(), name=f"transfer-recheck-{worker}")
+
+async def on_shutdown(application):
+    """Cancel supervised background tasks before the loop goes away, then persist state"""
+    await supervisor.shutdown()
+    if app._verifier is not None:
+        await app.verifier.aclose()
+    save_rollups()
+    verified_users.close()
+    outbox.close()
+    if traffic_recorder is not None:
+        traffic_recorder.close()
 
 # Add error handling for conflicts
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -613,54 +1311,242 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
     import traceback
     traceback.print_exc()
 
-app.add_error_handler(error_handler)
-print("✅ Error handler added successfully")
-
-print("🤖 Bot running...")
-
-# Start the bot with error handling
-try:
-    print("🤖 Starting bot with conflict protection...")
+# Commands handled in the admin lane
+ADMIN_COMMANDS = {"analytics", "reconcile", "notifications_status", "notifications_on", "notifications_off",
+                  "test_admin_notification"}
+
+def update_lane(update):
+    """Lane for an update: joins, callbacks, admin or default"""
+    if getattr(update, "chat_member", None):
+        return "joins"
+    if getattr(update, "callback_query", None):
+        return "callbacks"
+    message = getattr(update, "effective_message", None)
+    if message is None:
+        return "default"
+    if message.new_chat_members or message.left_chat_member:
+        return "joins"
+    if message.text and message.text.startswith("/"):
+        command = message.text.split(maxsplit=1)[0][1:].split("@", 1)[0].lower()
+        if command in ADMIN_COMMANDS:
+            return "admin"
+    return "default"
+
+def update_user_key(update):
+    """The user whose updates must be handled in order - the one the update is about"""
+    message = getattr(update, "effective_message", None)
+    if message is not None and message.new_chat_members and len(message.new_chat_members) == 1:
+        return message.new_chat_members[0].id
+    if message is not None and message.left_chat_member:
+        return message.left_chat_member.id
+    user = getattr(update, "effective_user", None)
+    return user.id if user else None
+
+def build_application(config, request=None):
+    """Build the telegram Application and register handlers - no network calls.
+
+    ``request`` replaces the HTTP transport for every Bot API call, e.g. with a
+    simulated Telegram backend.
+    """
+    from telegram.ext import ApplicationBuilder, MessageHandler, filters, CommandHandler
+    from telegram_request import InstrumentedRequest
+    from lanes import LaneUpdateProcessor
     
-    # Clear any pending updates first
-    try:
-        app.bot.delete_webhook(drop_pending_updates=True)
-        print("✅ Webhook cleared successfully")
-    except Exception as e:
-        print(f"⚠️ Warning: Could not clear webhook: {e}")
+    update_processor = LaneUpdateProcessor(
+        {"joins": config.lane_limit_joins, "callbacks": config.lane_limit_callbacks,
+         "admin": config.lane_limit_admin, "default": config.lane_limit_default},
+        update_lane, update_user_key, config.update_concurrency,
+        on_arrival=lambda update: traffic_recorder.record_update(update.to_dict()) if traffic_recorder else None)
+    builder = (
+        ApplicationBuilder()
+        .token(config.bot_token)
+        .concurrent_updates(update_processor)
+        .request(request or InstrumentedRequest(connection_pool_size=256))
+        .get_updates_request(request or InstrumentedRequest(read_timeout=30, write_timeout=30, connect_timeout=30, pool_timeout=30))
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+    )
+    if config.telegram_api_base_url:
+        builder = builder.base_url(config.telegram_api_base_url)
+    application = builder.build()
     
-    # Add a small delay to ensure webhook is cleared
-    time.sleep(2)
+    print("🤖 Setting up bot handlers...")
     
-    print("🔄 Starting polling with conflict protection...")
-    app.run_polling(
-        drop_pending_updates=True,
-        allowed_updates=["message", "callback_query"],
-        read_timeout=30,
-        write_timeout=30,
-        connect_timeout=30,
-        pool_timeout=30,
-        bootstrap_retries=5,
-        close_loop=False
-    )
-except Exception as e:
-    print(f"❌ Error starting bot: {e}")
-    print("💡 Please make sure only one bot instance is running.")
-    print("💡 Try stopping all Python processes and restart.")
-    print("💡 If problem persists, try restarting your computer.")
-    print("💡 You can also try using a different bot token temporarily.")
-    print("💡 Check if another bot instance is running in another terminal.")
-
-def run_flask():
-    """Run Flask server in a separate thread"""
-    port = int(os.getenv("PORT", 5000))
-    print(f"🌐 Webhook server starting on port {port}")
-    flask_app.run(host='0.0.0.0', port=port, debug=False)
+    # Add handlers
+    application.add_handler(MessageHandler(filters.StatusUpdate.NEW_CHAT_MEMBERS, welcome))
+    application.add_handler(MessageHandler(filters.StatusUpdate.LEFT_CHAT_MEMBER, member_left))
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("analytics", analytics))
+    application.add_handler(CommandHandler("reconcile", reconcile_command))
+    application.add_handler(CommandHandler("test", test_message))  # Add test command
+    application.add_handler(CommandHandler("notifications_status", admin_notifications))
+    application.add_handler(CommandHandler("notifications_on", notifications_on))
+    application.add_handler(CommandHandler("notifications_off", notifications_off))
+    application.add_handler(CommandHandler("test_admin_notification", test_admin_notification)) # Add test admin notification command
+    
+    # Add message handler for all text messages - the pre-filter in group -1 stops most of them first
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, prefilter_chatter), group=-1)
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, test_message))
+    
+    print("✅ Bot handlers added successfully")
+    
+    application.add_error_handler(error_handler)
+    print("✅ Error handler added successfully")
+    if config.profiling:
+        import profiling
+        profiling.time_handlers(application)
+    return application
+
+def build_flask_app():
+    """Build the Flask app for the webhook endpoints"""
+    from flask import Flask
+    
+    flask_app = Flask(__name__)
+    flask_app.add_url_rule('/verify_callback', view_func=verify_callback, methods=['POST'])
+    flask_app.add_url_rule('/health', view_func=health_check, methods=['GET'])
+    flask_app.add_url_rule('/ready', view_func=ready_check, methods=['GET'])
+    flask_app.add_url_rule('/metrics', view_func=metrics_endpoint, methods=['GET'])
+    flask_app.add_url_rule('/analytics/export', view_func=analytics_export_endpoint, methods=['GET'])
+    flask_app.add_url_rule('/helius/transfers', view_func=helius_transfers_endpoint, methods=['POST'])
+    flask_app.add_url_rule('/debug/profile', view_func=profile_endpoint, methods=['GET'])
+    if config.profiling:
+        import profiling
+        profiling.time_routes(flask_app)
+    return flask_app
+
+class BotServer:
+    """One configured bot: the telegram Application, Flask app and verifier are built on first use"""
+
+    def __init__(self, config, request=None):
+        self.config = config
+        self.request = request  # Bot API transport override, see build_application()
+        self._application = None
+        self._flask_app = None
+        self._verifier = None
+
+    @property
+    def application(self):
+        if self._application is None:
+            self._application = build_application(self.config, self.request)
+        return self._application
+
+    @property
+    def bot(self):
+        return self.application.bot
+
+    @property
+    def flask_app(self):
+        if self._flask_app is None:
+            self._flask_app = build_flask_app()
+        return self._flask_app
+
+    @property
+    def verifier(self):
+        if self._verifier is None:
+            import verifier
+            self._verifier = verifier
+        return self._verifier
+
+    def run_flask(self):
+        """Run Flask server in a separate thread"""
+        print(f"🌐 Webhook server starting on port {self.config.port}")
+        self.flask_app.run(host='0.0.0.0', port=self.config.port, debug=False)
+
+    def run(self):
+        """Serve webhooks and poll Telegram until stopped"""
+        self.config.print_summary()
+        
+        # Start Flask server in a separate thread - before polling blocks this one
+        flask_thread = threading.Thread(target=self.run_flask, daemon=True)
+        flask_thread.start()
+        print("🤖 Starting bot with webhook support...")
+        
+        # Start the bot with error handling
+        try:
+            print("🤖 Starting bot with conflict protection...")
+            
+            # drop_pending_updates clears any webhook and queued updates before polling starts
+            print("🔄 Starting polling with conflict protection...")
+            self.application.run_polling(
+                drop_pending_updates=True,
+                allowed_updates=["message", "callback_query"],
+                bootstrap_retries=5,
+                close_loop=False
+            )
+        except Exception as e:
+            print(f"❌ Error starting bot: {e}")
+            print("💡 Please make sure only one bot instance is running.")
+            print("💡 Try stopping all Python processes and restart.")
+            print("💡 If problem persists, try restarting your computer.")
+            print("💡 You can also try using a different bot token temporarily.")
+            print("💡 Check if another bot instance is running in another terminal.")
+
+def create_app(app_config=None, clock_func=time.time, request=None):
+    """Create the bot server for ``app_config`` (environment settings by default).
+
+    Nothing is built and no network call is made here: the telegram
+    Application, Flask app and verifier are constructed on first access.
+    ``clock_func`` and ``request`` let a simulation run the server on virtual
+    time against a fake Telegram backend (see ``simulation.py``).
+    """
+    global config, app, clock, callback_dedupe, supervisor, user_pending_verification, verified_users, analytics_rollups, reconcile_task, \
+        ownership_state, recheck_queue, outbox, callback_admission, loop_monitor, probes, traffic_recorder, collection_mints
+    config = app_config or Config()
+    clock = clock_func
+    verification_token.configure(config.bot_token)
+    analytics_rollups = None
+    reconcile_task = None
+    # Pending entries outlive the removal timer, then expire on their own
+    user_pending_verification = PendingVerifications(config.pending_verification_max,
+                                                     ttl_seconds=config.verification_timeout + PENDING_TTL_SLACK, clock=clock)
+    verified_users = MemberStore(config.member_store_file or None, config.member_idle_seconds, clock=clock)
+    callback_dedupe = IdempotencyCache(config.callback_dedupe_max, config.callback_dedupe_ttl, config.callback_dedupe_file or None,
+                                       clock=clock)
+    supervisor = TaskSupervisor()
+    supervisor.add_group("removal_timers", config.task_limit_removal_timers)
+    supervisor.add_group("admin_notify", config.task_limit_admin_notify)
+    supervisor.add_group("maintenance", 4)
+    supervisor.add_group("reconcile", 1)
+    supervisor.add_group("transfer_rechecks", max(config.transfer_recheck_workers, 1))
+    supervisor.add_group("outbox", 1)
+    supervisor.add_group("health", 3)
+    loop_monitor = health.LoopMonitor(slow_threshold=config.slow_callback_threshold)
+    probes = {}
+    traffic_recorder = traffic.TrafficRecorder(config.traffic_record_file, config.group_id, config.traffic_record_salt or None) \
+        if config.traffic_record_file else None
+    callback_admission = AdmissionControl("verify_callback", config.callback_max_in_flight, config.callback_max_queued,
+                                          config.callback_queue_timeout, config.callback_rate_limit, config.callback_rate_burst,
+                                          config.callback_user_rate_limit, config.callback_user_rate_burst)
+    outbox = Outbox(config.outbox_file or None, execute_outbox_action, permanent_telegram_error,
+                    config.outbox_batch_size, config.outbox_max_attempts, clock=clock)
+    ownership_state = transfers.OwnershipState()
+    collection_mints = transfers.load_mints(config.collection_mints_file) if config.collection_mints_file else None
+    recheck_queue = transfers.RecheckQueue(lambda wallet: app.verifier.check_ownership_async(wallet), revoke_wallet)
+    app = BotServer(config, request)
+    
+    metrics.register_gauge("bot_pending_verifications", "Users waiting to verify", lambda: len(user_pending_verification))
+    metrics.register_gauge("bot_verified_users", "Users tracked as verified", lambda: len(verified_users))
+    metrics.register_gauge("bot_verified_users_by_tier", "Verified users held in memory and on disk",
+                           lambda: {"memory": verified_users.hot_count, "disk": verified_users.cold_count}, labelname="tier")
+    metrics.register_gauge("bot_callback_dedupe_entries", "Results held in the callback dedupe cache", lambda: len(callback_dedupe))
+    metrics.register_gauge("bot_running_tasks", "Tasks alive on the bot event loop",
+                           lambda: len(asyncio.all_tasks(bot_loop)) if bot_loop else 0)
+    metrics.register_gauge("bot_supervised_tasks", "Live supervised tasks by group", supervisor.live_counts, labelname="group")
+    metrics.register_gauge("bot_supervised_tasks_waiting", "Spawns waiting for a free slot by group", supervisor.waiting_counts, labelname="group")
+    metrics.register_gauge("bot_lane_running", "Updates being handled by lane",
+                           lambda: app.application.update_processor.running_counts() if app._application else {}, labelname="lane")
+    metrics.register_gauge("bot_lane_waiting", "Updates waiting for a free slot in their lane",
+                           lambda: app.application.update_processor.waiting_counts() if app._application else {}, labelname="lane")
+    metrics.register_gauge("bot_outbox_actions", "Outbox actions by status", outbox.counts, labelname="status")
+    metrics.register_gauge("bot_queue_depth", "Items waiting in internal queues", queue_depths, labelname="queue")
+    metrics.register_gauge("bot_event_loop_lag_seconds", "Event loop lag, latest and the worst of the last minute",
+                           lambda: {"current": loop_monitor.current_lag() or 0.0, "max": loop_monitor.max_lag()}, labelname="stat")
+    metrics.register_gauge("bot_callbacks_in_flight", "/verify_callback requests holding a work slot",
+                           lambda: callback_admission.in_flight)
+    return app
+
+def main():
+    create_app(Config()).run()
 
 if __name__ == '__main__':
-    # Start Flask server in a separate thread
-    flask_thread = threading.Thread(target=run_flask, daemon=True)
-    flask_thread.start()
-    
-    # Start the bot
-    print("🤖 Starting bot with webhook support...") 
+    main()
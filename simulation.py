@@ -0,0 +1,269 @@
+"""
+Deterministic simulation of the verification lifecycle on virtual time.
+
+``VirtualTimeLoop`` is an asyncio event loop whose clock only moves when no
+task can run: instead of waiting for the next timer it jumps straight to it.
+The 5-minute ``auto_remove_unverified`` timers of thousands of joins fire
+within milliseconds of real time, in the same order on every run. Executor
+work (``asyncio.to_thread``) runs inline, so thread scheduling cannot reorder
+events either.
+
+``SimulatedTelegram`` is a Bot API transport for the real ``telegram.Bot``.
+Every call is answered in-process after a virtual latency, optionally with
+429s, and recorded. ``Simulation`` runs the bot server (``server.create_app``)
+on both, so joins, verification callbacks, removal timers and the outbox all
+take their production code paths.
+
+``benchmarks/lifecycle_sim.py`` runs whole scenarios with it. Both also run
+on real time, on an ordinary event loop with the ``time`` module as the clock;
+``benchmarks/traffic_replay.py`` replays recorded traffic that way.
+"""
+
+import asyncio
+import concurrent.futures
+import json
+import os
+import random
+import selectors
+from collections import Counter
+
+from telegram import Update
+from telegram.request import BaseRequest
+
+GROUP_ID = -1001234567890
+BOT_USER = {"id": 100000001, "is_bot": True, "first_name": "Simulation", "username": "simulation_bot"}
+STALL_SECONDS = 10  # real seconds with nothing runnable and no timer before the simulation gives up
+
+
+class VirtualClock:
+    """Seconds since the start of the simulation, and a wall clock that starts at ``start``"""
+
+    def __init__(self, start=1_700_000_000.0):
+        self.start = start
+        self.elapsed = 0.0
+
+    def advance(self, seconds):
+        self.elapsed += seconds
+
+    def monotonic(self):
+        return self.elapsed
+
+    def time(self):
+        return self.start + self.elapsed
+
+
+class _VirtualSelector:
+    """Polls the real selector without blocking; a wait for a timer advances the clock instead"""
+
+    def __init__(self, selector, clock):
+        self._selector = selector
+        self._clock = clock
+
+    def select(self, timeout=None):
+        events = self._selector.select(0)
+        if events or timeout == 0:
+            return events
+        if timeout is None:
+            # Only a thread (e.g. executor shutdown) can wake the loop now
+            events = self._selector.select(STALL_SECONDS)
+            if not events:
+                raise RuntimeError("Simulation stalled: no task can run and no timer is scheduled")
+            return events
+        self._clock.advance(timeout)
+        return events
+
+    def __getattr__(self, name):
+        return getattr(self._selector, name)
+
+
+class InlineExecutor(concurrent.futures.ThreadPoolExecutor):
+    """Runs submitted work immediately in the calling thread"""
+
+    def submit(self, fn, /, *args, **kwargs):
+        future = concurrent.futures.Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    """Event loop on ``clock``: idle waits advance virtual time instead of sleeping"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        super().__init__(_VirtualSelector(selectors.DefaultSelector(), clock))
+        self.set_default_executor(InlineExecutor())
+
+    def time(self):
+        return self.clock.monotonic()
+
+
+def run(coro, clock):
+    """``asyncio.run`` on a ``VirtualTimeLoop``"""
+    loop = VirtualTimeLoop(clock)
+    try:
+        asyncio.set_event_loop(loop)
+        return loop.run_until_complete(coro)
+    finally:
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+class SimulatedTelegram(BaseRequest):
+    """In-process Bot API backend for a ``telegram.Bot``, answering on the loop's clock"""
+
+    def __init__(self, clock, latency=0.03, jitter=0.0, rate_limit=0, retry_after=1, error_rate=0.0, seed=0):
+        self.clock = clock
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit  # calls per (virtual) second, 0 = unlimited
+        self.retry_after = retry_after
+        self.error_rate = error_rate  # probability of a random 429
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.succeeded = Counter()
+        self.throttled = 0
+        self.log = []  # (elapsed seconds, method, params) of every successful call
+        self.listeners = []  # listener(method, params) after every successful call
+        self._window = (None, 0)  # (second, calls in it)
+        self._next_message_id = 1
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _throttled(self, now):
+        second, calls = self._window
+        calls = calls + 1 if second == int(now) else 1
+        self._window = (int(now), calls)
+        return (self.rate_limit and calls > self.rate_limit) or (self.error_rate and self.random.random() < self.error_rate)
+
+    def _result(self, method, params):
+        if method == "getMe":
+            return BOT_USER
+        if method == "sendMessage":
+            message_id = self._next_message_id
+            self._next_message_id += 1
+            return {"message_id": message_id, "date": int(self.clock.time()), "from": BOT_USER,
+                    "chat": {"id": int(params["chat_id"]), "type": "supergroup"}, "text": params.get("text", "")}
+        if method == "getUpdates":
+            return []
+        # banChatMember, unbanChatMember, deleteWebhook, ...
+        return True
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        api_method = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        self.calls[api_method] += 1
+        await asyncio.sleep(self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0))
+        if self._throttled(self.clock.monotonic()):
+            self.throttled += 1
+            return 429, json.dumps({"ok": False, "error_code": 429,
+                                    "description": f"Too Many Requests: retry after {self.retry_after}",
+                                    "parameters": {"retry_after": self.retry_after}}).encode()
+        self.succeeded[api_method] += 1
+        self.log.append((self.clock.monotonic(), api_method, params))
+        for listener in self.listeners:
+            listener(api_method, params)
+        return 200, json.dumps({"ok": True, "result": self._result(api_method, params)}).encode()
+
+
+class Simulation:
+    """The bot server on a virtual clock against ``SimulatedTelegram`` - start it inside ``run()``.
+
+    Files the server keeps (analytics log) go to ``workdir``; the outbox,
+    member store and callback dedupe cache are in memory. ``settings``
+    override any ``server.Config`` setting.
+    """
+
+    def __init__(self, telegram, workdir, **settings):
+        import server
+        self.server = server
+        self.telegram = telegram
+        self.clock = telegram.clock
+        defaults = {
+            "bot_token": "123456:SIMULATION", "group_id": str(GROUP_ID), "admin_chat_id": "-100999",
+            "analytics_file": os.path.join(workdir, "analytics.json"), "analytics_snapshot_file": "",
+            "member_store_file": "", "callback_dedupe_file": "", "outbox_file": "",
+            "reconcile_state_file": os.path.join(workdir, "reconcile_state.json"),
+        }
+        self.app = server.create_app(server.Config(**{**defaults, **settings}), self.clock.time, telegram)
+        self._tasks = set()
+        self._next_update_id = 1
+        self._next_message_id = 1
+
+    async def start(self):
+        """Initialize the bot and start the outbox drainer - the parts of ``on_startup`` the lifecycle uses"""
+        self.server.bot_loop = asyncio.get_running_loop()
+        await self.app.application.initialize()
+        await self.server.supervisor.spawn("outbox", self.server.outbox.run(), name="outbox-drain")
+
+    async def stop(self):
+        await self.server.on_shutdown(self.app.application)
+        await self.app.application.shutdown()
+        self.server.bot_loop = None
+
+    def build_update(self, data):
+        """An ``Update`` from a Bot API dict, numbered like polling would"""
+        data["update_id"] = self._next_update_id
+        self._next_update_id += 1
+        return Update.de_json(data, self.app.application.bot)
+
+    def push_update(self, update):
+        """Hand an update to the bot as polling would - through the lane update processor; returns its task.
+
+        ``update`` is a Bot API dict or an ``Update`` built ahead with
+        ``build_update``/``join_update``, which keeps PTB's parsing out of
+        a timed run.
+        """
+        application = self.app.application
+        if not isinstance(update, Update):
+            update = self.build_update(update)
+        task = asyncio.ensure_future(application.update_processor.process_update(update, application.process_update(update)))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def join_update(self, user_id, username=None, chat_id=GROUP_ID, date=None):
+        """The ``Update`` for ``user_id`` joining, dated ``date`` (default now)"""
+        user = {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": username or f"user{user_id}"}
+        message_id = self._next_message_id
+        self._next_message_id += 1
+        return self.build_update({"message": {
+            "message_id": message_id, "date": int(self.clock.time() if date is None else date), "from": user,
+            "new_chat_members": [user], "chat": {"id": chat_id, "type": "supergroup", "title": "Simulation Group"},
+        }})
+
+    def push_join(self, user_id, username=None, chat_id=GROUP_ID):
+        return self.push_update(self.join_update(user_id, username, chat_id))
+
+    def callback(self, payload):
+        """Deliver a ``/verify_callback`` payload, past admission control; returns (body, status).
+
+        Admission control rate-limits HTTP requests on the real clock, so it
+        stays out of the simulation.
+        """
+        with self.app.flask_app.app_context():
+            response, status = self.server._admitted_verify_callback(payload)[:2]
+            return response.get_json(), status
+
+    def busy(self):
+        """Whether updates, removal timers, notifications or outbox actions are still outstanding"""
+        live = self.server.supervisor.live_counts()
+        return bool(self._tasks or live.get("removal_timers") or live.get("admin_notify")
+                    or self.server.outbox.counts()["pending"])
+
+    async def settle(self, poll=1.0):
+        """Wait, in virtual time, until the bot has nothing left to do"""
+        while self.busy():
+            await asyncio.sleep(poll)
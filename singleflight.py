@@ -0,0 +1,106 @@
+"""
+Single-flight call coalescing.
+
+Concurrent calls for the same key share one execution: the first caller
+runs the function, callers arriving while it is in flight wait for it and
+get the same result (or exception). Nothing is cached - once the call
+returns, the next caller for that key runs it again. For results that
+should be remembered, see ``dedupe.IdempotencyCache``.
+
+``AsyncSingleFlight`` is the same for coroutines on an event loop. The
+shared call runs as its own task, so one caller being cancelled does not
+cancel it for the others; it is cancelled once every caller has gone.
+"""
+
+import asyncio
+import threading
+
+import metrics
+
+coalesced_calls = metrics.counter("bot_singleflight_coalesced_total", "Calls that shared an in-flight call for the same key", ("group",))
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """``do(key, func, *args)`` runs ``func`` once per key at a time (thread-safe)"""
+
+    def __init__(self, name):
+        self.name = name  # metrics label
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> _Call
+
+    def __len__(self):
+        return len(self._calls)
+
+    def do(self, key, func, *args):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            coalesced_calls.inc(self.name)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func(*args)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class _AsyncCall:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class AsyncSingleFlight:
+    """``await do(key, func, *args)`` runs the coroutine ``func(*args)`` once per key at a time"""
+
+    def __init__(self, name):
+        self.name = name  # metrics label
+        self._calls = {}  # key -> _AsyncCall
+
+    def __len__(self):
+        return len(self._calls)
+
+    def _forget(self, key, call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    async def do(self, key, func, *args):
+        loop = asyncio.get_running_loop()
+        call = self._calls.get(key)
+        # A call left behind by a loop that has gone away is not joinable
+        if call is None or call.task.get_loop() is not loop:
+            call = self._calls[key] = _AsyncCall(loop.create_task(func(*args)))
+            call.task.add_done_callback(lambda _, call=call: self._forget(key, call))
+        else:
+            coalesced_calls.inc(self.name)
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if not call.waiters and not call.task.done():
+                # Every caller was cancelled - nobody wants the result, and the next caller starts afresh
+                self._forget(key, call)
+                call.task.cancel()
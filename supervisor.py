@@ -0,0 +1,97 @@
+"""
+Bounded supervisor for background asyncio tasks.
+
+Tasks are started in named groups, each with its own concurrency limit.
+``spawn()`` waits for a free slot when a group is full, so a burst pushes back
+on whoever is creating work instead of growing the task set without bound.
+The supervisor keeps a strong reference to every task, logs and counts
+exceptions, and cancels everything cleanly on shutdown.
+"""
+
+import asyncio
+import functools
+import time
+import traceback
+
+import metrics
+
+task_failures = metrics.counter("bot_task_failures_total", "Supervised tasks that ended with an exception", ("group",))
+task_rejections = metrics.counter("bot_task_rejections_total", "Supervised tasks refused during shutdown", ("group",))
+
+
+class TaskGroup:
+    __slots__ = ("name", "limit", "semaphore", "tasks", "waiting", "started")
+
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        self.semaphore = asyncio.Semaphore(limit)
+        self.tasks = set()
+        self.waiting = 0
+        self.started = 0
+
+
+class TaskSupervisor:
+    def __init__(self):
+        self._groups = {}
+        self._closing = False
+
+    def add_group(self, name, limit):
+        self._groups[name] = TaskGroup(name, limit)
+
+    async def spawn(self, group_name, coro, name=None):
+        """Start ``coro`` as a task in ``group_name``, waiting while the group is full"""
+        group = self._groups[group_name]
+        if self._closing:
+            coro.close()
+            task_rejections.inc(group_name)
+            raise RuntimeError(f"Task supervisor is shutting down - not starting {group_name} task")
+
+        group.waiting += 1
+        wait_start = time.perf_counter()
+        try:
+            await group.semaphore.acquire()
+        except BaseException:
+            coro.close()
+            raise
+        finally:
+            group.waiting -= 1
+        waited = time.perf_counter() - wait_start
+        if waited > 0.001:
+            metrics.observe(f"task_slot_wait_{group_name}", "ok", waited)
+
+        task = asyncio.create_task(coro, name=name)
+        group.tasks.add(task)
+        group.started += 1
+        task.add_done_callback(functools.partial(self._on_done, group))
+        return task
+
+    def _on_done(self, group, task):
+        group.tasks.discard(task)
+        group.semaphore.release()
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            task_failures.inc(group.name)
+            print(f"❌ Background task {task.get_name()} in {group.name} failed: {error}")
+            traceback.print_exception(type(error), error, error.__traceback__)
+
+    def live_counts(self):
+        return {name: len(group.tasks) for name, group in self._groups.items()}
+
+    def waiting_counts(self):
+        return {name: group.waiting for name, group in self._groups.items()}
+
+    async def shutdown(self, timeout=10):
+        """Refuse new tasks, cancel every live task and wait for them to finish"""
+        self._closing = True
+        tasks = [task for group in self._groups.values() for task in group.tasks]
+        if not tasks:
+            return
+        print(f"🛑 Cancelling {len(tasks)} background tasks...")
+        for task in tasks:
+            task.cancel()
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        if pending:
+            print(f"⚠️ {len(pending)} background tasks did not stop within {timeout}s")
@@ -0,0 +1,34 @@
+"""
+Bot API transport with latency metrics and tracing.
+
+Kept out of ``server.py`` so that importing the server does not import
+python-telegram-bot; the application builder pulls this in when it runs.
+"""
+
+import time
+
+from telegram.request import HTTPXRequest
+
+import metrics
+import tracing
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest that records every Bot API call in the latency histogram"""
+
+    async def do_request(self, url, method, request_data=None, *args, **kwargs):
+        operation = "telegram_" + url.rsplit("/", 1)[-1]
+        if tracing.current_verification_id():
+            with tracing.span(operation):
+                return await self._timed_request(operation, url, method, request_data, *args, **kwargs)
+        return await self._timed_request(operation, url, method, request_data, *args, **kwargs)
+
+    async def _timed_request(self, operation, url, method, request_data, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            code, payload = await super().do_request(url, method, request_data, *args, **kwargs)
+        except Exception as e:
+            metrics.observe(operation, type(e).__name__, time.perf_counter() - start)
+            raise
+        metrics.observe(operation, "ok" if code == 200 else str(code), time.perf_counter() - start)
+        return code, payload
@@ -0,0 +1,276 @@
+"""
+Span-based tracing for the verification flow.
+
+Every verification gets a verification ID when ``welcome`` sends the link. The
+ID is the trace ID: it travels in the link (``vid`` query parameter) to the
+API server and comes back in the ``/verify_callback`` payload as
+``verification_id``, so the welcome, callback, ban and admin-notify spans of
+one user all land in the same trace.
+
+Spans are exported in OTLP/JSON shape by a background thread:
+
+- ``TRACE_FILE``: append one span per line to a local file
+- ``OTLP_ENDPOINT``: POST batches to an OTLP/HTTP collector
+  (e.g. ``http://localhost:4318/v1/traces``)
+
+With neither set, spans are still timed but dropped. Run
+``python tracing.py collect`` for a local collector stand-in and
+``python tracing.py summary traces.jsonl`` to see where the wall-clock time of
+each verification went.
+"""
+
+import asyncio
+import atexit
+import contextvars
+import functools
+import json
+import os
+import queue
+import secrets
+import sys
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TRACE_FILE = os.getenv("TRACE_FILE")
+OTLP_ENDPOINT = os.getenv("OTLP_ENDPOINT")
+SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "bot-server")
+EXPORT_BATCH_SIZE = 512
+
+_current = contextvars.ContextVar("tracing_current_span", default=None)
+_queue = queue.SimpleQueue()
+_exporter_lock = threading.Lock()
+_exporter_thread = None
+
+
+def new_verification_id():
+    """New verification ID - a random 128-bit OTLP trace ID in hex"""
+    return secrets.token_hex(16)
+
+
+def current_verification_id():
+    """Verification ID of the active span, if any"""
+    active = _current.get()
+    return active.trace_id if active else None
+
+
+class Span:
+    """One timed step of a verification"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error", "_token")
+
+    def __init__(self, name, trace_id, parent_id=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_ns = 0
+        self.end_ns = 0
+        self.attributes = attributes or {}
+        self.error = None
+        self._token = None
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self.start_ns = time.time_ns()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        if exc_type is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        _current.reset(self._token)
+        if TRACE_FILE or OTLP_ENDPOINT:
+            _enqueue(self)
+        return False
+
+    def to_otlp(self):
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def span(name, verification_id=None, **attributes):
+    """Start a span, as a child of the active span when it is in the same trace.
+
+    Without ``verification_id`` the active span's trace is continued, or a new
+    trace is started when there is none.
+    """
+    parent = _current.get()
+    trace_id = verification_id or (parent.trace_id if parent else new_verification_id())
+    parent_id = parent.span_id if parent and parent.trace_id == trace_id else None
+    return Span(name, trace_id, parent_id, attributes)
+
+
+def traced(name):
+    """Decorator that runs a sync or async function inside ``span(name)``"""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _otlp_attribute(key, value):
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def _enqueue(finished):
+    global _exporter_thread
+    _queue.put(finished)
+    if _exporter_thread is None:
+        with _exporter_lock:
+            if _exporter_thread is None:
+                _exporter_thread = threading.Thread(target=_export_loop, name="trace-exporter", daemon=True)
+                _exporter_thread.start()
+
+
+def _drain(block):
+    batch = []
+    try:
+        batch.append(_queue.get(timeout=1.0) if block else _queue.get_nowait())
+        while len(batch) < EXPORT_BATCH_SIZE:
+            batch.append(_queue.get_nowait())
+    except queue.Empty:
+        pass
+    return batch
+
+
+def _export(batch):
+    spans = [s.to_otlp() for s in batch]
+    try:
+        if TRACE_FILE:
+            with open(TRACE_FILE, "a") as f:
+                f.write("".join(json.dumps(s) + "\n" for s in spans))
+        if OTLP_ENDPOINT:
+            import requests
+            payload = {
+                "resourceSpans": [{
+                    "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME)]},
+                    "scopeSpans": [{"scope": {"name": "bot_server.tracing"}, "spans": spans}],
+                }]
+            }
+            requests.post(OTLP_ENDPOINT, json=payload, timeout=5)
+    except Exception as e:
+        print(f"⚠️ Error exporting {len(spans)} spans: {e}")
+
+
+def _export_loop():
+    while True:
+        batch = _drain(block=True)
+        if batch:
+            _export(batch)
+
+
+@atexit.register
+def flush():
+    """Export everything still queued"""
+    while True:
+        batch = _drain(block=False)
+        if not batch:
+            return
+        _export(batch)
+
+
+def _read_spans(path):
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if "resourceSpans" in record:
+                for resource in record["resourceSpans"]:
+                    for scope in resource.get("scopeSpans", []):
+                        yield from scope.get("spans", [])
+            else:
+                yield record
+
+
+def summarize(path):
+    """Print per-step wall-clock time for each verification in a span file"""
+    traces = {}
+    for s in _read_spans(path):
+        traces.setdefault(s["traceId"], []).append(s)
+
+    step_totals = {}
+    for trace_id, spans in traces.items():
+        spans.sort(key=lambda s: int(s["startTimeUnixNano"]))
+        start = int(spans[0]["startTimeUnixNano"])
+        end = max(int(s["endTimeUnixNano"]) for s in spans)
+        print(f"🔎 Verification {trace_id}: {(end - start) / 1e6:.1f} ms wall-clock, {len(spans)} spans")
+        for s in spans:
+            offset = (int(s["startTimeUnixNano"]) - start) / 1e6
+            duration = (int(s["endTimeUnixNano"]) - int(s["startTimeUnixNano"])) / 1e6
+            failed = " ❌" if s.get("status", {}).get("code") == 2 else ""
+            print(f"  +{offset:10.1f} ms  {duration:9.1f} ms  {s['name']}{failed}")
+            totals = step_totals.setdefault(s["name"], [0, 0.0])
+            totals[0] += 1
+            totals[1] += duration
+
+    print(f"\n📊 {len(traces)} verifications - time by step:")
+    for name, (count, total) in sorted(step_totals.items(), key=lambda item: -item[1][1]):
+        print(f"  {name:40s} {count:6d} spans  {total / count:9.1f} ms avg  {total:12.1f} ms total")
+
+
+def run_collector(port, path):
+    """Minimal OTLP/HTTP JSON collector stand-in that appends spans to ``path``"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class CollectorHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            with open(path, "a") as f:
+                f.write(body.decode() + "\n")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, format, *args):
+            pass
+
+    print(f"📡 OTLP collector stand-in on http://localhost:{port}/v1/traces -> {path}")
+    ThreadingHTTPServer(("0.0.0.0", port), CollectorHandler).serve_forever()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == "summary":
+        summarize(sys.argv[2])
+    elif len(sys.argv) >= 2 and sys.argv[1] == "collect":
+        port = int(sys.argv[2]) if len(sys.argv) >= 3 else 4318
+        path = sys.argv[3] if len(sys.argv) >= 4 else "traces.jsonl"
+        run_collector(port, path)
+    else:
+        print("Usage: python tracing.py summary <traces.jsonl> | collect [port] [output file]")
@@ -0,0 +1,208 @@
+"""
+Opt-in recording of incoming Telegram updates and ``/verify_callback`` payloads.
+
+With ``TRAFFIC_RECORD_FILE`` set, the server records every update as it
+reaches the update processor and every callback payload as it arrives. Both
+are redacted first:
+
+- user IDs (and private chat IDs, which equal them) become pseudonyms, an
+  HMAC with a per-recording salt (``TRAFFIC_RECORD_SALT`` keeps them stable
+  across restarts), so one user's updates still belong together;
+- names, usernames and wallet addresses are replaced by short hashes;
+- message text keeps its length, whitespace and leading bot command, and
+  every other character becomes ``x``;
+- contacts, locations, media file IDs and verification tokens are dropped.
+
+The log is JSON Lines, gzip-compressed if the file name ends in ``.gz``.
+Each run of the server starts with a header line. Every later line is
+``{"t": seconds since that header, "k": "u" (update) | "c" (callback), "d": ...}``.
+``benchmarks/traffic_replay.py`` plays a log back through the handlers.
+
+    python traffic.py inspect traffic.jsonl.gz
+"""
+
+import gzip
+import hashlib
+import hmac
+import json
+import secrets
+import threading
+import time
+from collections import Counter
+
+import metrics
+
+recorded_traffic = metrics.counter("bot_traffic_recorded_total", "Updates and callbacks written to the traffic recording", ("kind",))
+
+FORMAT_VERSION = 1
+PSEUDONYM_BASE = 10**12
+UPDATE, CALLBACK, HEADER = "u", "c", "h"
+
+NAME_KEYS = {"first_name", "last_name", "username", "title", "author_signature", "sender_business_bot"}
+TEXT_KEYS = {"text", "caption"}
+DROP_KEYS = {"contact", "location", "venue", "phone_number", "email", "bio", "photo", "document", "video",
+             "voice", "audio", "sticker", "animation", "video_note", "story", "invite_link", "token"}
+FLUSH_SECONDS = 1.0
+
+
+def mask_text(text):
+    """Same length and whitespace, bot command kept, everything else ``x``"""
+    command = ""
+    if text.startswith("/"):
+        command = text.split(maxsplit=1)[0]
+        text = text[len(command):]
+    return command + "".join(char if char.isspace() else "x" for char in text)
+
+
+class Redactor:
+    def __init__(self, salt=None):
+        self._key = (salt or secrets.token_hex(16)).encode()
+
+    def _digest(self, value):
+        return hmac.new(self._key, str(value).encode(), hashlib.sha256).digest()
+
+    def user_id(self, user_id):
+        """A stable pseudonym for a positive (user or private chat) ID; group IDs are kept"""
+        if not isinstance(user_id, int) or user_id <= 0:
+            return user_id
+        return PSEUDONYM_BASE + int.from_bytes(self._digest(user_id)[:5], "big")
+
+    def name(self, value, prefix="u"):
+        return f"{prefix}{self._digest(value).hex()[:10]}"
+
+    def update(self, data):
+        """A redacted copy of an ``Update.to_dict()``"""
+        if isinstance(data, list):
+            return [self.update(item) for item in data]
+        if not isinstance(data, dict):
+            return data
+        redacted = {}
+        for key, value in data.items():
+            if key in DROP_KEYS:
+                continue
+            if key in ("id", "user_id", "chat_id") and isinstance(value, int):
+                redacted[key] = self.user_id(value)
+            elif key in NAME_KEYS and isinstance(value, str):
+                redacted[key] = self.name(value)
+            elif key in TEXT_KEYS and isinstance(value, str):
+                redacted[key] = mask_text(value)
+            else:
+                redacted[key] = self.update(value)
+        return redacted
+
+    def callback(self, payload):
+        """A redacted copy of a ``/verify_callback`` payload"""
+        redacted = {key: value for key, value in payload.items() if key not in DROP_KEYS}
+        try:
+            redacted["tg_id"] = self.user_id(int(payload["tg_id"]))
+        except (KeyError, TypeError, ValueError):
+            pass
+        if isinstance(payload.get("username"), str):
+            redacted["username"] = self.name(payload["username"])
+        if isinstance(payload.get("wallet_address"), str) and payload["wallet_address"] != "N/A":
+            redacted["wallet_address"] = self.name(payload["wallet_address"], "w")
+        return redacted
+
+
+def _open(path, mode):
+    return gzip.open(path, mode + "t", encoding="utf-8") if path.endswith(".gz") else open(path, mode, encoding="utf-8")
+
+
+class TrafficRecorder:
+    """Appends redacted updates and callbacks to ``path`` - thread-safe, buffered, flushed every second"""
+
+    def __init__(self, path, group_id=None, salt=None, clock=time.monotonic):
+        self.redactor = Redactor(salt)
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._file = _open(path, "a")
+        self._started = clock()
+        self._flushed = self._started
+        self._write({"k": HEADER, "v": FORMAT_VERSION, "started": time.time(), "group_id": group_id})
+
+    def _write(self, record):
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line)
+            now = self.clock()
+            if now - self._flushed > FLUSH_SECONDS:
+                self._file.flush()
+                self._flushed = now
+
+    def _record(self, kind, data):
+        self._write({"t": round(self.clock() - self._started, 4), "k": kind, "d": data})
+        recorded_traffic.inc("update" if kind == UPDATE else "callback")
+
+    def record_update(self, update_dict):
+        self._record(UPDATE, self.redactor.update(update_dict))
+
+    def record_callback(self, payload):
+        self._record(CALLBACK, self.redactor.callback(payload))
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_traffic(path):
+    """Yield ``(offset, kind, data, group_id)``, offsets continuing across the runs in one log"""
+    base = last = 0.0
+    group_id = None
+    with _open(path, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a line cut short by a crash
+            if record.get("k") == HEADER:
+                base, group_id = last, record.get("group_id")
+                continue
+            last = base + record["t"]
+            yield last, record["k"], record["d"], group_id
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect a recorded traffic log")
+    parser.add_argument("command", choices=("inspect",))
+    parser.add_argument("path")
+    args = parser.parse_args()
+
+    kinds = Counter()
+    users = set()
+    duration = 0.0
+    for offset, kind, data, _ in read_traffic(args.path):
+        duration = offset
+        if kind == CALLBACK:
+            kinds["callback"] += 1
+            users.add(data.get("tg_id"))
+            continue
+        message = data.get("message") or data.get("edited_message") or {}
+        if message.get("new_chat_members"):
+            kinds["join"] += 1
+        elif message.get("left_chat_member"):
+            kinds["leave"] += 1
+        elif str(message.get("text", "")).startswith("/"):
+            kinds["command " + message["text"].split(maxsplit=1)[0].split("@", 1)[0]] += 1
+        elif "text" in message:
+            kinds["text"] += 1
+        else:
+            kinds["other"] += 1
+        users.add((message.get("from") or {}).get("id"))
+    users.discard(None)
+    total = sum(kinds.values())
+    print(f"📼 {total:,} events from {len(users):,} users over {duration:,.1f}s "
+          f"({total / duration if duration else 0:,.1f}/s)")
+    for kind, count in kinds.most_common():
+        print(f"  {kind:24s} {count:8,}")
+
+
+if __name__ == "__main__":
+    main()
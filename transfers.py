@@ -0,0 +1,239 @@
+"""
+Push-based NFT transfer ingestion.
+
+Helius enhanced-transaction webhooks for the collection's mints POST batches
+(JSON arrays) of transactions to ``/helius/transfers``. ``parse_transfers``
+pulls the NFT movements out of a batch, ``OwnershipState`` applies them to
+what we know about who holds which mint, and wallets that lost a mint and
+are not known to hold another one go on the ``RecheckQueue``. The queue does
+one ownership lookup per wallet and revokes the members verified with it if
+the wallet no longer holds the collection - no periodic full scan needed.
+
+A transaction can move other NFTs along with a collection mint. With
+``COLLECTION_MINTS_FILE`` (the collection's mints, one per line - the list
+the webhook watches) only the collection's mints count, so a member selling
+some other NFT costs no lookup.
+
+Payloads can be recorded to a directory (``HELIUS_WEBHOOK_RECORD_DIR``) and
+replayed against a running server:
+
+    python transfers.py replay recorded/ --url http://127.0.0.1:5000/helius/transfers
+    python transfers.py inspect recorded/ [--mints mints.txt]    # parse only, print the transfers
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+transfer_events = metrics.counter("bot_transfer_events_total", "NFT transfers received from the Helius webhook", ("outcome",))
+recheck_results = metrics.counter("bot_transfer_rechecks_total", "Ownership re-checks triggered by transfers", ("outcome",))
+
+
+def _wallet(value):
+    return value if isinstance(value, str) and value else None
+
+
+def load_mints(path):
+    """Set of the collection's mint addresses from a file with one address per line"""
+    with open(path) as f:
+        return frozenset(line.strip() for line in f if line.strip() and not line.startswith("#"))
+
+
+def parse_transfers(batch, mints=None):
+    """``(signature, timestamp, mint, from_wallet, to_wallet)`` for each NFT movement in a webhook batch.
+
+    With ``mints``, movements of any other mint are dropped. Malformed entries
+    are skipped, not raised: an error would make Helius redeliver the same
+    batch forever.
+    """
+    if isinstance(batch, dict):
+        batch = [batch]
+    if not isinstance(batch, list):
+        return []
+    transfers = []
+    for transaction in batch:
+        if not isinstance(transaction, dict):
+            continue
+        signature = transaction.get("signature")
+        signature = signature if isinstance(signature, str) else None
+        timestamp = transaction.get("timestamp") or 0
+        token_transfers = transaction.get("tokenTransfers")
+        if not isinstance(token_transfers, list):
+            continue
+        for transfer in token_transfers:
+            if not isinstance(transfer, dict) or transfer.get("tokenStandard") == "Fungible":
+                continue
+            amount = transfer.get("tokenAmount")
+            try:
+                if amount is not None and float(amount) != 1:
+                    continue
+            except (TypeError, ValueError):
+                transfer_events.inc("malformed")
+                continue
+            mint = _wallet(transfer.get("mint"))
+            if not mint:
+                continue
+            if mints is not None and mint not in mints:
+                transfer_events.inc("other_mint")
+                continue
+            transfers.append((signature, timestamp, mint, _wallet(transfer.get("fromUserAccount")),
+                              _wallet(transfer.get("toUserAccount"))))
+    return transfers
+
+
+class OwnershipState:
+    """Collection mints and their owners, as learned from transfer events"""
+
+    def __init__(self, max_signatures=100000):
+        self._lock = threading.Lock()
+        self.owner_of = {}  # mint -> wallet
+        self.holdings = {}  # wallet -> set of mints
+        self._seen = OrderedDict()  # signature -> None, for redelivered transactions
+        self.max_signatures = max_signatures
+
+    def apply(self, transfers):
+        """Apply a parsed batch; returns the wallets that lost a mint and hold no other known one"""
+        losers = set()
+        with self._lock:
+            applied_signatures = set()
+            for signature, _, mint, from_wallet, to_wallet in transfers:
+                if signature and signature in self._seen:
+                    transfer_events.inc("duplicate")
+                    continue
+                applied_signatures.add(signature)
+                previous = self.owner_of.get(mint)
+                seller = from_wallet or previous
+                if seller:
+                    held = self.holdings.get(seller)
+                    if held is not None:
+                        held.discard(mint)
+                        if not held:
+                            del self.holdings[seller]
+                    losers.add(seller)
+                if to_wallet:
+                    self.owner_of[mint] = to_wallet
+                    self.holdings.setdefault(to_wallet, set()).add(mint)
+                    losers.discard(to_wallet)  # received one in the same batch
+                else:
+                    self.owner_of.pop(mint, None)  # burned
+                transfer_events.inc("applied")
+            for signature in applied_signatures:
+                if signature:
+                    self._seen[signature] = None
+            while len(self._seen) > self.max_signatures:
+                self._seen.popitem(last=False)
+            # Still holding another mint we know of - no lookup needed
+            return {wallet for wallet in losers if not self.holdings.get(wallet)}
+
+
+class RecheckQueue:
+    """Deduplicated queue of wallets to re-check, drained by workers on the bot's event loop"""
+
+    def __init__(self, check, on_ineligible, retry_delays=(5, 30, 120)):
+        self.check = check  # async check(wallet) -> True / False / None (lookup failed)
+        self.on_ineligible = on_ineligible  # async on_ineligible(wallet)
+        self.retry_delays = retry_delays
+        self._queue = None
+        self._loop = None
+        self._pending = set()  # queued or being checked
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def start(self, loop):
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        with self._lock:
+            for wallet in self._pending:
+                self._queue.put_nowait((wallet, 0))
+
+    def submit(self, wallets):
+        """Queue wallets for a re-check (thread-safe); returns how many were new"""
+        added = []
+        with self._lock:
+            for wallet in wallets:
+                if wallet not in self._pending:
+                    self._pending.add(wallet)
+                    added.append(wallet)
+        if added and self._loop is not None:
+            for wallet in added:
+                self._loop.call_soon_threadsafe(self._queue.put_nowait, (wallet, 0))
+        return len(added)
+
+    async def worker(self):
+        while True:
+            wallet, attempt = await self._queue.get()
+            try:
+                eligible = await self.check(wallet)
+                if eligible is None and attempt < len(self.retry_delays):
+                    recheck_results.inc("retry")
+                    self._loop.call_later(self.retry_delays[attempt], self._queue.put_nowait, (wallet, attempt + 1))
+                    continue
+                recheck_results.inc({True: "still_eligible", False: "revoked", None: "gave_up"}[eligible])
+                if eligible is False:
+                    await self.on_ineligible(wallet)
+                with self._lock:
+                    self._pending.discard(wallet)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                recheck_results.inc("error")
+                print(f"❌ Re-check of {wallet} failed: {e}")
+                with self._lock:
+                    self._pending.discard(wallet)
+
+
+def record_payload(directory, body):
+    """Keep a raw webhook body for later replay"""
+    os.makedirs(directory, exist_ok=True)
+    name = f"{time.time_ns()}.json"
+    with open(os.path.join(directory, name), "wb") as f:
+        f.write(body)
+
+
+def _payload_files(path):
+    if os.path.isdir(path):
+        return [os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith(".json")]
+    return [path]
+
+
+def main():
+    import argparse
+    import requests
+
+    parser = argparse.ArgumentParser(description="Replay or inspect recorded Helius transfer webhooks")
+    parser.add_argument("command", choices=("replay", "inspect"))
+    parser.add_argument("path", help="A recorded payload, or a directory of them (replayed in name order)")
+    parser.add_argument("--url", default="http://127.0.0.1:5000/helius/transfers")
+    parser.add_argument("--secret", default=os.getenv("HELIUS_WEBHOOK_SECRET"), help="Authorization header value")
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds between payloads")
+    parser.add_argument("--mints", default=os.getenv("COLLECTION_MINTS_FILE"), help="Only show these mints (inspect)")
+    args = parser.parse_args()
+    mints = load_mints(args.mints) if args.mints else None
+
+    for path in _payload_files(args.path):
+        with open(path, "rb") as f:
+            body = f.read()
+        if args.command == "inspect":
+            transfers = parse_transfers(json.loads(body), mints)
+            print(f"📦 {os.path.basename(path)}: {len(transfers)} NFT transfers")
+            for signature, _, mint, from_wallet, to_wallet in transfers:
+                print(f"  {mint}: {from_wallet} -> {to_wallet} ({(signature or '')[:16]})")
+            continue
+        response = requests.post(args.url, data=body, timeout=30, headers={
+            "Content-Type": "application/json",
+            **({"Authorization": args.secret} if args.secret else {}),
+        })
+        print(f"📤 {os.path.basename(path)}: {response.status_code} {response.text.strip()}")
+        if args.delay:
+            time.sleep(args.delay)
+
+
+if __name__ == "__main__":
+    main()
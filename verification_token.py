@@ -0,0 +1,106 @@
+"""
+Stateless, HMAC-signed verification tokens.
+
+``welcome`` puts a token in the verification link and the API server hands it
+back in the ``/verify_callback`` payload. The token carries the Telegram user
+ID, the group, the issue time and the verification ID, so any worker sharing
+``VERIFY_TOKEN_SECRET`` can check a callback with one HMAC and no lookup in
+``user_pending_verification``.
+
+Format: ``v1.<user_id>.<group_id>.<issued_at>.<verification_id>.<signature>``
+where the signature is the first 18 bytes of HMAC-SHA256 over everything
+before it, base64url-encoded. ``VERIFY_TOKEN_SECRET`` may hold several
+comma-separated secrets: the first signs, all of them verify (key rotation).
+Without it the secret is derived from the bot token, so links survive
+restarts and validate in every worker of the same bot.
+"""
+
+import binascii
+import hashlib
+import hmac
+import os
+import time
+from collections import namedtuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TOKEN_VERSION = "v1"
+TOKEN_TTL = int(os.getenv("VERIFY_TOKEN_TTL", 600))  # 5 minute window plus slack for the API server
+MAX_CLOCK_SKEW = 60
+SIGNATURE_BYTES = 18
+
+VerificationClaims = namedtuple("VerificationClaims", "user_id group_id issued_at verification_id")
+
+
+class TokenError(ValueError):
+    """Raised when a verification token is malformed, forged or expired"""
+
+
+_URLSAFE = bytes.maketrans(b"+/", b"-_")
+
+_keys = []  # one keyed HMAC per secret, copied for each signature
+SECRET_CONFIGURED = False
+
+
+def configure(bot_token=None):
+    """Load the secrets from ``VERIFY_TOKEN_SECRET``, else derive one from ``bot_token``"""
+    global _keys, SECRET_CONFIGURED
+    configured = [s.strip() for s in os.getenv("VERIFY_TOKEN_SECRET", "").split(",") if s.strip()]
+    if configured:
+        secrets = [s.encode() for s in configured]
+    elif bot_token:
+        secrets = [hmac.digest(bot_token.encode(), b"verification-token", "sha256")]
+    else:
+        secrets = []
+    _keys = [hmac.new(secret, digestmod=hashlib.sha256) for secret in secrets]
+    SECRET_CONFIGURED = bool(configured)
+
+
+configure(os.getenv("TELEGRAM_BOT_TOKEN"))
+
+
+def _sign(key, payload):
+    mac = key.copy()
+    mac.update(payload)
+    return binascii.b2a_base64(mac.digest()[:SIGNATURE_BYTES], newline=False).translate(_URLSAFE)
+
+
+def issue(user_id, group_id, verification_id, issued_at=None):
+    """Signed token for one verification link"""
+    if not _keys:
+        raise RuntimeError("Set VERIFY_TOKEN_SECRET or TELEGRAM_BOT_TOKEN to sign verification tokens")
+    issued_at = int(time.time() if issued_at is None else issued_at)
+    payload = f"{TOKEN_VERSION}.{int(user_id)}.{group_id}.{issued_at}.{verification_id}"
+    return f"{payload}.{_sign(_keys[0], payload.encode()).decode()}"
+
+
+def verify(token, now=None, max_age=TOKEN_TTL):
+    """Return the token's ``VerificationClaims`` or raise ``TokenError``"""
+    if not isinstance(token, str):
+        raise TokenError("token missing")
+    payload, _, signature = token.rpartition(".")
+    parts = payload.split(".")
+    if len(parts) != 5 or parts[0] != TOKEN_VERSION:
+        raise TokenError("malformed token")
+
+    signed = payload.encode()
+    signature = signature.encode()
+    for key in _keys:
+        if hmac.compare_digest(signature, _sign(key, signed)):
+            break
+    else:
+        raise TokenError("bad signature")
+
+    try:
+        user_id = int(parts[1])
+        issued_at = int(parts[3])
+    except ValueError:
+        raise TokenError("malformed token")
+    now = time.time() if now is None else now
+    if now - issued_at > max_age:
+        raise TokenError("token expired")
+    if issued_at - now > MAX_CLOCK_SKEW:
+        raise TokenError("token issued in the future")
+    return VerificationClaims(user_id, parts[2], issued_at, parts[4])
@@ -1,42 +1,294 @@
+import asyncio
 import requests
 import os
 from dotenv import load_dotenv
+import metrics
+import eligibility
+from singleflight import AsyncSingleFlight, SingleFlight
+from wallets import is_wallet_address
 
 load_dotenv()
 
+invalid_addresses = metrics.counter("bot_verifier_invalid_addresses_total", "Malformed wallet addresses rejected before any lookup", ("operation",))
+
+# Concurrent lookups of the same wallet (repeated link clicks, shared wallets) share one request
+lookups = SingleFlight("verifier")
+async_lookups = AsyncSingleFlight("verifier_async")
+
+def _rules(timing):
+    """The eligibility rules, or None (and the outcome set) if Helius or the rules are not configured"""
+    try:
+        rules = eligibility.configured_rules()
+    except eligibility.RuleError as e:
+        print(f"Invalid ELIGIBILITY_RULES: {e}")
+        timing.outcome = "not_configured"
+        return None
+    if not os.getenv("HELIUS_API_KEY") or rules is None:
+        print("Missing HELIUS_API_KEY or COLLECTION_ID")
+        timing.outcome = "not_configured"
+        return None
+    return rules
+
+def _report(evaluation, wallet_address):
+    eligibility.evaluations.inc(evaluation.tier or "none")
+    if evaluation.eligible:
+        print(f"Wallet {wallet_address} meets {evaluation.tier}: {evaluation.as_dict()['counts']}")
+    else:
+        print(f"No required NFT found in wallet {wallet_address}")
+    return evaluation
+
+def _valid_address(wallet_address, operation):
+    if is_wallet_address(wallet_address):
+        return True
+    print(f"Rejected malformed wallet address {wallet_address!r}")
+    invalid_addresses.inc(operation)
+    return False
+
 def has_nft(wallet_address):
     """
     Check if wallet has the required NFT collection
     """
+    if not _valid_address(wallet_address, "helius_lookup"):
+        return False
+    return lookups.do(("rest", wallet_address), _lookup, wallet_address)
+
+def _lookup(wallet_address):
+    with metrics.timer("helius_lookup") as timing:
+        evaluation = _evaluate(wallet_address, timing)
+        if timing.outcome == "ok":
+            timing.outcome = "found" if evaluation.eligible else "not_found"
+        return evaluation is not None and evaluation.eligible
+
+def _evaluate(wallet_address, timing):
+    """The wallet's Evaluation against every eligibility rule, or None if the lookup failed"""
     try:
-        helius_api_key = os.getenv("HELIUS_API_KEY")
-        collection_id = os.getenv("COLLECTION_ID")
-        
-        if not helius_api_key or not collection_id:
-            print("Missing HELIUS_API_KEY or COLLECTION_ID")
-            return False
+        rules = _rules(timing)
+        if rules is None:
+            return None
         
         # Get NFTs for the wallet
-        url = f"https://api.helius.xyz/v0/addresses/{wallet_address}/nft-assets?api-key={helius_api_key}"
+        api_url = os.getenv("HELIUS_API_URL", "https://api.helius.xyz")
+        url = f"{api_url}/v0/addresses/{wallet_address}/nft-assets?api-key={os.getenv('HELIUS_API_KEY')}"
         response = requests.get(url, timeout=10)
         
         if response.status_code == 200:
-            nfts = response.json()
-            
-            # Check if any NFT belongs to the required collection
-            for nft in nfts:
-                if nft.get("grouping") and len(nft["grouping"]) > 0:
-                    for group in nft["grouping"]:
-                        if group.get("group_key") == "collection" and group.get("group_value") == collection_id:
-                            print(f"Found required NFT: {nft.get('content', {}).get('metadata', {}).get('name', 'Unknown')}")
-                            return True
-            
-            print(f"No required NFT found in wallet {wallet_address}")
-            return False
+            # Count the NFTs toward every rule in one pass
+            return _report(rules.evaluate(response.json()), wallet_address)
         else:
             print(f"API request failed: {response.status_code}")
-            return False
+            timing.outcome = f"http_{response.status_code}"
+            return None
+            
+    except Exception as e:
+        print(f"Error checking NFT ownership: {e}")
+        timing.outcome = "error"
+        return None
+
+# DAS getAssetsByOwner returns at most this many assets per page
+DAS_PAGE_LIMIT = 1000
+
+def has_nft_das(wallet_address):
+    """
+    Check if wallet has the required NFT collection using the paginated DAS API
+    """
+    evaluation = check_eligibility(wallet_address)
+    return evaluation is not None and evaluation.eligible
+
+def check_ownership(wallet_address):
+    """
+    True or False if the DAS lookup succeeded, None if it failed - for callers that must not act on errors
+    """
+    evaluation = check_eligibility(wallet_address)
+    return evaluation.eligible if evaluation is not None else None
+
+def check_eligibility(wallet_address):
+    """
+    The wallet's eligibility.Evaluation (tier and per-rule counts) from one DAS lookup, None if it failed
+    """
+    if not _valid_address(wallet_address, "helius_das_lookup"):
+        return None
+    return lookups.do(("das", wallet_address), _das_lookup, wallet_address)
+
+def _das_lookup(wallet_address):
+    """One timed DAS lookup, shared by has_nft_das, check_ownership and check_eligibility"""
+    with metrics.timer("helius_das_lookup") as timing:
+        evaluation = _das_evaluate(wallet_address, timing)
+        if timing.outcome == "ok":
+            timing.outcome = "found" if evaluation.eligible else "not_found"
+        return evaluation
+
+def _das_evaluate(wallet_address, timing):
+    try:
+        rules = _rules(timing)
+        if rules is None:
+            return None
+        
+        rpc_url = os.getenv("HELIUS_RPC_URL", "https://mainnet.helius-rpc.com")
+        url = f"{rpc_url}/?api-key={os.getenv('HELIUS_API_KEY')}"
+        evaluation = rules.evaluate()
+        page = 1
+        
+        # Walk pages until the top tier is met or a short page ends the listing
+        while True:
+            response = requests.post(url, json={
+                "jsonrpc": "2.0",
+                "id": "has-nft",
+                "method": "getAssetsByOwner",
+                "params": {"ownerAddress": wallet_address, "page": page, "limit": DAS_PAGE_LIMIT},
+            }, timeout=10)
+            
+            if response.status_code != 200:
+                print(f"DAS request failed: {response.status_code}")
+                timing.outcome = f"http_{response.status_code}"
+                return None
+            
+            items = response.json().get("result", {}).get("items", [])
+            if evaluation.feed(items).final or len(items) < DAS_PAGE_LIMIT:
+                return _report(evaluation, wallet_address)
+            page += 1
+            
+    except Exception as e:
+        print(f"Error checking NFT ownership: {e}")
+        timing.outcome = "error"
+        return None
+
+# Async API: the same lookups over one shared httpx client, for use on the bot's event loop.
+# Cancelling the caller cancels the request (once no other caller is waiting on it).
+
+# Bodies larger than this are decoded in a worker thread so a 10k-asset wallet doesn't stall the loop
+LARGE_BODY_BYTES = 256 * 1024
+
+_client = None
+_client_loop = None
+
+def async_client():
+    """The shared httpx.AsyncClient, created on first use in the running event loop"""
+    global _client, _client_loop
+    import httpx
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(timeout=10, limits=httpx.Limits(max_connections=20, max_keepalive_connections=10))
+        _client_loop = loop
+    return _client
+
+async def aclose():
+    """Close the shared client; call from the loop that used it"""
+    global _client, _client_loop
+    if _client is not None and _client_loop is asyncio.get_running_loop():
+        await _client.aclose()
+    _client = _client_loop = None
+
+async def probe():
+    """
+    Raise unless Helius answers a cheap RPC call - for the readiness probe
+    """
+    rpc_url = os.getenv("HELIUS_RPC_URL", "https://mainnet.helius-rpc.com")
+    response = await async_client().post(f"{rpc_url}/?api-key={os.getenv('HELIUS_API_KEY')}", json={
+        "jsonrpc": "2.0", "id": "ready", "method": "getHealth"})
+    response.raise_for_status()
+
+async def _decode(response):
+    if len(response.content) > LARGE_BODY_BYTES:
+        return await asyncio.to_thread(response.json)
+    return response.json()
+
+async def has_nft_async(wallet_address):
+    """
+    Async has_nft
+    """
+    if not _valid_address(wallet_address, "helius_lookup"):
+        return False
+    return await async_lookups.do(("rest", wallet_address), _lookup_async, wallet_address)
+
+async def _lookup_async(wallet_address):
+    with metrics.timer("helius_lookup") as timing:
+        evaluation = await _evaluate_async(wallet_address, timing)
+        if timing.outcome == "ok":
+            timing.outcome = "found" if evaluation.eligible else "not_found"
+        return evaluation is not None and evaluation.eligible
+
+async def _evaluate_async(wallet_address, timing):
+    try:
+        rules = _rules(timing)
+        if rules is None:
+            return None
+        
+        api_url = os.getenv("HELIUS_API_URL", "https://api.helius.xyz")
+        url = f"{api_url}/v0/addresses/{wallet_address}/nft-assets?api-key={os.getenv('HELIUS_API_KEY')}"
+        response = await async_client().get(url)
+        
+        if response.status_code != 200:
+            print(f"API request failed: {response.status_code}")
+            timing.outcome = f"http_{response.status_code}"
+            return None
+        
+        return _report(rules.evaluate(await _decode(response)), wallet_address)
+            
+    except Exception as e:
+        print(f"Error checking NFT ownership: {e}")
+        timing.outcome = "error"
+        return None
+
+async def has_nft_das_async(wallet_address):
+    """
+    Async has_nft_das
+    """
+    evaluation = await check_eligibility_async(wallet_address)
+    return evaluation is not None and evaluation.eligible
+
+async def check_ownership_async(wallet_address):
+    """
+    Async check_ownership: True or False if the lookup succeeded, None if it failed
+    """
+    evaluation = await check_eligibility_async(wallet_address)
+    return evaluation.eligible if evaluation is not None else None
+
+async def check_eligibility_async(wallet_address):
+    """
+    Async check_eligibility
+    """
+    if not _valid_address(wallet_address, "helius_das_lookup"):
+        return None
+    return await async_lookups.do(("das", wallet_address), _das_lookup_async, wallet_address)
+
+async def _das_lookup_async(wallet_address):
+    with metrics.timer("helius_das_lookup") as timing:
+        evaluation = await _das_evaluate_async(wallet_address, timing)
+        if timing.outcome == "ok":
+            timing.outcome = "found" if evaluation.eligible else "not_found"
+        return evaluation
+
+async def _das_evaluate_async(wallet_address, timing):
+    try:
+        rules = _rules(timing)
+        if rules is None:
+            return None
+        
+        rpc_url = os.getenv("HELIUS_RPC_URL", "https://mainnet.helius-rpc.com")
+        url = f"{rpc_url}/?api-key={os.getenv('HELIUS_API_KEY')}"
+        client = async_client()
+        evaluation = rules.evaluate()
+        page = 1
+        
+        while True:
+            response = await client.post(url, json={
+                "jsonrpc": "2.0",
+                "id": "has-nft",
+                "method": "getAssetsByOwner",
+                "params": {"ownerAddress": wallet_address, "page": page, "limit": DAS_PAGE_LIMIT},
+            })
+            
+            if response.status_code != 200:
+                print(f"DAS request failed: {response.status_code}")
+                timing.outcome = f"http_{response.status_code}"
+                return None
+            
+            items = (await _decode(response)).get("result", {}).get("items", [])
+            if evaluation.feed(items).final or len(items) < DAS_PAGE_LIMIT:
+                return _report(evaluation, wallet_address)
+            page += 1
             
     except Exception as e:
         print(f"Error checking NFT ownership: {e}")
-        return False 
\ No newline at end of file
+        timing.outcome = "error"
+        return None
@@ -1,62 +1,110 @@
+import asyncio
 import subprocess
 import re
 import os
 from dotenv import load_dotenv
+import metrics
+from singleflight import AsyncSingleFlight, SingleFlight
+from wallets import is_wallet_address
 
 load_dotenv()
 
+JS_COMMAND = ['node', '../test_js.js']
+JS_TIMEOUT_SECONDS = 30
+
+# One node process per wallet at a time, however many callers ask
+lookups = SingleFlight("verifier_js")
+async_lookups = AsyncSingleFlight("verifier_js_async")
+
+def _configured(wallet_address):
+    helius_api_key = os.getenv("HELIUS_API_KEY")
+    collection_id = os.getenv("COLLECTION_ID")
+    
+    if not helius_api_key or not collection_id:
+        print("Missing HELIUS_API_KEY or COLLECTION_ID")
+        return False
+    
+    print(f"🔍 Checking NFT ownership for wallet: {wallet_address}")
+    print(f"📦 Collection ID: {collection_id}")
+    print(f"🔑 Using JavaScript (Metaplex) approach...")
+    return True
+
+def _interpret(returncode, stdout, stderr):
+    """Verification result from the JavaScript process's exit code and output"""
+    if returncode == 0:
+        # Parse the JavaScript output
+        output = stdout.strip()
+        print(f"📄 JavaScript output: {output}")
+        
+        # Extract NFT count using regex
+        match = re.search(r'has (\d+) NFTs', output)
+        if match:
+            nft_count = int(match.group(1))
+            print(f"✅ Found {nft_count} NFTs in wallet")
+            
+            # For now, if wallet has any NFTs, consider it verified
+            # You can add specific collection checking logic here
+            if nft_count > 0:
+                print(f"✅ Wallet has NFTs - verification successful")
+                return True
+            else:
+                print(f"❌ Wallet has no NFTs")
+                return False
+        else:
+            # Check if it says "no NFTs"
+            if "has no NFTs" in output:
+                print(f"❌ Wallet has no NFTs")
+                return False
+            else:
+                print(f"❌ Could not parse NFT count from output")
+                return False
+    else:
+        print(f"❌ JavaScript subprocess failed:")
+        print(f"Error: {stderr}")
+        return False
+
+@metrics.timer("verifier_js")
 def has_nft_js(wallet_address):
     """
     Check if wallet has the required NFT collection using JavaScript (Metaplex)
     """
     try:
-        helius_api_key = os.getenv("HELIUS_API_KEY")
-        collection_id = os.getenv("COLLECTION_ID")
-        
-        if not helius_api_key or not collection_id:
-            print("Missing HELIUS_API_KEY or COLLECTION_ID")
+        if not _configured(wallet_address):
             return False
         
-        print(f"🔍 Checking NFT ownership for wallet: {wallet_address}")
-        print(f"📦 Collection ID: {collection_id}")
-        print(f"🔑 Using JavaScript (Metaplex) approach...")
-        
         # Run the JavaScript code as a subprocess
-        result = subprocess.run(['node', '../test_js.js'], capture_output=True, text=True, timeout=30)
-        
-        if result.returncode == 0:
-            # Parse the JavaScript output
-            output = result.stdout.strip()
-            print(f"📄 JavaScript output: {output}")
+        result = subprocess.run(JS_COMMAND, capture_output=True, text=True, timeout=JS_TIMEOUT_SECONDS)
+        return _interpret(result.returncode, result.stdout, result.stderr)
             
-            # Extract NFT count using regex
-            match = re.search(r'has (\d+) NFTs', output)
-            if match:
-                nft_count = int(match.group(1))
-                print(f"✅ Found {nft_count} NFTs in wallet")
-                
-                # For now, if wallet has any NFTs, consider it verified
-                # You can add specific collection checking logic here
-                if nft_count > 0:
-                    print(f"✅ Wallet has NFTs - verification successful")
-                    return True
-                else:
-                    print(f"❌ Wallet has no NFTs")
-                    return False
-            else:
-                # Check if it says "no NFTs"
-                if "has no NFTs" in output:
-                    print(f"❌ Wallet has no NFTs")
-                    return False
-                else:
-                    print(f"❌ Could not parse NFT count from output")
-                    return False
-        else:
-            print(f"❌ JavaScript subprocess failed:")
-            print(f"Error: {result.stderr}")
+    except subprocess.TimeoutExpired:
+        print(f"❌ JavaScript subprocess timed out")
+        return False
+    except Exception as e:
+        print(f"❌ Error running JavaScript subprocess: {e}")
+        return False
+
+@metrics.timer("verifier_js")
+async def has_nft_js_async(wallet_address):
+    """
+    has_nft_js without blocking the event loop; the node process is killed on timeout or cancellation
+    """
+    try:
+        if not _configured(wallet_address):
             return False
+        
+        process = await asyncio.create_subprocess_exec(
+            *JS_COMMAND, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), JS_TIMEOUT_SECONDS)
+        except BaseException:
+            # Timed out or cancelled - don't leave node running behind us
+            if process.returncode is None:
+                process.kill()
+                await asyncio.shield(process.wait())
+            raise
+        return _interpret(process.returncode, stdout.decode(errors="replace"), stderr.decode(errors="replace"))
             
-    except subprocess.TimeoutExpired:
+    except asyncio.TimeoutError:
         print(f"❌ JavaScript subprocess timed out")
         return False
     except Exception as e:
@@ -67,4 +115,16 @@ def has_nft(wallet_address):
     """
     Main function - use JavaScript approach instead of direct API
     """
-    return has_nft_js(wallet_address) 
\ No newline at end of file
+    if not is_wallet_address(wallet_address):
+        print(f"❌ Rejected malformed wallet address {wallet_address!r}")
+        return False
+    return lookups.do(wallet_address, has_nft_js, wallet_address)
+
+async def has_nft_async(wallet_address):
+    """
+    Async has_nft
+    """
+    if not is_wallet_address(wallet_address):
+        print(f"❌ Rejected malformed wallet address {wallet_address!r}")
+        return False
+    return await async_lookups.do(wallet_address, has_nft_js_async, wallet_address)
@@ -0,0 +1,66 @@
+"""
+Solana wallet address helpers.
+
+Addresses are base58 strings of 32-byte public keys. In memory and on disk we
+keep the 32 raw bytes instead of the 32-44 character string; anything that
+does not decode to a public key is kept as an interned string so repeats
+share one object.
+"""
+
+import sys
+
+B58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+_B58_INDEX = {char: index for index, char in enumerate(B58_ALPHABET)}
+PUBKEY_BYTES = 32
+
+
+def b58encode(data):
+    number = int.from_bytes(data, "big")
+    encoded = ""
+    while number:
+        number, remainder = divmod(number, 58)
+        encoded = B58_ALPHABET[remainder] + encoded
+    return "1" * (len(data) - len(data.lstrip(b"\0"))) + encoded
+
+
+def b58decode(text):
+    """Bytes for a base58 string; raises ValueError for characters outside the alphabet"""
+    number = 0
+    try:
+        for char in text:
+            number = number * 58 + _B58_INDEX[char]
+    except KeyError:
+        raise ValueError(f"invalid base58 character in {text!r}")
+    leading = len(text) - len(text.lstrip("1"))
+    return b"\0" * leading + number.to_bytes((number.bit_length() + 7) // 8, "big")
+
+
+def is_wallet_address(address):
+    """Cheap local check that ``address`` is a base58 32-byte public key - no network I/O"""
+    if not isinstance(address, str) or not 32 <= len(address) <= 44:
+        return False
+    try:
+        return len(b58decode(address)) == PUBKEY_BYTES
+    except ValueError:
+        return False
+
+
+def pack_wallet(address):
+    """32-byte public key for a wallet address, or the interned string if it is not one"""
+    if not address:
+        return None
+    if 32 <= len(address) <= 44:
+        try:
+            key = b58decode(address)
+        except ValueError:
+            key = None
+        if key is not None and len(key) == PUBKEY_BYTES:
+            return key
+    return sys.intern(address)
+
+
+def unpack_wallet(packed):
+    """Wallet address string for a value from ``pack_wallet``"""
+    if isinstance(packed, bytes):
+        return b58encode(packed)
+    return packed